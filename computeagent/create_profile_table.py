@@ -1,4 +1,15 @@
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import boto3
+from botocore.exceptions import ClientError
 
 # Initialize DynamoDB client
 dynamodb = boto3.client("dynamodb", region_name="ap-south-1")  # Change region if needed
@@ -62,3 +73,223 @@ def get_all_userids_and_channels(profile_id):
     items = response.get("Items", [])
     return [(item["userid"], item["channel"]) for item in items]
 
+PROFILE_FIELDS = ["profile_id", "userid", "channel"]
+_thread_local = threading.local()
+
+def thread_table():
+    """boto3 resources are not thread safe, so every worker thread gets its own Table."""
+    if not hasattr(_thread_local, "table"):
+        _thread_local.table = boto3.resource("dynamodb", region_name="ap-south-1").Table(table_name)
+    return _thread_local.table
+
+def read_profiles(path):
+    """Streams profile rows from a .csv (with a header row) or .jsonl file."""
+    with open(path, "r", encoding="utf-8", newline="") as file:
+        rows = csv.DictReader(file) if path.endswith(".csv") else (json.loads(line) for line in file if line.strip())
+        for row in rows:
+            if not all(row.get(field) for field in PROFILE_FIELDS):
+                print(f"Skipping invalid row: {row}")
+                continue
+            yield {field: row[field] for field in PROFILE_FIELDS}
+
+def stale_mappings(profiles_table, userid, profile_id):
+    """Items mapping the userid to a profile other than profile_id, found through the UserIdIndex GSI."""
+    response = profiles_table.query(
+        IndexName="UserIdIndex",
+        KeyConditionExpression="userid = :uid",
+        ExpressionAttributeValues={":uid": userid}
+    )
+    return [item for item in response.get("Items", []) if item["profile_id"] != profile_id]
+
+def write_chunk(items, max_attempts=5):
+    """
+    Writes a chunk through batch_writer, which resends unprocessed items itself, and
+    removes existing mappings of the chunk's userids to other profiles, like link_userid.
+    If the chunk still fails (e.g. sustained throttling) it is retried with backoff;
+    puts and deletes are idempotent so resending already written items is safe.
+
+    :return: (items written, stale mappings removed)
+    """
+    for attempt in range(1, max_attempts + 1):
+        try:
+            stale = [s for item in items for s in stale_mappings(thread_table(), item["userid"], item["profile_id"])]
+            with thread_table().batch_writer(overwrite_by_pkeys=["profile_id", "userid"]) as batch:
+                for item in stale:
+                    batch.delete_item(Key={"profile_id": item["profile_id"], "userid": item["userid"]})
+                for item in items:
+                    batch.put_item(Item=item)
+            return len(items), len(stale)
+        except ClientError as e:
+            if attempt == max_attempts:
+                raise
+            delay = min(2 ** attempt * 0.1, 5)
+            print(f"Chunk write failed ({e.response['Error']['Code']}), retrying in {delay:.1f}s...")
+            time.sleep(delay)
+
+def bulk_import(path, workers=4, chunk_size=500, report_every=1000):
+    """
+    Loads profiles from a CSV/JSONL file with parallel batch writers.
+
+    The file is streamed: at most 2 * workers chunks are held in memory at a time.
+    Each userid resolves to exactly one profile_id afterwards: existing mappings to
+    other profiles are removed, and later rows mapping a userid to another profile
+    than its first row in the file are reported and skipped.
+    """
+    started_at = time.perf_counter()
+    written = 0
+    unlinked = 0
+    last_report = 0
+    userid_profiles = {}
+    pending = set()
+
+    def collect(done):
+        nonlocal written, unlinked, last_report
+        for future in done:
+            chunk_written, chunk_unlinked = future.result()
+            written += chunk_written
+            unlinked += chunk_unlinked
+        if written - last_report >= report_every:
+            last_report = written
+            print(f"Imported {written} items ({written / (time.perf_counter() - started_at):.0f} items/s)")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        chunk = []
+        for item in read_profiles(path):
+            previous = userid_profiles.setdefault(item["userid"], item["profile_id"])
+            if previous != item["profile_id"]:
+                print(f"Warning: userid {item['userid']} is mapped to profiles {previous} and {item['profile_id']}, skipping the latter")
+                continue
+            chunk.append(item)
+            if len(chunk) == chunk_size:
+                pending.add(executor.submit(write_chunk, chunk))
+                chunk = []
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+        if chunk:
+            pending.add(executor.submit(write_chunk, chunk))
+        collect(wait(pending).done)
+
+    elapsed = time.perf_counter() - started_at
+    print(f"Imported {written} items in {elapsed:.2f}s ({written / elapsed if elapsed else 0:.0f} items/s), "
+          f"removed {unlinked} stale mapping(s)")
+    return written
+
+def export_profiles(path, segments=4):
+    """Exports the whole table to .csv or .jsonl using a parallel scan, one worker per segment."""
+    started_at = time.perf_counter()
+    lock = threading.Lock()
+    exported = 0
+
+    with open(path, "w", encoding="utf-8", newline="") as file:
+        csv_writer = None
+        if path.endswith(".csv"):
+            csv_writer = csv.DictWriter(file, fieldnames=PROFILE_FIELDS, extrasaction="ignore")
+            csv_writer.writeheader()
+
+        def scan_segment(segment):
+            nonlocal exported
+            params = {"Segment": segment, "TotalSegments": segments}
+            while True:
+                response = thread_table().scan(**params)
+                items = response.get("Items", [])
+                with lock:
+                    for item in items:
+                        if csv_writer:
+                            csv_writer.writerow(item)
+                        else:
+                            file.write(json.dumps(item, default=str) + "\n")
+                    exported += len(items)
+                if "LastEvaluatedKey" not in response:
+                    return
+                params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+        with ThreadPoolExecutor(max_workers=segments) as executor:
+            list(executor.map(scan_segment, range(segments)))
+
+    print(f"Exported {exported} items to {path} in {time.perf_counter() - started_at:.2f}s")
+    return exported
+
+def link_userid(profile_id, userid, channel):
+    """
+    Links a userid to a profile. Any existing mapping of the userid to another profile
+    is removed in the same transaction, so the UserIdIndex GSI resolves the userid to
+    exactly one profile_id.
+    """
+    stale = stale_mappings(table, userid, profile_id)
+
+    transact_items = [
+        {"Delete": {"TableName": table_name, "Key": {"profile_id": item["profile_id"], "userid": userid}}}
+        for item in stale
+    ]
+    transact_items.append(
+        {"Put": {"TableName": table_name, "Item": {"profile_id": profile_id, "userid": userid, "channel": channel}}}
+    )
+    table.meta.client.transact_write_items(TransactItems=transact_items)
+    print(f"Linked {userid} ({channel}) to {profile_id}, removed {len(stale)} stale mapping(s)")
+    return {"profile_id": profile_id, "userid": userid, "channel": channel, "unlinked_profiles": [item["profile_id"] for item in stale]}
+
+def delete_profiles(items, workers=4):
+    """Deletes the given profile items in parallel chunks."""
+    def delete_chunk(chunk):
+        with thread_table().batch_writer() as batch:
+            for item in chunk:
+                batch.delete_item(Key={"profile_id": item["profile_id"], "userid": item["userid"]})
+
+    chunks = [items[i:i + 500] for i in range(0, len(items), 500)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(delete_chunk, chunks))
+
+def benchmark(count=1000, workers=4):
+    """Compares add_user one by one with bulk_import on synthetic profiles, then removes them."""
+    prefix = f"bench-{int(time.time())}"
+    items = [{"profile_id": f"{prefix}-{i // 3}", "userid": f"{prefix}-user-{i}", "channel": "whatsapp"} for i in range(count)]
+
+    started_at = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for item in items:
+            add_user(item["profile_id"], item["userid"], item["channel"])
+    sequential = time.perf_counter() - started_at
+    delete_profiles(items, workers)
+
+    with tempfile.NamedTemporaryFile("w", suffix=".jsonl", delete=False) as file:
+        file.writelines(json.dumps(item) + "\n" for item in items)
+    started_at = time.perf_counter()
+    bulk_import(file.name, workers=workers)
+    bulk = time.perf_counter() - started_at
+    os.unlink(file.name)
+    delete_profiles(items, workers)
+
+    print(f"add_user: {count} items in {sequential:.2f}s ({count / sequential:.0f} items/s)")
+    print(f"bulk_import: {count} items in {bulk:.2f}s ({count / bulk:.0f} items/s), {sequential / bulk:.1f}x faster")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage UserProfiles in bulk")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import", help="Load profiles from a .csv or .jsonl file")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--workers", type=int, default=4)
+
+    export_parser = subparsers.add_parser("export", help="Export profiles to a .csv or .jsonl file")
+    export_parser.add_argument("path")
+    export_parser.add_argument("--segments", type=int, default=4)
+
+    link_parser = subparsers.add_parser("link", help="Link a userid to a profile")
+    link_parser.add_argument("profile_id")
+    link_parser.add_argument("userid")
+    link_parser.add_argument("channel")
+
+    benchmark_parser = subparsers.add_parser("benchmark", help="Compare add_user with bulk_import")
+    benchmark_parser.add_argument("--count", type=int, default=1000)
+    benchmark_parser.add_argument("--workers", type=int, default=4)
+
+    args = parser.parse_args()
+    if args.command == "import":
+        bulk_import(args.path, workers=args.workers)
+    elif args.command == "export":
+        export_profiles(args.path, segments=args.segments)
+    elif args.command == "link":
+        link_userid(args.profile_id, args.userid, args.channel)
+    elif args.command == "benchmark":
+        benchmark(args.count, args.workers)
@@ -0,0 +1,368 @@
+# Load generator for the compute agent Lambda handler.
+#
+# Drives app.lambda_handler in-process with recorded or synthetic SQS / Step Functions
+# events. The LLM and the AWS tools are replaced by local stand-ins with configurable
+# latency, DynamoDB is expected to be DynamoDB Local (--dynamodb-endpoint) so the
+# checkpointer and profile lookups do real reads and writes.
+#
+#   java -jar DynamoDBLocal.jar -inMemory -sharedDb &
+#   python loadgen.py --dynamodb-endpoint http://localhost:8000 --seed --rate 50 --duration 60
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+
+OPERATOR_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "operator")
+
+DYNAMODB_READ_OPS = {"GetItem", "Query", "Scan", "BatchGetItem", "TransactGetItems"}
+DYNAMODB_WRITE_OPS = {"PutItem", "UpdateItem", "DeleteItem", "BatchWriteItem", "TransactWriteItems"}
+
+# Message mix: kind -> text. The fake LLM answers "chat" directly, plans one tool call
+# for "tool", and "fastpath" messages never reach the LLM.
+MESSAGE_TEXTS = {
+    "chat": "What can you help me with?",
+    "tool": "Which of my servers are running right now?",
+    "fastpath": "list instances",
+}
+
+CANNED_TOOL_RESULTS = {
+    "list_ec2_instances_by_name": [{"InstanceId": "i-0loadgen00000000", "InstanceName": "loadgen", "InstanceState": "running"}],
+    "list_rds_instances": [{"DBInstanceIdentifier": "loadgen-db", "DBInstanceStatus": "available"}],
+    "list_lambda_functions": [{"FunctionName": "loadgen-fn", "State": "Active"}],
+}
+
+class Metrics:
+    """Thread-safe collection of latencies, DynamoDB capacity and checkpoint contention."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies_ms = []
+        self.service_ms = []
+        self.errors = defaultdict(int)
+        self.capacity = defaultdict(lambda: {"read": 0.0, "write": 0.0, "calls": 0})
+        self.capacity_per_second = defaultdict(lambda: defaultdict(float))
+        self.dynamodb_errors = defaultdict(int)
+        self.in_flight = defaultdict(int)
+        self.overlapping_messages = 0
+        self.max_in_flight_per_thread = 0
+
+    def record_capacity(self, operation, consumed):
+        kind = "read" if operation in DYNAMODB_READ_OPS else "write"
+        second = int(time.time())
+        entries = consumed if isinstance(consumed, list) else [consumed]
+        with self.lock:
+            for entry in entries:
+                units = entry.get("CapacityUnits", 0.0)
+                table = entry.get("TableName", "unknown")
+                self.capacity[table][kind] += units
+                self.capacity[table]["calls"] += 1
+                self.capacity_per_second[(table, kind)][second] += units
+
+    def thread_started(self, thread_id):
+        with self.lock:
+            if self.in_flight[thread_id] > 0:
+                self.overlapping_messages += 1
+            self.in_flight[thread_id] += 1
+            self.max_in_flight_per_thread = max(self.max_in_flight_per_thread, self.in_flight[thread_id])
+
+    def thread_finished(self, thread_id):
+        with self.lock:
+            self.in_flight[thread_id] -= 1
+
+def install_dynamodb_hooks(metrics):
+    """Asks DynamoDB for consumed capacity on every data call made through the default session."""
+    boto3.setup_default_session()
+    register_dynamodb_hooks(boto3.DEFAULT_SESSION.events, metrics)
+
+def register_dynamodb_hooks(events, metrics):
+    def add_return_consumed_capacity(params, model, **kwargs):
+        if model.name in DYNAMODB_READ_OPS | DYNAMODB_WRITE_OPS:
+            params.setdefault("ReturnConsumedCapacity", "TOTAL")
+
+    def collect_consumed_capacity(parsed, model, **kwargs):
+        if "Error" in parsed:
+            with metrics.lock:
+                metrics.dynamodb_errors[parsed["Error"].get("Code", "Unknown")] += 1
+        if parsed.get("ConsumedCapacity"):
+            metrics.record_capacity(model.name, parsed["ConsumedCapacity"])
+
+    events.register("provide-client-params.dynamodb.*", add_return_consumed_capacity)
+    events.register("after-call.dynamodb.*", collect_consumed_capacity)
+
+class ThreadLocalTable:
+    """
+    Stands in for app.table. boto3 resources are not thread safe, so every worker thread
+    gets its own session and Table, with the capacity hooks registered on it.
+    """
+
+    def __init__(self, name, metrics):
+        self.name = name
+        self.metrics = metrics
+        self.local = threading.local()
+
+    def __getattr__(self, attr):
+        table = getattr(self.local, "table", None)
+        if table is None:
+            session = boto3.session.Session()
+            register_dynamodb_hooks(session.events, self.metrics)
+            table = self.local.table = session.resource("dynamodb").Table(self.name)
+        return getattr(table, attr)
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def load_app(args, metrics):
+    """Imports the Lambda app against the local stand-ins."""
+    if args.dynamodb_endpoint:
+        os.environ["AWS_ENDPOINT_URL_DYNAMODB"] = args.dynamodb_endpoint
+    os.environ.setdefault("AWS_DEFAULT_REGION", "ap-south-1")
+    os.environ.setdefault("MODEL_NAME", "gpt-4o")
+    os.environ.setdefault("PROVIDER_NAME", "openai")
+    # Admission control would throttle the synthetic load before it reaches DynamoDB
+    os.environ.setdefault("BUDGET_ENABLED", "false")
+    install_dynamodb_hooks(metrics)
+
+    # The app reads its prompt and grammar files relative to the working directory
+    os.chdir(OPERATOR_DIR)
+    sys.path.insert(0, OPERATOR_DIR)
+    import app
+    import failover
+    import modelrouter
+    import tools
+
+    def fake_provider(model, messages, tools=None):
+        from langchain_core.messages import AIMessage, HumanMessage
+        time.sleep(max(0.0, random.gauss(args.llm_latency_ms, args.llm_latency_ms / 4)) / 1000)
+        usage = {"input_tokens": sum(len(str(m.content)) for m in messages) // 4, "output_tokens": 40}
+        usage["total_tokens"] = usage["input_tokens"] + usage["output_tokens"]
+        last = messages[-1]
+        if isinstance(last, HumanMessage) and MESSAGE_TEXTS["tool"] in str(last.content):
+            return AIMessage(content="", usage_metadata=usage, tool_calls=[
+                {"name": "list_ec2_instances_by_name", "args": {}, "id": f"call_{uuid.uuid4().hex[:12]}"}
+            ])
+        return AIMessage(content=json.dumps({"nextagent": "comms-agent", "message": "Done."}), usage_metadata=usage)
+
+    def fake_tool(name):
+        def run(*a, **kw):
+            time.sleep(args.tool_latency_ms / 1000)
+            return CANNED_TOOL_RESULTS.get(name, f"{name} completed.")
+        return run
+
+    for tier in modelrouter.TIERS.values():
+        failover.register_provider(tier["provider"], fake_provider)
+    for t in tools.tool_list:
+        t.func = fake_tool(t.name)
+
+    class FakeStepFunctions:
+        def send_task_success(self, **kwargs):
+            return {}
+
+        def send_task_failure(self, **kwargs):
+            with metrics.lock:
+                metrics.errors["TaskFailure"] += 1
+            return {}
+
+    app.stepfunctions = FakeStepFunctions()
+    app.table = ThreadLocalTable("UserProfiles", metrics)
+    return app
+
+def seed_profiles(app, count):
+    """Creates UserProfiles in the local endpoint if needed and adds one user per profile."""
+    client = app.dynamodb.meta.client
+    try:
+        client.create_table(
+            TableName="UserProfiles",
+            AttributeDefinitions=[{"AttributeName": "profile_id", "AttributeType": "S"},
+                                  {"AttributeName": "userid", "AttributeType": "S"}],
+            KeySchema=[{"AttributeName": "profile_id", "KeyType": "HASH"},
+                       {"AttributeName": "userid", "KeyType": "RANGE"}],
+            BillingMode="PAY_PER_REQUEST",
+            GlobalSecondaryIndexes=[{"IndexName": "UserIdIndex",
+                                     "KeySchema": [{"AttributeName": "userid", "KeyType": "HASH"}],
+                                     "Projection": {"ProjectionType": "ALL"}}],
+        )
+        client.get_waiter("table_exists").wait(TableName="UserProfiles")
+    except client.exceptions.ResourceInUseException:
+        pass
+    with app.table.batch_writer() as batch:
+        for i in range(count):
+            batch.put_item(Item={"profile_id": f"loadgen-profile-{i}", "userid": f"loadgen-user-{i}", "channel": "whatsapp"})
+    print(f"Seeded {count} profiles")
+
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(","):
+        kind, weight = part.split(":")
+        if kind not in MESSAGE_TEXTS:
+            raise ValueError(f"Unknown message kind '{kind}', expected one of {list(MESSAGE_TEXTS)}")
+        weights[kind] = float(weight)
+    return weights
+
+def synthetic_events(args):
+    """Yields SQS and Step Functions events with zipf-skewed senders and the configured mix."""
+    mix = parse_mix(args.mix)
+    kinds, kind_weights = list(mix), list(mix.values())
+    profile_weights = [1 / (rank + 1) ** args.skew for rank in range(args.profiles)]
+    total = int(args.rate * args.duration)
+
+    def body():
+        user = random.choices(range(args.profiles), weights=profile_weights)[0]
+        kind = random.choices(kinds, weights=kind_weights)[0]
+        return {"channel_type": "whatsapp", "from": f"loadgen-user-{user}", "message": MESSAGE_TEXTS[kind]}
+
+    sent = 0
+    while sent < total:
+        if random.random() < args.sfn_ratio:
+            yield {"taskToken": uuid.uuid4().hex, "input": body()}
+            sent += 1
+            continue
+        records = []
+        for _ in range(min(args.batch_size, total - sent)):
+            message = body()
+            records.append({"messageId": str(uuid.uuid4()), "body": json.dumps(
+                {"channel_type": message["channel_type"], "from": message["from"], "messages": message["message"]})})
+        sent += len(records)
+        yield {"Records": records}
+
+def recorded_events(path):
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+def event_senders(event):
+    if "taskToken" in event:
+        return [event["input"].get("from")]
+    return [json.loads(r["body"]).get("from") for r in event.get("Records", [])]
+
+def message_count(event):
+    return len(event.get("Records", [])) or 1
+
+def run(args):
+    metrics = Metrics()
+    app = load_app(args, metrics)
+    if args.seed:
+        seed_profiles(app, args.profiles)
+
+    # Checkpoint threads are keyed by profile and synthetic senders have one profile each,
+    # so overlapping messages per sender are overlapping writers on one checkpoint thread
+    original_handle_message = app.handle_message
+
+    def instrumented_handle_message(channel_type, recipient, message):
+        metrics.thread_started(recipient)
+        try:
+            return original_handle_message(channel_type, recipient, message)
+        finally:
+            metrics.thread_finished(recipient)
+
+    app.handle_message = instrumented_handle_message
+
+    def invoke(event, scheduled_at):
+        started_at = time.perf_counter()
+        try:
+            app.lambda_handler(event, None)
+        except Exception as e:
+            with metrics.lock:
+                metrics.errors[type(e).__name__] += 1
+        finished_at = time.perf_counter()
+        with metrics.lock:
+            metrics.latencies_ms.append((finished_at - scheduled_at) * 1000)
+            metrics.service_ms.append((finished_at - started_at) * 1000)
+
+    events = recorded_events(args.events) if args.events else synthetic_events(args)
+    messages = 0
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        for event in events:
+            scheduled_at = started_at + messages / args.rate
+            delay = scheduled_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(invoke, event, scheduled_at)
+            messages += message_count(event)
+    elapsed = time.perf_counter() - started_at
+    return build_report(metrics, messages, elapsed)
+
+def build_report(metrics, messages, elapsed):
+    capacity = {}
+    for table, totals in metrics.capacity.items():
+        peaks = {kind: max(metrics.capacity_per_second[(table, kind)].values(), default=0.0) for kind in ("read", "write")}
+        capacity[table] = {
+            "read_units": round(totals["read"], 1),
+            "write_units": round(totals["write"], 1),
+            "avg_read_units_per_s": round(totals["read"] / elapsed, 2),
+            "avg_write_units_per_s": round(totals["write"] / elapsed, 2),
+            "peak_read_units_per_s": round(peaks["read"], 1),
+            "peak_write_units_per_s": round(peaks["write"], 1),
+            "calls": totals["calls"],
+        }
+
+    return {
+        "messages": messages,
+        "invocations": len(metrics.latencies_ms),
+        "elapsed_s": round(elapsed, 2),
+        "throughput_msgs_per_s": round(messages / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {p: round(percentile(metrics.latencies_ms, int(p[1:])), 1) for p in ("p50", "p90", "p99")},
+        "service_ms": {p: round(percentile(metrics.service_ms, int(p[1:])), 1) for p in ("p50", "p90", "p99")},
+        "errors": dict(metrics.errors),
+        "checkpoint_contention": {
+            "overlapping_messages": metrics.overlapping_messages,
+            "max_in_flight_per_thread": metrics.max_in_flight_per_thread,
+        },
+        "dynamodb_capacity": capacity,
+        "dynamodb_errors": dict(metrics.dynamodb_errors),
+    }
+
+def print_report(report):
+    print(f"\nMessages: {report['messages']} in {report['elapsed_s']}s "
+          f"({report['throughput_msgs_per_s']} msgs/s, {report['invocations']} invocations)")
+    print(f"End-to-end latency ms: {report['latency_ms']}")
+    print(f"Handler service time ms: {report['service_ms']}")
+    print(f"Errors: {report['errors'] or 'none'}")
+    print(f"Checkpoint contention: {report['checkpoint_contention']}")
+    for table, usage in report["dynamodb_capacity"].items():
+        print(f"DynamoDB {table}: {usage}")
+    if report["dynamodb_errors"]:
+        print(f"DynamoDB errors: {report['dynamodb_errors']}")
+    checkpoint = report["dynamodb_capacity"].get("whatsapp_checkpoint")
+    if checkpoint:
+        print(f"Suggested max_write_request_units >= {int(checkpoint['peak_write_units_per_s'] * 1.5) + 1}, "
+              f"max_read_request_units >= {int(checkpoint['peak_read_units_per_s'] * 1.5) + 1} (peak x 1.5)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay or synthesize events against lambda_handler")
+    parser.add_argument("--events", help="JSONL file of recorded Lambda events to replay")
+    parser.add_argument("--rate", type=float, default=10.0, help="Messages per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of synthetic load")
+    parser.add_argument("--concurrency", type=int, default=20, help="Concurrent handler invocations")
+    parser.add_argument("--profiles", type=int, default=100, help="Number of synthetic senders")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent of sender popularity, 0 for uniform")
+    parser.add_argument("--mix", default="chat:0.5,tool:0.3,fastpath:0.2", help="Message mix as kind:weight,...")
+    parser.add_argument("--batch-size", type=int, default=1, help="SQS records per event")
+    parser.add_argument("--sfn-ratio", type=float, default=0.0, help="Fraction of Step Functions taskToken events")
+    parser.add_argument("--llm-latency-ms", type=float, default=800.0)
+    parser.add_argument("--tool-latency-ms", type=float, default=150.0)
+    parser.add_argument("--dynamodb-endpoint", help="e.g. http://localhost:8000 for DynamoDB Local")
+    parser.add_argument("--seed", action="store_true", help="Create and seed UserProfiles with the synthetic senders")
+    parser.add_argument("--report", help="Write the report as JSON to this file")
+    args = parser.parse_args()
+    # load_app changes the working directory to the operator folder
+    args.events = os.path.abspath(args.events) if args.events else None
+    args.report = os.path.abspath(args.report) if args.report else None
+
+    report = run(args)
+    print_report(report)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
@@ -1,21 +1,54 @@
+import contextvars
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 from tools import tool_list
+from fastpath import try_fast_path
 # import requests
 
 from langgraph.graph import StateGraph,  START, END
 from langgraph.prebuilt import ToolNode
-from langchain_core.messages import SystemMessage,  HumanMessage
+from langchain_core.messages import SystemMessage,  HumanMessage, AIMessage, ToolMessage
+from langgraph.errors import GraphRecursionError
 from langgraph_dynamodb_checkpoint import DynamoDBSaver
-from langgraph_utils import call_model, create_tools_json
+from cachedsaver import CachedCheckpointSaver
+from langgraph_utils import create_tools_json
+from modelrouter import call_routed_model, log_tier_metrics
+from toolindex import ToolIndex, select_tools, signals_missing_capability
+from resilience import aws_client, log_breaker_metrics
+from utils import get_secret
+from budget import token_budget, degraded_response, MAX_GRAPH_STEPS
+from idempotency import process_once, message_key, lease_for
+from profiling import profiled, profile_mode
 import os
 from langgraph_reducer import PrunableStateFactory
 import boto3
 
-model_name = model=os.getenv("MODEL_NAME")
-provider_name = os.getenv("PROVIDER_NAME")
+record_fast_path_history = os.getenv("FAST_PATH_RECORD_HISTORY", "true").lower() == "true"
+prefetch_enabled = os.getenv("PREFETCH_ENABLED", "true").lower() == "true"
+prefetch_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="prefetch")
+# Start time of the message being handled, used to log when the first LLM call starts
+message_timing = contextvars.ContextVar("message_timing", default=None)
+cold_start = True
+
+# Primed by warm-up events
+WARMUP_SECRETS = ["WhatsAppAPIToken", "WhatsappNumberID"]
+WARMUP_CLIENTS = ["secretsmanager", "dynamodb", "ec2", "rds", "ce", "lambda", "sqs", "ses"]
+WARMUP_THREAD_ID = "__warmup__"
 stepfunctions = boto3.client("stepfunctions")
 
 tool_node = ToolNode(tools=tool_list)
+tool_index = ToolIndex(tool_list)
+all_tools_json = create_tools_json(tool_list)
+agent_prompt = None
+
+def load_agent_prompt():
+    """Reads the system prompt once per container."""
+    global agent_prompt
+    if agent_prompt is None:
+        with open("agent_prompt.txt", "r", encoding="utf-8") as file:
+            agent_prompt = file.read()
+    return agent_prompt
 
     
 def should_continue(state) -> str:
@@ -25,21 +58,50 @@ def should_continue(state) -> str:
     return 'tools'
 
 # Function to call the supervisor model
-def call_gw_model(state): 
-    with open("agent_prompt.txt", "r", encoding="utf-8") as file:
-        system_message = file.read()
-        messages = state["messages"]
-        system_msg = SystemMessage(content=system_message)
-
-        if isinstance(messages[0], SystemMessage):
-            messages[0]=system_msg
-        else:
-            messages.insert(0, system_msg)
+def call_gw_model(state, config): 
+    profile_id = config["configurable"]["thread_id"]
+    on_usage = None
+    if token_budget:
+        # A tool loop can use up the budget mid-run; answer instead of calling the model again
+        try:
+            exhausted = token_budget.exhausted(profile_id)
+        except Exception as e:
+            print(f"Budget check failed for profile {profile_id}, calling model: {e}")
+            exhausted = None
+        if exhausted:
+            return {"messages": [AIMessage(content=json.dumps(degraded_response(exhausted)))]}
 
-        json_tools = create_tools_json(tool_list)
-        response = call_model(model_name, provider_name, messages, json_tools)
-        
-        return {"messages": [response]}
+        def on_usage(tokens):
+            # The response is already paid for; a store error must not discard it
+            try:
+                token_budget.charge(profile_id, tokens)
+            except Exception as e:
+                print(f"Failed to charge {tokens} tokens to profile {profile_id}: {e}")
+
+    timing = message_timing.get()
+    if timing and not timing["first_llm_call_logged"]:
+        timing["first_llm_call_logged"] = True
+        log_latency("first_llm_call", timing["started_at"], profile_id)
+
+    messages = state["messages"]
+    system_msg = SystemMessage(content=load_agent_prompt())
+
+    if isinstance(messages[0], SystemMessage):
+        messages[0]=system_msg
+    else:
+        messages.insert(0, system_msg)
+
+    selected_tools = select_tools(tool_index, messages)
+    if selected_tools is None:
+        response = call_routed_model(messages, all_tools_json, on_usage)
+    else:
+        response = call_routed_model(messages, tool_index.json_for(selected_tools), on_usage)
+        # The model asked for a new capability that may only be missing from the subset
+        if signals_missing_capability(tool_index, messages, response) and len(selected_tools) < len(tool_list):
+            print("Model signalled a missing capability, re-offering the full tool set.")
+            response = call_routed_model(messages, all_tools_json, on_usage)
+    
+    return {"messages": [response]}
 
 def init_graph():
     with DynamoDBSaver.from_conn_info(table_name="whatsapp_checkpoint", max_write_request_units=100,max_read_request_units=100, ttl_seconds=86400) as saver:
@@ -52,7 +114,7 @@ def init_graph():
         graph.add_conditional_edges("agent", should_continue, ["tools", END])
         graph.add_edge("tools", "agent")
        
-        app = graph.compile(checkpointer=saver)
+        app = graph.compile(checkpointer=CachedCheckpointSaver(saver))
         return app
 
 min_number_of_messages_to_keep = int(os.environ.get("MSG_HISTORY_TO_KEEP", 10))
@@ -84,15 +146,80 @@ def get_all_userids_and_channels(profile_id):
     items = response.get("Items", [])
     return [(item["userid"], item["channel"]) for item in items]
 
-def handle_message(channel_type, recipient, message):
-    # Step 1: Get profile_id for this user
+def log_latency(bucket, started_at, thread_id):
+    """Logs the end-to-end message latency under the given bucket (fastpath or agent)."""
+    elapsed_ms = (time.perf_counter() - started_at) * 1000
+    print(f"Latency bucket={bucket} ms={elapsed_ms:.1f} thread_id={thread_id}")
+
+def record_fast_path_turn(config, prompt, reply):
+    """Appends a fast path exchange to the thread so the agent keeps the context."""
+    try:
+        app.update_state(config, {"messages": [HumanMessage(prompt), AIMessage(content=json.dumps(reply))]}, as_node="agent")
+    except Exception as e:
+        print(f"Failed to record fast path turn in history: {e}")
+
+def close_interrupted_turn(config, reply):
+    """
+    Ends a run stopped by the step limit with the degraded reply, answering any tool
+    calls that were planned but not executed so the history stays valid for the model.
+    """
+    try:
+        last_message = app.get_state(config).values["messages"][-1]
+        if isinstance(last_message, AIMessage) and last_message.tool_calls:
+            skipped = [ToolMessage(content="Not executed: step limit reached.", tool_call_id=call["id"]) for call in last_message.tool_calls]
+            config = app.update_state(config, {"messages": skipped}, as_node="tools")
+        app.update_state(config, {"messages": [AIMessage(content=json.dumps(reply))]}, as_node="agent")
+    except Exception as e:
+        print(f"Failed to close interrupted turn: {e}")
+
+def build_result(reply, profile_id, channel_type, recipient):
+    return {
+        "fromagent": "awsagent",  # Identifying this agent
+        "nextagent": reply.get("nextagent", ""),  # or another agent name if chaining
+        "message": reply.get("message", ""),
+        "thread_id": profile_id,
+        "channel_type": channel_type,
+        "from": recipient
+    }
+
+def prefetch_secrets():
+    """Fills the secret cache the WhatsApp tool reads from."""
+    for name in WARMUP_SECRETS:
+        get_secret(name)
+
+def prefetch_profile(recipient):
+    """
+    Looks up the profile while the secrets are fetched, then the linked channels while
+    the thread's checkpoint is read for the graph run. Each boto3 resource is used by one
+    thread at a time; they are not thread safe.
+
+    :return: (profile_id, [(userid, channel)]), or (None, None) if the user has no profile.
+    """
+    if not prefetch_enabled:
+        profile_id = get_profile_id(recipient)
+        return profile_id, get_all_userids_and_channels(profile_id) if profile_id else None
+
+    prefetch_executor.submit(prefetch_secrets)
     profile_id = get_profile_id(recipient)
     if not profile_id:
-        print(f"No profile found for user: {recipient}, skipping.")
-        return None
+        return None, None
 
-    # Step 2: Get all associated userids & channels
+    checkpoint = prefetch_executor.submit(app.checkpointer.prefetch, {"configurable": {"thread_id": profile_id}})
     user_profiles = get_all_userids_and_channels(profile_id)
+    try:
+        checkpoint.result()
+    except Exception as e:
+        print(f"Checkpoint prefetch failed, the graph will read it: {e}")
+    return profile_id, user_profiles
+
+def handle_message(channel_type, recipient, message):
+    started_at = time.perf_counter()
+    message_timing.set({"started_at": started_at, "first_llm_call_logged": False})
+    # Step 1 and 2: Get profile_id for this user and all associated userids & channels
+    profile_id, user_profiles = prefetch_profile(recipient)
+    if not profile_id:
+        print(f"No profile found for user: {recipient}, skipping.")
+        return None
 
     # Format profiles for the prompt
     profile_info = "\n".join(
@@ -112,12 +239,42 @@ def handle_message(channel_type, recipient, message):
         f"Respond to user queries either on the originating channel or on the channel explicitly specified in the request.."
     )
 
+    config = {"configurable": {"thread_id": profile_id}}
+
+    # Unambiguous commands are executed directly, without an LLM round trip
+    fast_reply = try_fast_path(message)
+    if fast_reply:
+        if record_fast_path_history:
+            record_fast_path_turn(config, prompt, fast_reply)
+        app.checkpointer.discard_prefetch(profile_id)
+        log_latency("fastpath", started_at, profile_id)
+        return build_result(fast_reply, profile_id, channel_type, recipient)
+
+    # Requests over the profile or global budget get a degraded reply without an LLM call
+    if token_budget:
+        # A budget store outage must not take the agent down with it; only a real over-budget result rejects
+        try:
+            exhausted = token_budget.admit(profile_id)
+        except Exception as e:
+            print(f"Budget check failed for profile {profile_id}, admitting request: {e}")
+            exhausted = None
+        if exhausted:
+            app.checkpointer.discard_prefetch(profile_id)
+            log_latency("degraded", started_at, profile_id)
+            return build_result(degraded_response(exhausted), profile_id, channel_type, recipient)
+
     input_message = {
         "messages": [HumanMessage(prompt)],
     }
 
-    config = {"configurable": {"thread_id": profile_id}}
-    response = app.invoke(input_message, config)
+    try:
+        response = app.invoke(input_message, {**config, "recursion_limit": MAX_GRAPH_STEPS})
+    except GraphRecursionError:
+        print(f"Graph step limit of {MAX_GRAPH_STEPS} reached for thread {profile_id}")
+        reply = degraded_response("steps")
+        close_interrupted_turn(config, reply)
+        log_latency("degraded", started_at, profile_id)
+        return build_result(reply, profile_id, channel_type, recipient)
     print("Unparsed Response History - last 7:", response["messages"][-7:])
     # Step 4: Parse response from Comms-Agent and construct final return response
     agent_response = response["messages"][-1].content
@@ -128,19 +285,59 @@ def handle_message(channel_type, recipient, message):
     parsed_response = json.loads(agent_response)
 
     print("Response:", parsed_response)
+    log_latency("agent", started_at, profile_id)
 
-    return {
-        "fromagent": "awsagent",  # Identifying this agent
-        "nextagent": parsed_response.get("nextagent", ""),  # or another agent name if chaining
-        "message": parsed_response.get("message", ""),
-        "thread_id": profile_id,
-        "channel_type": channel_type,
-        "from": recipient
+    return build_result(parsed_response, profile_id, channel_type, recipient)
+
+def is_warmup_event(event):
+    """{"warmup": true} pings and EventBridge scheduled events."""
+    return event.get("warmup") is True or (event.get("source") == "aws.events" and event.get("detail-type") == "Scheduled Event")
+
+def warm_secrets():
+    missing = [name for name in WARMUP_SECRETS if get_secret(name) is None]
+    if missing:
+        raise ValueError(f"Could not fetch secrets: {missing}")
+    return WARMUP_SECRETS
+
+def warm_up():
+    """
+    Initializes what the first message would otherwise pay for, without running the
+    agent or reading any conversation. Each part is timed and failures are reported
+    rather than raised, so a ping never fails the invocation.
+    """
+    global cold_start
+    started_at = time.perf_counter()
+    parts = {
+        "secrets": warm_secrets,
+        "aws_clients": lambda: [service for service in WARMUP_CLIENTS if aws_client(service)],
+        "profile_table": lambda: table.table_status,
+        # Unused partition key: opens the checkpoint table connection without touching a thread
+        "checkpoint_table": lambda: app.checkpointer.latest_sort_key(WARMUP_THREAD_ID) or "connected",
+        "prompt": lambda: f"{len(load_agent_prompt())} chars, {len(all_tools_json)} tools",
     }
 
+    report = {"warmup": True, "cold_start": cold_start, "parts": {}}
+    for name, init in parts.items():
+        part_started_at = time.perf_counter()
+        try:
+            report["parts"][name] = {"ok": True, "detail": init()}
+        except Exception as e:
+            report["parts"][name] = {"ok": False, "detail": str(e)}
+        report["parts"][name]["ms"] = round((time.perf_counter() - part_started_at) * 1000, 1)
+
+    report["total_ms"] = round((time.perf_counter() - started_at) * 1000, 1)
+    cold_start = False
+    print("Warm-up:", json.dumps(report, default=str))
+    return report
+
 def lambda_handler(event, context):
+    global cold_start
     print("Received event:", json.dumps(event, indent=2))
 
+    if is_warmup_event(event):
+        return warm_up()
+    cold_start = False
+
     # Handle Step Function event with task token
     if "taskToken" in event and "input" in event:
         task_token = event["taskToken"]
@@ -149,7 +346,9 @@ def lambda_handler(event, context):
         recipient = input_data.get("from")
         message = input_data.get("message")
 
-        result = handle_message(channel_type, recipient, message)
+        key = message_key(task_token=task_token)
+        with profiled(profile_mode(input_data), key):
+            result = process_once(key, handle_message, channel_type, recipient, message, lease_seconds=lease_for(context))
         if result:
             stepfunctions.send_task_success(
                 taskToken=task_token,
@@ -161,6 +360,8 @@ def lambda_handler(event, context):
                 error="UserProfileError",
                 cause="Missing profile or invalid input."
             )
+        log_breaker_metrics()
+        log_tier_metrics()
         return
 
     # Handle SQS event
@@ -175,6 +376,11 @@ def lambda_handler(event, context):
                 print("Skipping message due to missing fields")
                 continue
 
-            handle_message(channel_type, recipient, message)
+            # Redelivered records that already completed are skipped, retried ones replay their tool results
+            key = message_key(record=record)
+            with profiled(profile_mode(body), key):
+                process_once(key, handle_message, channel_type, recipient, message, lease_seconds=lease_for(context))
 
+    log_breaker_metrics()
+    log_tier_metrics()
     return
@@ -0,0 +1,141 @@
+import os
+import numpy as np
+
+TREND_WINDOW_DAYS = int(os.getenv("BILLING_TREND_WINDOW_DAYS", 7))
+TOP_MOVERS = int(os.getenv("BILLING_TOP_MOVERS", 5))
+# A day is anomalous when it exceeds the trailing window mean by this many standard deviations
+ANOMALY_Z_SCORE = float(os.getenv("BILLING_ANOMALY_Z_SCORE", 3.0))
+# ... and by at least this amount, so cent-level noise on tiny services is not flagged
+ANOMALY_MIN_DELTA = float(os.getenv("BILLING_ANOMALY_MIN_DELTA", 1.0))
+MAX_ANOMALIES = 10
+
+def fetch_daily_costs(ce, start_date, end_date):
+    """
+    Reads daily unblended cost per service from Cost Explorer, following NextPageToken.
+
+    :return: (dates, services, services x days cost matrix, currency)
+    """
+    params = {
+        "TimePeriod": {"Start": start_date, "End": end_date},
+        "Granularity": "DAILY",
+        "Metrics": ["UnblendedCost"],
+        "GroupBy": [{"Type": "DIMENSION", "Key": "SERVICE"}],
+    }
+    # A day's groups can be split across pages, so columns are keyed by date
+    columns, cells, currency = {}, [], "USD"
+    while True:
+        response = ce.get_cost_and_usage(**params)
+        for period in response.get("ResultsByTime", []):
+            day = columns.setdefault(period["TimePeriod"]["Start"], len(columns))
+            for group in period.get("Groups", []):
+                cost = group["Metrics"]["UnblendedCost"]
+                currency = cost.get("Unit", currency)
+                cells.append((group["Keys"][0], day, float(cost["Amount"])))
+        if not response.get("NextPageToken"):
+            break
+        params["NextPageToken"] = response["NextPageToken"]
+
+    dates = list(columns)
+    services = sorted({service for service, _, _ in cells})
+    row = {service: i for i, service in enumerate(services)}
+    matrix = np.zeros((len(services), len(dates)))
+    if cells:
+        rows, days, amounts = zip(*((row[service], day, amount) for service, day, amount in cells))
+        np.add.at(matrix, (np.array(rows), np.array(days)), np.array(amounts))
+    return dates, services, matrix, currency
+
+def rolling_mean(matrix, window):
+    """Row-wise mean over trailing windows; column j covers days j .. j+window-1."""
+    cumulative = np.cumsum(np.pad(matrix, ((0, 0), (1, 0))), axis=1)
+    return (cumulative[:, window:] - cumulative[:, :-window]) / window
+
+def rolling_std(matrix, window):
+    squares = rolling_mean(matrix ** 2, window)
+    return np.sqrt(np.maximum(squares - rolling_mean(matrix, window) ** 2, 0))
+
+def top_movers(services, matrix, window):
+    """Services whose average daily cost changed most between the previous and the last window."""
+    last = matrix[:, -window:].mean(axis=1)
+    previous = matrix[:, -2 * window:-window].mean(axis=1)
+    change = last - previous
+    with np.errstate(divide="ignore", invalid="ignore"):
+        change_pct = np.where(previous > 0, 100 * change / previous, np.nan)
+    movers = []
+    for i in np.argsort(-np.abs(change))[:TOP_MOVERS]:
+        if change[i] == 0:
+            break
+        movers.append({
+            "service": services[i],
+            "prev_daily_avg": round(float(previous[i]), 2),
+            "last_daily_avg": round(float(last[i]), 2),
+            "change": round(float(change[i]), 2),
+            "change_pct": None if np.isnan(change_pct[i]) else round(float(change_pct[i]), 1),
+        })
+    return movers
+
+def anomalies(dates, services, matrix, window):
+    """Days on which a service cost far more than its trailing window, most severe first."""
+    # Baseline for day j is the window ending the day before it
+    baseline = rolling_mean(matrix, window)[:, :-1]
+    spread = rolling_std(matrix, window)[:, :-1]
+    observed = matrix[:, window:]
+    excess = observed - baseline
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z_scores = np.where(spread > 0, excess / spread, np.inf)
+    flagged = (excess >= ANOMALY_MIN_DELTA) & (z_scores >= ANOMALY_Z_SCORE)
+
+    rows, days = np.nonzero(flagged)
+    order = np.argsort(-excess[rows, days])[:MAX_ANOMALIES]
+    return [{
+        "service": services[rows[i]],
+        "date": dates[days[i] + window],
+        "cost": round(float(observed[rows[i], days[i]]), 2),
+        "baseline": round(float(baseline[rows[i], days[i]]), 2),
+        "z_score": None if np.isinf(z_scores[rows[i], days[i]]) else round(float(z_scores[rows[i], days[i]]), 1),
+    } for i in order]
+
+def summarize_costs(dates, services, matrix, currency, start_date, end_date):
+    """
+    Reduces the services x days matrix to the billing summary returned to the agent:
+    per-service totals plus daily trend, top movers and anomaly flags.
+    """
+    service_totals = matrix.sum(axis=1)
+    daily_totals = matrix.sum(axis=0)
+    summary = {
+        "total_cost": round(float(service_totals.sum()), 2),
+        "currency": currency,
+        "service_costs": [
+            {"service": services[i], "cost": round(float(service_totals[i]), 2)}
+            # Free-tier and credit-only services would only add noise to the prompt
+            for i in np.argsort(-service_totals, kind="stable") if round(float(service_totals[i]), 2) != 0
+        ],
+        "start_date": start_date,
+        "end_date": end_date,
+    }
+    if len(dates) < 2:
+        return summary
+
+    day_over_day = np.diff(daily_totals)
+    summary["daily"] = {
+        "average": round(float(daily_totals.mean()), 2),
+        "last_day": dates[-1],
+        "last_day_cost": round(float(daily_totals[-1]), 2),
+        "last_day_change": round(float(day_over_day[-1]), 2),
+        "largest_increase": {"date": dates[int(day_over_day.argmax()) + 1], "change": round(float(day_over_day.max()), 2)},
+    }
+
+    # Windows shrink for short periods so that two of them still fit
+    window = min(TREND_WINDOW_DAYS, len(dates) // 2)
+    if window >= 1:
+        daily_rolling = rolling_mean(daily_totals[np.newaxis, :], window)[0]
+        summary["trend"] = {
+            "window_days": window,
+            "prev_daily_avg": round(float(daily_totals[-2 * window:-window].mean()), 2),
+            "last_daily_avg": round(float(daily_rolling[-1]), 2),
+            # Non-overlapping windows ending on the last day, oldest first
+            "rolling_daily_avg": [round(float(v), 2) for v in daily_rolling[::-window][:8][::-1]],
+        }
+        summary["top_movers"] = top_movers(services, matrix, window)
+    if window >= 2 and len(services):
+        summary["anomalies"] = anomalies(dates, services, matrix, window)
+    return summary
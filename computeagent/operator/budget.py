@@ -0,0 +1,253 @@
+import os
+import threading
+import time
+import botocore.exceptions
+from resilience import aws_client, backoff_delay
+
+BUDGET_ENABLED = os.getenv("BUDGET_ENABLED", "true").lower() == "true"
+BUDGET_TABLE = os.getenv("BUDGET_TABLE")
+BUDGET_WINDOW_SECONDS = int(os.getenv("BUDGET_WINDOW_SECONDS", 60))
+# Per graph run; agent -> tools -> agent is two steps per tool round
+MAX_GRAPH_STEPS = int(os.getenv("MAX_GRAPH_STEPS", 12))
+# Every admission updates the one global item, so concurrent transactions conflict on it
+ADMIT_MAX_ATTEMPTS = int(os.getenv("BUDGET_ADMIT_MAX_ATTEMPTS", 4))
+
+# (requests, tokens) allowed per window. The global limits sit below the OpenAI rate limit
+LIMITS = {
+    "profile": (int(os.getenv("PROFILE_REQUESTS_PER_WINDOW", 10)), int(os.getenv("PROFILE_TOKENS_PER_WINDOW", 60000))),
+    "global": (int(os.getenv("GLOBAL_REQUESTS_PER_WINDOW", 200)), int(os.getenv("GLOBAL_TOKENS_PER_WINDOW", 800000))),
+}
+
+GLOBAL_SCOPE = "global"
+TOTAL_WINDOW = "total"
+
+DEGRADED_MESSAGES = {
+    "profile": "You have sent a lot of requests in a short time. Please wait a minute and try again.",
+    "global": "Loki is handling a lot of requests right now. Please try again in a minute.",
+    "steps": "This request needed more steps than allowed for one message. Please split it into smaller requests.",
+}
+
+def profile_scope(profile_id):
+    return f"profile#{profile_id}"
+
+def current_window(now=None):
+    return int((now or time.time()) // BUDGET_WINDOW_SECONDS) * BUDGET_WINDOW_SECONDS
+
+def degraded_response(reason):
+    """The {"nextagent", "message"} envelope returned instead of running the agent."""
+    return {"nextagent": "comms-agent", "message": DEGRADED_MESSAGES[reason]}
+
+class MemoryBudgetStore:
+    """Counters in process memory, used for local runs and tests. Each container has its own budget."""
+
+    def __init__(self):
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def _counter(self, scope, window):
+        return self.counters.setdefault((scope, str(window)), {"requests": 0, "tokens": 0, "rejected": 0})
+
+    def admit(self, scopes, window):
+        with self.lock:
+            for scope, (max_requests, max_tokens) in scopes:
+                counter = self._counter(scope, window)
+                if counter["requests"] >= max_requests or counter["tokens"] >= max_tokens:
+                    self._counter(scopes[0][0], TOTAL_WINDOW)["rejected"] += 1
+                    return scope
+            for scope, _ in scopes:
+                self._counter(scope, window)["requests"] += 1
+            self._counter(scopes[0][0], TOTAL_WINDOW)["requests"] += 1
+            # Drop windows that can no longer be charged
+            for key in [k for k in self.counters if k[1] != TOTAL_WINDOW and int(k[1]) < window]:
+                del self.counters[key]
+            return None
+
+    def charge(self, scopes, window, tokens):
+        with self.lock:
+            used = {}
+            for scope in scopes:
+                counter = self._counter(scope, window)
+                counter["tokens"] += tokens
+                used[scope] = counter["tokens"]
+            self._counter(scopes[0], TOTAL_WINDOW)["tokens"] += tokens
+            return used
+
+    def usage(self, scope):
+        with self.lock:
+            return [{"window": w, **dict(c)} for (s, w), c in self.counters.items() if s == scope]
+
+class DynamoDBBudgetStore:
+    """
+    Counters in a DynamoDB table keyed by scope and window start, shared by all containers.
+    Window items expire through the table's TTL; the per-profile "total" item is kept.
+    """
+
+    def __init__(self, table_name):
+        self.table_name = table_name
+        self.client = aws_client("dynamodb")
+
+    def _key(self, scope, window):
+        return {"scope": {"S": scope}, "window": {"S": str(window)}}
+
+    def admit(self, scopes, window):
+        expires_at = {"N": str(window + 2 * BUDGET_WINDOW_SECONDS)}
+        items = []
+        for scope, (max_requests, max_tokens) in scopes:
+            items.append({"Update": {
+                "TableName": self.table_name,
+                "Key": self._key(scope, window),
+                "UpdateExpression": "ADD requests :one SET expires_at = :expires_at",
+                "ConditionExpression": "(attribute_not_exists(requests) OR requests < :max_requests) "
+                                       "AND (attribute_not_exists(tokens) OR tokens < :max_tokens)",
+                "ExpressionAttributeValues": {
+                    ":one": {"N": "1"},
+                    ":expires_at": expires_at,
+                    ":max_requests": {"N": str(max_requests)},
+                    ":max_tokens": {"N": str(max_tokens)},
+                },
+            }})
+        items.append({"Update": {
+            "TableName": self.table_name,
+            "Key": self._key(scopes[0][0], TOTAL_WINDOW),
+            "UpdateExpression": "ADD requests :one",
+            "ExpressionAttributeValues": {":one": {"N": "1"}},
+        }})
+
+        # All scopes are checked and incremented atomically, so a rejection consumes nothing
+        for attempt in range(ADMIT_MAX_ATTEMPTS):
+            try:
+                self.client.transact_write_items(TransactItems=items)
+                return None
+            except botocore.exceptions.ClientError as e:
+                if e.response["Error"]["Code"] != "TransactionCanceledException":
+                    raise
+                reasons = e.response.get("CancellationReasons", [])
+                rejected = next(
+                    (scope for (scope, _), reason in zip(scopes, reasons) if reason.get("Code") == "ConditionalCheckFailed"),
+                    None,
+                )
+                if rejected is not None:
+                    break
+                conflict = any(reason.get("Code") == "TransactionConflict" for reason in reasons)
+                if not conflict or attempt == ADMIT_MAX_ATTEMPTS - 1:
+                    raise
+                print(f"Budget admission conflicted with a concurrent transaction, retrying (attempt {attempt + 1})")
+                time.sleep(backoff_delay(attempt))
+        self.client.update_item(
+            TableName=self.table_name,
+            Key=self._key(scopes[0][0], TOTAL_WINDOW),
+            UpdateExpression="ADD rejected :one",
+            ExpressionAttributeValues={":one": {"N": "1"}},
+        )
+        return rejected
+
+    def charge(self, scopes, window, tokens):
+        used = {}
+        for scope in scopes:
+            response = self.client.update_item(
+                TableName=self.table_name,
+                Key=self._key(scope, window),
+                UpdateExpression="ADD tokens :tokens SET expires_at = if_not_exists(expires_at, :expires_at)",
+                ExpressionAttributeValues={
+                    ":tokens": {"N": str(tokens)},
+                    ":expires_at": {"N": str(window + 2 * BUDGET_WINDOW_SECONDS)},
+                },
+                ReturnValues="UPDATED_NEW",
+            )
+            used[scope] = int(response["Attributes"]["tokens"]["N"])
+        self.client.update_item(
+            TableName=self.table_name,
+            Key=self._key(scopes[0], TOTAL_WINDOW),
+            UpdateExpression="ADD tokens :tokens",
+            ExpressionAttributeValues={":tokens": {"N": str(tokens)}},
+        )
+        return used
+
+    def usage(self, scope):
+        items = []
+        params = {
+            "TableName": self.table_name,
+            "KeyConditionExpression": "#scope = :scope",
+            "ExpressionAttributeNames": {"#scope": "scope"},
+            "ExpressionAttributeValues": {":scope": {"S": scope}},
+        }
+        while True:
+            response = self.client.query(**params)
+            for item in response.get("Items", []):
+                items.append({
+                    "window": item["window"]["S"],
+                    **{name: int(item[name]["N"]) for name in ("requests", "tokens", "rejected") if name in item},
+                })
+            if "LastEvaluatedKey" not in response:
+                return items
+            params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+class TokenBudget:
+    """
+    Admission control for agent runs, per profile and across all profiles.
+
+    Each scope has a request and a token allowance per fixed window. A message is admitted
+    only if every scope has requests and tokens left; tokens are charged after each LLM
+    call from the reported usage, and a scope that went over stops further LLM calls in
+    this container until its window rolls over.
+    """
+
+    def __init__(self, store, limits=LIMITS):
+        self.store = store
+        self.limits = limits
+        self.exhausted_until = {}
+
+    @classmethod
+    def from_env(cls):
+        if not BUDGET_ENABLED:
+            return None
+        if BUDGET_TABLE:
+            return cls(DynamoDBBudgetStore(BUDGET_TABLE))
+        return cls(MemoryBudgetStore())
+
+    def scopes(self, profile_id):
+        return [(profile_scope(profile_id), self.limits["profile"]), (GLOBAL_SCOPE, self.limits["global"])]
+
+    def admit(self, profile_id):
+        """Counts one request against the profile and global budgets. Returns None or the exhausted limit."""
+        rejected = self.store.admit(self.scopes(profile_id), current_window())
+        if rejected is None:
+            return None
+        print(f"Budget exhausted scope={rejected} profile_id={profile_id}")
+        return "global" if rejected == GLOBAL_SCOPE else "profile"
+
+    def charge(self, profile_id, tokens):
+        """Charges the tokens of one LLM call to the profile and global budgets."""
+        if tokens <= 0:
+            return
+        window = current_window()
+        scopes = self.scopes(profile_id)
+        used = self.store.charge([scope for scope, _ in scopes], window, tokens)
+        for scope, (_, max_tokens) in scopes:
+            if used[scope] >= max_tokens:
+                self.exhausted_until[scope] = window + BUDGET_WINDOW_SECONDS
+
+    def exhausted(self, profile_id):
+        """Returns the limit that blocks further LLM calls for this profile, or None."""
+        now = time.time()
+        for scope, _ in self.scopes(profile_id):
+            if self.exhausted_until.get(scope, 0) > now:
+                return "global" if scope == GLOBAL_SCOPE else "profile"
+        return None
+
+    def get_usage(self, profile_id):
+        """Per-window and all-time request, token and rejection counts of a profile."""
+        windows = self.store.usage(profile_scope(profile_id))
+        total = next((w for w in windows if w["window"] == TOTAL_WINDOW), {})
+        return {
+            "profile_id": profile_id,
+            "total": {name: total.get(name, 0) for name in ("requests", "tokens", "rejected")},
+            "windows": sorted((w for w in windows if w["window"] != TOTAL_WINDOW), key=lambda w: int(w["window"])),
+        }
+
+token_budget = TokenBudget.from_env()
+
+def get_usage(profile_id):
+    if token_budget is None:
+        return None
+    return token_budget.get_usage(profile_id)
@@ -0,0 +1,194 @@
+from resilience import aws_client
+import botocore.exceptions
+from concurrent.futures import ThreadPoolExecutor
+
+EC2_BATCH_SIZE = 100
+RDS_MAX_WORKERS = 10
+
+# State an instance must be in for the action to apply
+EC2_ELIGIBLE_STATE = {"start": "stopped", "stop": "running"}
+RDS_ELIGIBLE_STATE = {"start": "stopped", "stop": "available"}
+
+def has_selector(instance_ids, name_contains, tag_key):
+    return bool(instance_ids or name_contains or tag_key)
+
+def tag_matches(tags, tag_key, tag_value):
+    if not tag_key:
+        return True
+    return any(tag["Key"] == tag_key and (tag_value is None or tag["Value"] == tag_value) for tag in tags)
+
+def resolve_ec2_instances(client, instance_ids=None, name_contains=None, tag_key=None, tag_value=None):
+    """
+    Resolves EC2 instances from an ID list and/or a Name substring and tag selector,
+    using server-side filters so only matching instances are returned.
+    """
+    if instance_ids:
+        # Filtering by instance-id instead of InstanceIds, which fails the whole call on one unknown ID
+        instances = []
+        for start in range(0, len(instance_ids), EC2_BATCH_SIZE):
+            batch = list(instance_ids[start:start + EC2_BATCH_SIZE])
+            instances += describe_ec2_instances(client, name_contains, tag_key, tag_value, [{"Name": "instance-id", "Values": batch}])
+        return instances
+    return describe_ec2_instances(client, name_contains, tag_key, tag_value, [])
+
+def describe_ec2_instances(client, name_contains, tag_key, tag_value, filters):
+    params = {"Filters": filters}
+    if name_contains:
+        params["Filters"].append({"Name": "tag:Name", "Values": [f"*{name_contains}*"]})
+    if tag_key and tag_value is not None:
+        params["Filters"].append({"Name": f"tag:{tag_key}", "Values": [tag_value]})
+    elif tag_key:
+        params["Filters"].append({"Name": "tag-key", "Values": [tag_key]})
+
+    instances = []
+    for page in client.get_paginator("describe_instances").paginate(**params):
+        for reservation in page["Reservations"]:
+            for instance in reservation["Instances"]:
+                instances.append({
+                    "ResourceId": instance["InstanceId"],
+                    "Name": next((tag["Value"] for tag in instance.get("Tags", []) if tag["Key"] == "Name"), "Unknown"),
+                    "PreviousState": instance["State"]["Name"],
+                })
+    return instances
+
+def call_ec2_action(client, action, instance_ids, dry_run):
+    """Issues one StartInstances/StopInstances call and returns {instance_id: (result, detail)}."""
+    api = client.start_instances if action == "start" else client.stop_instances
+    try:
+        response = api(InstanceIds=instance_ids, DryRun=dry_run)
+    except botocore.exceptions.ClientError as e:
+        code = e.response["Error"]["Code"]
+        if dry_run and code == "DryRunOperation":
+            return {instance_id: ("dry_run_ok", f"Would {action} instance.") for instance_id in instance_ids}
+        return {instance_id: ("error", str(e)) for instance_id in instance_ids}
+
+    key = "StartingInstances" if action == "start" else "StoppingInstances"
+    return {i["InstanceId"]: ("ok", i["CurrentState"]["Name"]) for i in response.get(key, [])}
+
+def bulk_ec2_action(action, instance_ids=None, name_contains=None, tag_key=None, tag_value=None, dry_run=False):
+    """
+    Starts or stops every EC2 instance matching the selector with as few API calls as possible.
+
+    Instances already in the target state are skipped. Eligible instances are sent in
+    batches of EC2_BATCH_SIZE; if a batch fails, its instances are retried one by one
+    so one bad instance does not fail the rest.
+    """
+    if action not in EC2_ELIGIBLE_STATE:
+        return {"error": f"Unsupported action '{action}', expected 'start' or 'stop'."}
+    if not has_selector(instance_ids, name_contains, tag_key):
+        return {"error": "Provide instance_ids, name_contains or tag_key to select instances."}
+
+    client = aws_client("ec2")
+    instances = resolve_ec2_instances(client, instance_ids, name_contains, tag_key, tag_value)
+    eligible = [i["ResourceId"] for i in instances if i["PreviousState"] == EC2_ELIGIBLE_STATE[action]]
+
+    outcomes = {}
+    for start in range(0, len(eligible), EC2_BATCH_SIZE):
+        batch = eligible[start:start + EC2_BATCH_SIZE]
+        batch_outcomes = call_ec2_action(client, action, batch, dry_run)
+        if len(batch) > 1 and all(result == "error" for result, _ in batch_outcomes.values()):
+            for instance_id in batch:
+                batch_outcomes.update(call_ec2_action(client, action, [instance_id], dry_run))
+        outcomes.update(batch_outcomes)
+
+    return summarize("ec2", action, dry_run, instances, outcomes, EC2_ELIGIBLE_STATE[action], unresolved(instance_ids, instances))
+
+def unresolved(instance_ids, instances):
+    """Requested IDs that matched no instance, in request order."""
+    found = {instance["ResourceId"] for instance in instances}
+    return [resource_id for resource_id in dict.fromkeys(instance_ids or []) if resource_id not in found]
+
+def resolve_rds_instances(client, instance_ids=None, name_contains=None, tag_key=None, tag_value=None):
+    """Resolves RDS instances by identifier list, identifier substring and/or tag."""
+    wanted = set(instance_ids or [])
+    instances = []
+    for page in client.get_paginator("describe_db_instances").paginate():
+        for db in page["DBInstances"]:
+            identifier = db["DBInstanceIdentifier"]
+            if wanted and identifier not in wanted:
+                continue
+            if name_contains and name_contains.lower() not in identifier.lower():
+                continue
+            if not tag_matches(db.get("TagList", []), tag_key, tag_value):
+                continue
+            instances.append({
+                "ResourceId": identifier,
+                "Name": identifier,
+                "PreviousState": db["DBInstanceStatus"],
+                "ClusterMember": bool(db.get("DBClusterIdentifier")),
+            })
+    return instances
+
+def call_rds_action(client, action, identifier):
+    api = client.start_db_instance if action == "start" else client.stop_db_instance
+    try:
+        response = api(DBInstanceIdentifier=identifier)
+        return identifier, ("ok", response["DBInstance"]["DBInstanceStatus"])
+    except botocore.exceptions.ClientError as e:
+        return identifier, ("error", str(e))
+
+def bulk_rds_action(action, instance_ids=None, name_contains=None, tag_key=None, tag_value=None, dry_run=False):
+    """
+    Starts or stops every RDS instance matching the selector. RDS has no batch API,
+    so the per-instance calls are issued concurrently.
+    """
+    if action not in RDS_ELIGIBLE_STATE:
+        return {"error": f"Unsupported action '{action}', expected 'start' or 'stop'."}
+    if not has_selector(instance_ids, name_contains, tag_key):
+        return {"error": "Provide instance_ids, name_contains or tag_key to select instances."}
+
+    client = aws_client("rds")
+    instances = resolve_rds_instances(client, instance_ids, name_contains, tag_key, tag_value)
+    outcomes = {}
+    eligible = []
+    for instance in instances:
+        if instance["ClusterMember"]:
+            outcomes[instance["ResourceId"]] = ("skipped", "Aurora cluster members are started and stopped with their cluster.")
+        elif instance["PreviousState"] == RDS_ELIGIBLE_STATE[action]:
+            eligible.append(instance["ResourceId"])
+
+    if dry_run:
+        outcomes.update({identifier: ("dry_run_ok", f"Would {action} instance.") for identifier in eligible})
+    elif eligible:
+        with ThreadPoolExecutor(max_workers=min(RDS_MAX_WORKERS, len(eligible))) as executor:
+            outcomes.update(executor.map(lambda identifier: call_rds_action(client, action, identifier), eligible))
+
+    return summarize("rds", action, dry_run, instances, outcomes, RDS_ELIGIBLE_STATE[action], unresolved(instance_ids, instances))
+
+def summarize(service, action, dry_run, instances, outcomes, eligible_state, not_found=()):
+    """
+    Builds the consolidated per-resource result returned to the agent. Requested IDs
+    that matched no instance are reported as "not_found" so a partial match is visible.
+    """
+    results = []
+    for instance in instances:
+        resource_id = instance["ResourceId"]
+        result, detail = outcomes.get(resource_id, ("skipped", f"Instance is '{instance['PreviousState']}', not '{eligible_state}'."))
+        results.append({
+            "ResourceId": resource_id,
+            "Name": instance["Name"],
+            "PreviousState": instance["PreviousState"],
+            "Result": result,
+            "Detail": detail,
+        })
+    for resource_id in not_found:
+        results.append({
+            "ResourceId": resource_id,
+            "Name": "Unknown",
+            "PreviousState": None,
+            "Result": "not_found",
+            "Detail": "No instance with this ID matches the selection.",
+        })
+
+    counts = {}
+    for r in results:
+        counts[r["Result"]] = counts.get(r["Result"], 0) + 1
+
+    return {
+        "service": service,
+        "action": action,
+        "dry_run": dry_run,
+        "matched": len(instances),
+        "counts": counts,
+        "results": results,
+    }
@@ -0,0 +1,239 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from boto3.dynamodb.conditions import Key
+from langgraph.checkpoint.base import WRITES_IDX_MAP, BaseCheckpointSaver, CheckpointTuple, get_checkpoint_id
+
+CHECKPOINT_CACHE_ENABLED = os.getenv("CHECKPOINT_CACHE_ENABLED", "true").lower() == "true"
+# Sized for the 512MB Lambda: the graph, boto3 and langchain need the rest
+CHECKPOINT_CACHE_MAX_MB = float(os.getenv("CHECKPOINT_CACHE_MAX_MB", 64))
+
+# Separator DynamoDBSaver uses in the sort keys of pending writes: <checkpoint_id>$<task_id>$<idx>
+SK_SEPARATOR = "$"
+
+# A prefetched checkpoint is only served to a graph run that starts right after the prefetch
+PREFETCH_MAX_AGE_SECONDS = 10
+
+class CachedCheckpointSaver(BaseCheckpointSaver):
+    """
+    Write-through cache in front of DynamoDBSaver for the latest checkpoint of each thread.
+
+    Checkpoints written by this container are kept in memory (serialized, so the graph
+    cannot mutate them) with the sort keys of the checkpoint and its pending writes.
+    Before a cached checkpoint is served, a keys-only query reads every sort key from
+    the cached checkpoint on; newer checkpoints and pending writes all sort after it, so
+    an unchanged key set means nobody else wrote to the thread. Comparing only the
+    newest key would miss a write whose task_id sorts below an existing one. Entries are
+    evicted least recently used once the cache exceeds its byte cap.
+    """
+
+    def __init__(self, saver, max_bytes=int(CHECKPOINT_CACHE_MAX_MB * 1024 * 1024)):
+        super().__init__(serde=saver.serde)
+        self.saver = saver
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.prefetched = {}
+        self.stats = {"hits": 0, "misses": 0, "stale": 0, "evictions": 0, "prefetched": 0}
+        # A reducer changes the checkpoint on write, so the cached copy would differ from the stored one
+        self.enabled = CHECKPOINT_CACHE_ENABLED and getattr(saver, "reducer", None) is None
+
+    @property
+    def config_specs(self):
+        return self.saver.config_specs
+
+    def get_next_version(self, current, channel):
+        return self.saver.get_next_version(current, channel)
+
+    def latest_sort_key(self, thread_id):
+        """Cheap freshness read: only the newest sort key of the thread's partition."""
+        response = self.saver.table.query(
+            KeyConditionExpression=Key("PK").eq(thread_id),
+            ScanIndexForward=False,
+            Limit=1,
+            ProjectionExpression="SK",
+            ConsistentRead=True,
+        )
+        items = response.get("Items", [])
+        return items[0]["SK"] if items else None
+
+    def sort_keys_since(self, thread_id, checkpoint_id):
+        """Sort keys of the checkpoint, its pending writes and everything newer in the thread."""
+        params = {
+            "KeyConditionExpression": Key("PK").eq(thread_id) & Key("SK").gte(checkpoint_id),
+            "ProjectionExpression": "SK",
+            "ConsistentRead": True,
+        }
+        sort_keys = set()
+        while True:
+            response = self.saver.table.query(**params)
+            sort_keys.update(item["SK"] for item in response.get("Items", []))
+            if "LastEvaluatedKey" not in response:
+                return frozenset(sort_keys)
+            params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    def _cacheable(self, config):
+        return self.enabled and config["configurable"].get("checkpoint_ns", "") == ""
+
+    def _store(self, thread_id, entry):
+        with self.lock:
+            self._drop(thread_id)
+            self.entries[thread_id] = entry
+            self.size += entry["size"]
+            while self.size > self.max_bytes and self.entries:
+                evicted_id, evicted = self.entries.popitem(last=False)
+                self.size -= evicted["size"]
+                self.stats["evictions"] += 1
+
+    def _drop(self, thread_id):
+        entry = self.entries.pop(thread_id, None)
+        if entry:
+            self.size -= entry["size"]
+
+    def _to_tuple(self, entry):
+        loads = self.serde.loads_typed
+        writes = sorted(entry["writes"].items(), key=lambda item: item[0][1])
+        return CheckpointTuple(
+            config=entry["config"],
+            checkpoint=loads(entry["checkpoint"]),
+            metadata=loads(entry["metadata"]),
+            parent_config=entry["parent_config"],
+            pending_writes=[(task_id, channel, loads(value)) for _, (task_id, channel, value) in writes],
+        )
+
+    def _entry_from_tuple(self, tup, sort_keys):
+        dumps = self.serde.dumps_typed
+        checkpoint, metadata = dumps(tup.checkpoint), dumps(tup.metadata)
+        writes = {}
+        for idx, (task_id, channel, value) in enumerate(tup.pending_writes or []):
+            writes[(task_id, WRITES_IDX_MAP.get(channel, idx))] = (task_id, channel, dumps(value))
+        return {
+            "config": tup.config,
+            "parent_config": tup.parent_config,
+            "checkpoint": checkpoint,
+            "metadata": metadata,
+            "writes": writes,
+            "sort_keys": sort_keys,
+            "size": len(checkpoint[1]) + len(metadata[1]) + sum(len(w[2][1]) for w in writes.values()),
+        }
+
+    def prefetch(self, config):
+        """
+        Reads the latest checkpoint of a thread ahead of the graph run, e.g. concurrently
+        with other lookups. The next get_tuple for the thread is served from the result once.
+        """
+        tup = self.get_tuple(config)
+        with self.lock:
+            self.prefetched[config["configurable"]["thread_id"]] = (tup, time.monotonic())
+        return tup
+
+    def discard_prefetch(self, thread_id):
+        with self.lock:
+            self.prefetched.pop(thread_id, None)
+
+    def get_tuple(self, config):
+        if config["configurable"].get("checkpoint_ns", "") == "" and get_checkpoint_id(config) is None:
+            with self.lock:
+                prefetched = self.prefetched.pop(config["configurable"]["thread_id"], None)
+            if prefetched and time.monotonic() - prefetched[1] < PREFETCH_MAX_AGE_SECONDS:
+                self.stats["prefetched"] += 1
+                return prefetched[0]
+
+        if not self._cacheable(config):
+            return self.saver.get_tuple(config)
+
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_id = get_checkpoint_id(config)
+        with self.lock:
+            entry = self.entries.get(thread_id)
+            if entry:
+                self.entries.move_to_end(thread_id)
+
+        if entry and checkpoint_id in (None, entry["config"]["configurable"]["checkpoint_id"]):
+            if self.sort_keys_since(thread_id, entry["config"]["configurable"]["checkpoint_id"]) == entry["sort_keys"]:
+                self.stats["hits"] += 1
+                return self._to_tuple(entry)
+            self.stats["stale"] += 1
+        else:
+            self.stats["misses"] += 1
+
+        tup = self.saver.get_tuple(config)
+        if tup and checkpoint_id is None:
+            # Only the latest checkpoint is cached, and only if the keys read after the fetch
+            # account for exactly what was fetched; otherwise another writer got in between
+            fetched_id = tup.config["configurable"]["checkpoint_id"]
+            sort_keys = self.sort_keys_since(thread_id, fetched_id)
+            write_keys = [sk for sk in sort_keys if sk.startswith(fetched_id + SK_SEPARATOR)]
+            if len(sort_keys) == len(write_keys) + 1 and len(write_keys) == len(tup.pending_writes or []):
+                self._store(thread_id, self._entry_from_tuple(tup, sort_keys))
+            else:
+                with self.lock:
+                    self._drop(thread_id)
+        return tup
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        self.discard_prefetch(config["configurable"]["thread_id"])
+        next_config = self.saver.put(config, checkpoint, metadata, new_versions)
+        if self._cacheable(config):
+            dumps = self.serde.dumps_typed
+            serialized_checkpoint, serialized_metadata = dumps(checkpoint), dumps(metadata)
+            parent_config = None
+            if config["configurable"].get("checkpoint_id"):
+                parent_config = {"configurable": {key: config["configurable"][key] for key in ("thread_id", "checkpoint_ns", "checkpoint_id")}}
+            self._store(next_config["configurable"]["thread_id"], {
+                "config": next_config,
+                "parent_config": parent_config,
+                "checkpoint": serialized_checkpoint,
+                "metadata": serialized_metadata,
+                "writes": {},
+                "sort_keys": frozenset([checkpoint["id"]]),
+                "size": len(serialized_checkpoint[1]) + len(serialized_metadata[1]),
+            })
+        return next_config
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        self.saver.put_writes(config, writes, task_id, task_path)
+        if not self._cacheable(config):
+            return
+
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        with self.lock:
+            entry = self.entries.get(thread_id)
+            if not entry or entry["config"]["configurable"]["checkpoint_id"] != checkpoint_id:
+                return
+            for idx, (channel, value) in enumerate(writes):
+                write_idx = WRITES_IDX_MAP.get(channel, idx)
+                serialized = self.serde.dumps_typed(value)
+                previous = entry["writes"].get((task_id, write_idx))
+                entry["size"] += len(serialized[1]) - (len(previous[2][1]) if previous else 0)
+                self.size += len(serialized[1]) - (len(previous[2][1]) if previous else 0)
+                entry["writes"][(task_id, write_idx)] = (task_id, channel, serialized)
+                entry["sort_keys"] = entry["sort_keys"] | {SK_SEPARATOR.join([checkpoint_id, task_id, str(write_idx)])}
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        return self.saver.list(config, filter=filter, before=before, limit=limit)
+
+    def delete_thread(self, thread_id):
+        with self.lock:
+            self._drop(thread_id)
+        self.saver.delete_thread(thread_id)
+
+    async def aget_tuple(self, config):
+        return await asyncio.get_running_loop().run_in_executor(None, self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        async for item in self.saver.alist(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.get_running_loop().run_in_executor(None, self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        await asyncio.get_running_loop().run_in_executor(None, self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id):
+        await asyncio.get_running_loop().run_in_executor(None, self.delete_thread, thread_id)
@@ -0,0 +1,165 @@
+import boto3
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+CHECKPOINT_TABLE = os.getenv("CHECKPOINT_TABLE", "whatsapp_checkpoint")
+KEEP_CHECKPOINTS = int(os.getenv("COMPACTION_KEEP_CHECKPOINTS", 5))
+SCAN_SEGMENTS = int(os.getenv("COMPACTION_SCAN_SEGMENTS", 8))
+DELETE_CHUNK_SIZE = 500
+
+# DynamoDBSaver key layout: checkpoint$<thread>$<ns>$<checkpoint_id> and writes$<thread>$<ns>$<checkpoint_id>$<task>$<idx>
+KEY_SEPARATOR = "$"
+
+_thread_local = threading.local()
+
+def thread_table(table_name):
+    """boto3 resources are not thread safe, so every worker thread gets its own Table."""
+    if getattr(_thread_local, "table_name", None) != table_name:
+        _thread_local.table = boto3.resource("dynamodb").Table(table_name)
+        _thread_local.table_name = table_name
+    return _thread_local.table
+
+def value_size(value):
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    if isinstance(value, (int, float, Decimal)):
+        return len(str(value))
+    if isinstance(value, dict):
+        return sum(len(k) + value_size(v) for k, v in value.items())
+    if isinstance(value, (list, set, tuple)):
+        return sum(value_size(v) for v in value)
+    return 1
+
+def item_size(item):
+    """Approximate DynamoDB item size: attribute names plus values."""
+    return sum(len(name) + value_size(value) for name, value in item.items())
+
+def scan_segment(table_name, segment, total_segments):
+    """
+    Scans one segment and returns per-thread checkpoints and writes with their sizes:
+    {thread_id: {"checkpoints": [(ns, checkpoint_id, sk, size)], "writes": [(ns, checkpoint_id, sk, size)]}}
+    """
+    threads = defaultdict(lambda: {"checkpoints": [], "writes": []})
+    scanned = scanned_bytes = 0
+    params = {"Segment": segment, "TotalSegments": total_segments}
+    while True:
+        response = thread_table(table_name).scan(**params)
+        for item in response.get("Items", []):
+            size = item_size(item)
+            scanned += 1
+            scanned_bytes += size
+            parts = item.get("checkpoint_key", "").split(KEY_SEPARATOR)
+            if parts[0] == "checkpoint" and len(parts) == 4:
+                threads[item["PK"]]["checkpoints"].append((parts[2], parts[3], item["SK"], size))
+            elif parts[0] == "writes" and len(parts) >= 5:
+                threads[item["PK"]]["writes"].append((parts[2], parts[3], item["SK"], size))
+        if "LastEvaluatedKey" not in response:
+            return threads, scanned, scanned_bytes
+        params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+def select_victims(thread, keep):
+    """
+    Picks the items to delete for one thread: every checkpoint older than the newest
+    `keep` per namespace, plus the pending writes of deleted or missing checkpoints
+    that are older than the oldest kept one.
+    """
+    by_namespace = defaultdict(list)
+    for ns, checkpoint_id, sk, size in thread["checkpoints"]:
+        by_namespace[ns].append((checkpoint_id, sk, size))
+
+    victims = []
+    oldest_kept = {}
+    for ns, checkpoints in by_namespace.items():
+        checkpoints.sort(reverse=True)
+        oldest_kept[ns] = checkpoints[:keep][-1][0]
+        victims += [(sk, size, "checkpoint") for _, sk, size in checkpoints[keep:]]
+
+    for ns, checkpoint_id, sk, size in thread["writes"]:
+        if ns in oldest_kept and checkpoint_id < oldest_kept[ns]:
+            victims.append((sk, size, "writes"))
+    return victims
+
+def delete_chunk(table_name, thread_id, keys):
+    with thread_table(table_name).batch_writer() as batch:
+        for sk in keys:
+            batch.delete_item(Key={"PK": thread_id, "SK": sk})
+    return len(keys)
+
+def compact_checkpoints(table_name=CHECKPOINT_TABLE, keep=KEEP_CHECKPOINTS, segments=SCAN_SEGMENTS, dry_run=False):
+    """
+    Keeps only the newest `keep` checkpoints per thread and deletes older checkpoints and
+    their pending writes, using a parallel scan and parallel batch deletes.
+
+    :param table_name: DynamoDBSaver checkpoint table.
+    :param keep: Number of checkpoints to keep per thread and namespace (at least 1).
+    :param segments: Parallel scan segments, also the number of delete workers.
+    :param dry_run: Only report what would be deleted.
+    :return: Report with scanned and reclaimed item counts and bytes.
+    """
+    if keep < 1:
+        raise ValueError("keep must be at least 1, the latest checkpoint is the conversation state.")
+
+    started_at = time.perf_counter()
+    threads = defaultdict(lambda: {"checkpoints": [], "writes": []})
+    scanned = scanned_bytes = 0
+    with ThreadPoolExecutor(max_workers=segments) as executor:
+        for segment_threads, segment_scanned, segment_bytes in executor.map(
+            lambda segment: scan_segment(table_name, segment, segments), range(segments)
+        ):
+            scanned += segment_scanned
+            scanned_bytes += segment_bytes
+            # A partition key lives in one segment, merging only guards against that changing
+            for thread_id, items in segment_threads.items():
+                threads[thread_id]["checkpoints"] += items["checkpoints"]
+                threads[thread_id]["writes"] += items["writes"]
+
+    report = {
+        "table": table_name,
+        "dry_run": dry_run,
+        "keep": keep,
+        "threads": len(threads),
+        "scanned_items": scanned,
+        "scanned_bytes": scanned_bytes,
+        "deleted_checkpoints": 0,
+        "deleted_writes": 0,
+        "reclaimed_bytes": 0,
+        "threads_compacted": 0,
+    }
+
+    jobs = []
+    for thread_id, items in threads.items():
+        victims = select_victims(items, keep)
+        if not victims:
+            continue
+        report["threads_compacted"] += 1
+        report["deleted_checkpoints"] += sum(1 for _, _, kind in victims if kind == "checkpoint")
+        report["deleted_writes"] += sum(1 for _, _, kind in victims if kind == "writes")
+        report["reclaimed_bytes"] += sum(size for _, size, _ in victims)
+        keys = [sk for sk, _, _ in victims]
+        jobs += [(thread_id, keys[i:i + DELETE_CHUNK_SIZE]) for i in range(0, len(keys), DELETE_CHUNK_SIZE)]
+
+    if not dry_run and jobs:
+        with ThreadPoolExecutor(max_workers=segments) as executor:
+            list(executor.map(lambda job: delete_chunk(table_name, *job), jobs))
+
+    report["duration_s"] = round(time.perf_counter() - started_at, 2)
+    print("Checkpoint compaction:", json.dumps(report))
+    return report
+
+def lambda_handler(event, context):
+    """Scheduled entry point; keep, segments and dry_run can be overridden in the event."""
+    event = event or {}
+    return compact_checkpoints(
+        table_name=event.get("table_name", CHECKPOINT_TABLE),
+        keep=int(event.get("keep", KEEP_CHECKPOINTS)),
+        segments=int(event.get("segments", SCAN_SEGMENTS)),
+        # Schedules and console test events pass strings, where bool("false") is True
+        dry_run=str(event.get("dry_run", False)).lower() in ("1", "true", "yes"),
+    )
@@ -0,0 +1,182 @@
+import bisect
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from langgraph_utils import call_model
+
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "true").lower() == "true"
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", 95))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", 20))
+# Used until the primary has enough samples, and as bounds for the derived threshold
+HEDGE_DEFAULT_MS = float(os.getenv("HEDGE_DEFAULT_MS", 8000))
+HEDGE_MIN_MS = float(os.getenv("HEDGE_MIN_MS", 1500))
+HEDGE_MAX_MS = float(os.getenv("HEDGE_MAX_MS", 20000))
+RATE_LIMIT_COOLDOWN_SECONDS = float(os.getenv("RATE_LIMIT_COOLDOWN_SECONDS", 20))
+
+# Fallback targets per tier, tried after the tier's own model, e.g.
+# MODEL_FALLBACKS='{"large": [{"model": "claude-3-5-sonnet", "provider": "anthropic"}]}'
+MODEL_FALLBACKS = json.loads(os.getenv("MODEL_FALLBACKS", "{}"))
+
+# Upper bounds in ms; latencies above the last bucket are counted in an overflow bucket
+HISTOGRAM_BUCKETS_MS = [250, 500, 750, 1000, 1500, 2000, 3000, 4000, 6000, 8000, 12000, 16000, 24000, 32000, 60000]
+
+FAILOVER_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram; percentiles resolve to the bucket's upper bound."""
+
+    def __init__(self, buckets=HISTOGRAM_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0
+        self.lock = threading.Lock()
+
+    def record(self, elapsed_ms):
+        with self.lock:
+            self.counts[bisect.bisect_left(self.buckets, elapsed_ms)] += 1
+            self.total += 1
+
+    def percentile(self, pct):
+        with self.lock:
+            if not self.total:
+                return None
+            rank = pct / 100 * self.total
+            seen = 0
+            for i, count in enumerate(self.counts):
+                seen += count
+                if seen >= rank:
+                    return self.buckets[min(i, len(self.buckets) - 1)]
+            return self.buckets[-1]
+
+    def snapshot(self):
+        with self.lock:
+            return {"count": self.total, "buckets": dict(zip([str(b) for b in self.buckets] + ["inf"], self.counts))}
+
+def gateway_provider(provider):
+    """Calls a provider through the LLM API Gateway."""
+    return lambda model, messages, tools: call_model(model, provider, messages, tools)
+
+# Provider name -> callable(model, messages, tools) returning an AIMessage.
+# Providers not registered here go through the API Gateway.
+providers = {}
+
+def register_provider(name, fn):
+    """Plugs in a provider implementation, e.g. a local fake for tests."""
+    providers[name] = fn
+
+def get_provider(name):
+    return providers.get(name) or gateway_provider(name)
+
+# Shared by all invocations served by this warm container
+histograms = {}
+rate_limited_until = {}
+_state_lock = threading.Lock()
+# Hedged requests that lose keep running here until the provider answers
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("HEDGE_MAX_WORKERS", 8)), thread_name_prefix="model")
+
+def target_key(target):
+    return f"{target['provider']}/{target['model']}"
+
+def histogram_for(target):
+    with _state_lock:
+        return histograms.setdefault(target_key(target), LatencyHistogram())
+
+def build_chain(primary, tier):
+    """Ordered targets for a tier: its own model first, then MODEL_FALLBACKS, skipping duplicates."""
+    chain = []
+    for target in [primary] + MODEL_FALLBACKS.get(tier, []):
+        if target.get("model") and target_key(target) not in {target_key(t) for t in chain}:
+            chain.append({"model": target["model"], "provider": target["provider"]})
+    return chain
+
+def order_chain(chain):
+    """Moves targets that were rate limited recently to the back of the chain."""
+    now = time.monotonic()
+    return sorted(chain, key=lambda target: rate_limited_until.get(target_key(target), 0) > now)
+
+def hedge_threshold_ms(target):
+    """The primary's HEDGE_PERCENTILE latency, once it has HEDGE_MIN_SAMPLES calls."""
+    histogram = histogram_for(target)
+    if histogram.total < HEDGE_MIN_SAMPLES:
+        return HEDGE_DEFAULT_MS
+    return min(HEDGE_MAX_MS, max(HEDGE_MIN_MS, histogram.percentile(HEDGE_PERCENTILE)))
+
+def error_status(error):
+    """HTTP status code in a call_model error ("429 Client Error: ..."), or None."""
+    match = re.search(r"\b([45]\d\d) (?:Client|Server) Error", str(error))
+    return int(match.group(1)) if match else None
+
+def should_fail_over(error):
+    """Rate limits, server errors and connection failures fail over; other client errors would repeat."""
+    if not isinstance(error, RuntimeError):
+        return False
+    status = error_status(error)
+    return status is None or status in FAILOVER_STATUS_CODES
+
+def timed_call(target, messages, tools):
+    """Calls one target and records its latency, including for hedges that lost."""
+    started_at = time.perf_counter()
+    try:
+        return get_provider(target["provider"])(target["model"], messages, tools)
+    finally:
+        histogram_for(target).record((time.perf_counter() - started_at) * 1000)
+
+def note_failure(target, error):
+    if error_status(error) == 429:
+        with _state_lock:
+            rate_limited_until[target_key(target)] = time.monotonic() + RATE_LIMIT_COOLDOWN_SECONDS
+    print(f"Model call failed target={target_key(target)} status={error_status(error)}: {error}")
+
+def call_chain(chain, messages, tools):
+    """
+    Calls the first target of the chain, hedging and failing over to the next ones.
+
+    If the current target has not answered within its hedge threshold, the next target
+    is called as well and the first successful answer wins. A target that fails with a
+    rate limit, server or connection error is replaced by the next target right away.
+    Any other error stops the chain, but a hedged call still in flight may answer first.
+
+    :param chain: Ordered targets, each {"model", "provider"}.
+    :return: (AIMessage, target that produced it)
+    :raises RuntimeError: Every target failed; the last error is raised.
+    """
+    pending = list(order_chain(chain))
+    running = {}
+    last_error = None
+    fatal_error = None
+
+    while running or (pending and fatal_error is None):
+        if not running:
+            target = pending.pop(0)
+            running[_executor.submit(timed_call, target, messages, tools)] = target
+
+        timeout = None
+        if HEDGE_ENABLED and pending and fatal_error is None and len(running) == 1:
+            timeout = hedge_threshold_ms(next(iter(running.values()))) / 1000
+        done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+
+        if not done:
+            target = pending.pop(0)
+            print(f"Model hedge after {timeout * 1000:.0f}ms: {target_key(next(iter(running.values())))} -> {target_key(target)}")
+            running[_executor.submit(timed_call, target, messages, tools)] = target
+            continue
+
+        for future in done:
+            target = running.pop(future)
+            try:
+                return future.result(), target
+            except Exception as e:
+                if not should_fail_over(e):
+                    fatal_error = fatal_error or e
+                    continue
+                note_failure(target, e)
+                last_error = e
+
+    raise fatal_error or last_error
+
+def latency_stats():
+    with _state_lock:
+        return {key: histogram.snapshot() for key, histogram in histograms.items()}
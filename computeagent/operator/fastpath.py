@@ -0,0 +1,90 @@
+import json
+import os
+import re
+from tools import tool_list
+
+FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "true").lower() == "true"
+FAST_PATH_GRAMMAR = os.getenv("FAST_PATH_GRAMMAR", "fastpath_grammar.json")
+
+tools_by_name = {t.name: t for t in tool_list}
+
+def load_grammar(path=FAST_PATH_GRAMMAR):
+    """
+    Loads the fast path command grammar and compiles its patterns.
+    Each rule must name a tool from tool_list, otherwise it is skipped.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            rules = json.load(file)
+    except (OSError, ValueError) as e:
+        print(f"Fast path grammar not loaded from {path}: {e}")
+        return []
+
+    grammar = []
+    for rule in rules:
+        if rule.get("tool") not in tools_by_name:
+            print(f"Fast path rule '{rule.get('name')}' skipped, unknown tool: {rule.get('tool')}")
+            continue
+        grammar.append({**rule, "regex": re.compile(rule["pattern"], re.IGNORECASE)})
+    return grammar
+
+grammar = load_grammar() if FAST_PATH_ENABLED else []
+
+def normalize_command(message):
+    """Lowercases, trims trailing punctuation and collapses whitespace."""
+    if not isinstance(message, str):
+        return None
+    return " ".join(message.strip().rstrip(".!").split()).lower()
+
+def match_command(message):
+    """
+    Returns (rule, tool_args) for the single grammar rule matching the whole message,
+    or None when nothing matches or the message is ambiguous.
+    """
+    command = normalize_command(message)
+    if not command:
+        return None
+
+    matches = [(rule, m.groupdict()) for rule in grammar if (m := rule["regex"].fullmatch(command))]
+    if len(matches) != 1:
+        return None
+    return matches[0]
+
+def render_result(rule, result):
+    """Renders the tool result into the user-facing message using the rule templates."""
+    if isinstance(result, list):
+        if not result:
+            return rule.get("empty_template", "No results found.")
+        item_template = rule.get("item_template", "- {item}")
+        # Row fields win over the whole-row {item} placeholder when a row has an "item" key
+        items = "\n".join(item_template.format_map({"item": item, **item}) if isinstance(item, dict) else item_template.format(item=item) for item in result)
+        return rule["template"].format(items=items, count=len(result))
+    return rule["template"].format(result=result)
+
+def try_fast_path(message):
+    """
+    Executes an unambiguous command directly against its tool, bypassing the LLM.
+
+    :param message: The raw user message.
+    :return: The {"nextagent", "message"} envelope, or None to fall back to the agent.
+    """
+    matched = match_command(message)
+    if not matched:
+        return None
+
+    rule, tool_args = matched
+    print(f"Fast path matched rule '{rule['name']}' with args {tool_args}")
+    try:
+        result = tools_by_name[rule["tool"]].invoke(tool_args)
+    except Exception as e:
+        print(f"Fast path rule '{rule['name']}' failed, falling back to agent: {e}")
+        return None
+
+    # The tool has already run, so a template problem must not send the command to the agent again
+    try:
+        reply = render_result(rule, result)
+    except (KeyError, IndexError, ValueError, TypeError) as e:
+        print(f"Fast path template for '{rule['name']}' failed: {e}")
+        reply = str(result)
+
+    return {"nextagent": "comms-agent", "message": reply}
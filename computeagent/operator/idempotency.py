@@ -0,0 +1,234 @@
+import contextvars
+import functools
+import hashlib
+import inspect
+import json
+import os
+import threading
+import time
+import botocore.exceptions
+from resilience import aws_client
+
+IDEMPOTENCY_ENABLED = os.getenv("IDEMPOTENCY_ENABLED", "true").lower() == "true"
+IDEMPOTENCY_TABLE = os.getenv("IDEMPOTENCY_TABLE")
+# Used when the invocation's remaining time is unknown (no Lambda context, e.g. loadgen);
+# longer than the function timeout, so a lease only expires once its invocation is gone
+LEASE_SECONDS = int(os.getenv("IDEMPOTENCY_LEASE_SECONDS", 330))
+# Added to the invocation's remaining time, covering clock skew between containers
+LEASE_MARGIN_SECONDS = int(os.getenv("IDEMPOTENCY_LEASE_MARGIN_SECONDS", 30))
+# The source queue's visibility timeout; SQS must not redeliver a message before its lease expires
+SOURCE_QUEUE_VISIBILITY_TIMEOUT = int(os.getenv("SOURCE_QUEUE_VISIBILITY_TIMEOUT", 0))
+# At least the source queue's retention period (SQS default: 4 days)
+RECORD_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", 4 * 86400))
+
+IN_PROGRESS = "IN_PROGRESS"
+COMPLETED = "COMPLETED"
+
+class MessageInProgressError(Exception):
+    """Another invocation holds the lease on this message; raised so SQS redelivers it later."""
+
+def message_key(record=None, task_token=None):
+    """Idempotency key of an SQS record (messageId) or a Step Functions task token."""
+    if task_token:
+        return "task#" + hashlib.sha256(task_token.encode("utf-8")).hexdigest()
+    return "msg#" + record["messageId"]
+
+def lease_for(context):
+    """
+    Lease for a message processed by this invocation: its remaining time plus a margin,
+    so the lease of an invocation that timed out expires right after it.
+    """
+    if context is None or not hasattr(context, "get_remaining_time_in_millis"):
+        return LEASE_SECONDS
+    lease_seconds = context.get_remaining_time_in_millis() / 1000 + LEASE_MARGIN_SECONDS
+    if SOURCE_QUEUE_VISIBILITY_TIMEOUT and lease_seconds > SOURCE_QUEUE_VISIBILITY_TIMEOUT:
+        print(f"Idempotency lease {lease_seconds:.0f}s exceeds the queue visibility timeout "
+              f"{SOURCE_QUEUE_VISIBILITY_TIMEOUT}s, redeliveries will find the message in progress")
+    return lease_seconds
+
+class MemoryIdempotencyStore:
+    """Records in process memory; only redeliveries to the same warm container are caught."""
+
+    def __init__(self):
+        self.records = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, key, lease_seconds=LEASE_SECONDS):
+        now = time.time()
+        with self.lock:
+            record = self.records.get(key)
+            if record and (record["status"] == COMPLETED or record["lease_until"] > now):
+                return record
+            self.records[key] = {"status": IN_PROGRESS, "lease_until": now + lease_seconds}
+            return None
+
+    def release(self, key):
+        with self.lock:
+            self.records.pop(key, None)
+
+    def get(self, key):
+        with self.lock:
+            return self.records.get(key)
+
+    def put_result(self, key, result):
+        with self.lock:
+            self.records[key] = {"status": COMPLETED, "result": json.dumps(result, default=str)}
+
+class DynamoDBIdempotencyStore:
+    """Records in a DynamoDB table keyed by idempotency_key, expired through the table's TTL."""
+
+    def __init__(self, table_name):
+        self.table_name = table_name
+        self.client = aws_client("dynamodb")
+
+    def _record(self, item):
+        record = {"status": item["status"]["S"]}
+        if "result" in item:
+            record["result"] = item["result"]["S"]
+        if "lease_until" in item:
+            record["lease_until"] = float(item["lease_until"]["N"])
+        return record
+
+    def acquire(self, key, lease_seconds=LEASE_SECONDS):
+        now = time.time()
+        try:
+            self.client.put_item(
+                TableName=self.table_name,
+                Item={
+                    "idempotency_key": {"S": key},
+                    "status": {"S": IN_PROGRESS},
+                    "lease_until": {"N": str(now + lease_seconds)},
+                    "expires_at": {"N": str(int(now) + RECORD_TTL_SECONDS)},
+                },
+                # Free, or held by an invocation that timed out or crashed
+                ConditionExpression="attribute_not_exists(idempotency_key) OR (#status = :in_progress AND lease_until < :now)",
+                ExpressionAttributeNames={"#status": "status"},
+                ExpressionAttributeValues={":in_progress": {"S": IN_PROGRESS}, ":now": {"N": str(now)}},
+                ReturnValuesOnConditionCheckFailure="ALL_OLD",
+            )
+            return None
+        except botocore.exceptions.ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            return self._record(e.response["Item"])
+
+    def release(self, key):
+        self.client.delete_item(
+            TableName=self.table_name,
+            Key={"idempotency_key": {"S": key}},
+            ConditionExpression="#status = :in_progress",
+            ExpressionAttributeNames={"#status": "status"},
+            ExpressionAttributeValues={":in_progress": {"S": IN_PROGRESS}},
+        )
+
+    def get(self, key):
+        item = self.client.get_item(TableName=self.table_name, Key={"idempotency_key": {"S": key}}, ConsistentRead=True).get("Item")
+        return self._record(item) if item else None
+
+    def put_result(self, key, result):
+        self.client.put_item(
+            TableName=self.table_name,
+            Item={
+                "idempotency_key": {"S": key},
+                "status": {"S": COMPLETED},
+                "result": {"S": json.dumps(result, default=str)},
+                "expires_at": {"N": str(int(time.time()) + RECORD_TTL_SECONDS)},
+            },
+        )
+
+def store_from_env():
+    if not IDEMPOTENCY_ENABLED:
+        return None
+    if IDEMPOTENCY_TABLE:
+        return DynamoDBIdempotencyStore(IDEMPOTENCY_TABLE)
+    return MemoryIdempotencyStore()
+
+idempotency_store = store_from_env()
+
+class ToolLedger:
+    """Numbers the side-effecting tool calls of one message so a retry can find their results."""
+
+    def __init__(self, message_key):
+        self.message_key = message_key
+        self.occurrences = {}
+        self.lock = threading.Lock()
+
+    def tool_key(self, tool_name, identity):
+        identity_hash = hashlib.sha256(json.dumps(identity, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+        with self.lock:
+            n = self.occurrences.get((tool_name, identity_hash), 0)
+            self.occurrences[(tool_name, identity_hash)] = n + 1
+        return f"tool#{self.message_key}#{tool_name}#{identity_hash}#{n}"
+
+# Set for the duration of one message; the ToolNode's worker threads inherit it
+current_ledger = contextvars.ContextVar("current_ledger", default=None)
+
+def is_failure(result):
+    """Tools report failures as None, {"error": ...} or an "Error ..." string."""
+    if isinstance(result, str):
+        return result.startswith("Error")
+    return result is None or (isinstance(result, dict) and "error" in result)
+
+def idempotent_tool(*identity_args):
+    """
+    Memoizes a side-effecting tool per message. A retried message replays the recorded
+    result instead of repeating the side effect.
+
+    The LLM rarely words a retry identically, so calls are matched on the tool name, the
+    given identity arguments (e.g. the recipient, not the message text) and the call's
+    position among matching calls in the message. Failed calls are not recorded, so a
+    retry attempts them again.
+    """
+    def decorator(fn):
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            ledger = current_ledger.get()
+            if ledger is None or idempotency_store is None:
+                return fn(*args, **kwargs)
+
+            bound = signature.bind_partial(*args, **kwargs).arguments
+            key = ledger.tool_key(fn.__name__, {name: bound.get(name) for name in identity_args})
+            record = idempotency_store.get(key)
+            if record and record["status"] == COMPLETED:
+                print(f"Replaying recorded result of {fn.__name__} for {ledger.message_key}")
+                return json.loads(record["result"])
+
+            result = fn(*args, **kwargs)
+            if not is_failure(result):
+                idempotency_store.put_result(key, result)
+            return result
+        return wrapper
+    return decorator
+
+def process_once(key, fn, *args, lease_seconds=LEASE_SECONDS):
+    """
+    Runs fn(*args) at most once to completion per idempotency key and returns its result.
+
+    A completed message returns its recorded result without running again. A message
+    whose lease is held by a live invocation raises MessageInProgressError. A failed run
+    releases the lease; its recorded tool results stay, so the retry replays them.
+
+    :param lease_seconds: How long the message is held, see lease_for.
+    """
+    if idempotency_store is None:
+        return fn(*args)
+
+    record = idempotency_store.acquire(key, lease_seconds)
+    if record and record["status"] == COMPLETED:
+        print(f"Skipping already processed message {key}")
+        return json.loads(record["result"])
+    if record:
+        raise MessageInProgressError(f"Message {key} is being processed by another invocation.")
+
+    token = current_ledger.set(ToolLedger(key))
+    try:
+        result = fn(*args)
+    except BaseException:
+        idempotency_store.release(key)
+        raise
+    finally:
+        current_ledger.reset(token)
+    idempotency_store.put_result(key, result)
+    return result
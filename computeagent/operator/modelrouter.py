@@ -0,0 +1,154 @@
+import json
+import os
+import time
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from failover import build_chain, call_chain, target_key
+from resilience import METRICS_NAMESPACE
+
+ROUTER_ENABLED = os.getenv("MODEL_ROUTER_ENABLED", "true").lower() == "true"
+MAX_TOOLS_FOR_SMALL = int(os.getenv("ROUTER_MAX_TOOLS_FOR_SMALL", 2))
+MAX_HISTORY_FOR_SMALL = int(os.getenv("ROUTER_MAX_HISTORY_FOR_SMALL", 30))
+
+TIERS = {
+    "large": {"model": os.getenv("MODEL_NAME"), "provider": os.getenv("PROVIDER_NAME")},
+    "small": {
+        "model": os.getenv("SMALL_MODEL_NAME", "gpt-4o-mini"),
+        "provider": os.getenv("SMALL_PROVIDER_NAME", os.getenv("PROVIDER_NAME")),
+    },
+}
+
+# USD per 1M input/output tokens, override with MODEL_PRICES='{"model": [input, output]}'
+MODEL_PRICES = {"gpt-4o": [2.5, 10.0], "gpt-4o-mini": [0.15, 0.6]}
+MODEL_PRICES.update(json.loads(os.getenv("MODEL_PRICES", "{}")))
+
+# Per-tier counters, kept for the lifetime of the warm container
+tier_stats = {
+    tier: {"calls": 0, "escalations": 0, "latency_ms": 0.0, "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0}
+    for tier in TIERS
+}
+
+def current_turn(messages):
+    """Returns the messages after the last HumanMessage, i.e. the agent steps of this turn."""
+    for i in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[i], HumanMessage):
+            return messages[i + 1:]
+    return messages
+
+def select_tier(messages):
+    """
+    Picks the model tier for the next agent step.
+
+    The first planning step of a turn always goes to the large model. Summarising
+    tool results goes to the small model, unless the turn used many tools or the
+    history is long enough that reasoning over it needs the large model.
+    """
+    if not ROUTER_ENABLED or not messages or not isinstance(messages[-1], ToolMessage):
+        return "large"
+
+    tool_count = sum(len(m.tool_calls) for m in current_turn(messages) if isinstance(m, AIMessage))
+    if tool_count > MAX_TOOLS_FOR_SMALL or len(messages) > MAX_HISTORY_FOR_SMALL:
+        return "large"
+    return "small"
+
+def needs_escalation(response):
+    """
+    A small model response is low confidence when it plans new tool calls instead of
+    summarising, or when it is not the JSON envelope the agent prompt requires.
+    """
+    if response.tool_calls:
+        return True
+    try:
+        envelope = json.loads(response.content)
+    except (TypeError, ValueError):
+        return True
+    return not isinstance(envelope, dict) or not envelope.get("message")
+
+def record_call(tier, target, response, elapsed_ms, escalated):
+    """Accumulates latency, token and cost metrics for the tier and logs the call."""
+    usage = getattr(response, "usage_metadata", None) or {}
+    input_tokens = usage.get("input_tokens", 0)
+    output_tokens = usage.get("output_tokens", 0)
+    input_price, output_price = MODEL_PRICES.get(target["model"], [0.0, 0.0])
+    cost = (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+    stats = tier_stats[tier]
+    stats["calls"] += 1
+    stats["escalations"] += int(escalated)
+    stats["latency_ms"] += elapsed_ms
+    stats["input_tokens"] += input_tokens
+    stats["output_tokens"] += output_tokens
+    stats["cost_usd"] += cost
+    print(f"Model call tier={tier} target={target_key(target)} ms={elapsed_ms:.1f} input_tokens={input_tokens} "
+          f"output_tokens={output_tokens} cost_usd={cost:.6f} escalated={escalated}")
+    return input_tokens + output_tokens
+
+def call_tier(tier, messages, tools, escalated=False, on_usage=None):
+    started_at = time.perf_counter()
+    # The tier's model first, then its fallbacks, with hedging on slow calls
+    response, target = call_chain(build_chain(TIERS[tier], tier), messages, tools)
+    tokens = record_call(tier, target, response, (time.perf_counter() - started_at) * 1000, escalated)
+    if on_usage:
+        on_usage(tokens)
+    return response
+
+def call_routed_model(messages, tools, on_usage=None):
+    """
+    Calls the model tier selected by the routing policy, escalating to the large
+    model when the small model fails or its answer is low confidence.
+
+    :param messages: Conversation messages, system prompt first.
+    :param tools: Tool definitions as produced by create_tools_json.
+    :param on_usage: Optional callback receiving the token count of every model call made.
+    :return: AIMessage from the model that produced the accepted answer.
+    """
+    tier = select_tier(messages)
+    if tier == "large":
+        return call_tier("large", messages, tools, on_usage=on_usage)
+
+    try:
+        response = call_tier("small", messages, tools, on_usage=on_usage)
+        if not needs_escalation(response):
+            return response
+        print("Small model response is low confidence, escalating to large model.")
+    except RuntimeError as e:
+        print(f"Small model call failed, escalating to large model: {e}")
+
+    return call_tier("large", messages, tools, escalated=True, on_usage=on_usage)
+
+_last_logged = {}
+
+def log_tier_metrics():
+    """
+    Prints the tier counters in CloudWatch Embedded Metric Format, one record per tier.
+    Values are deltas since the previous log line; tiers without calls are skipped.
+    """
+    for tier, stats in tier_stats.items():
+        previous = _last_logged.get(tier, dict.fromkeys(stats, 0))
+        _last_logged[tier] = dict(stats)
+        delta = {name: stats[name] - previous[name] for name in stats}
+        if not delta["calls"]:
+            continue
+        print(json.dumps({
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": METRICS_NAMESPACE,
+                    "Dimensions": [["Tier"]],
+                    "Metrics": [
+                        {"Name": "ModelCalls"},
+                        {"Name": "ModelEscalations"},
+                        {"Name": "ModelLatency", "Unit": "Milliseconds"},
+                        {"Name": "ModelInputTokens"},
+                        {"Name": "ModelOutputTokens"},
+                        {"Name": "ModelCostUSD"},
+                    ],
+                }],
+            },
+            "Tier": tier,
+            "ModelCalls": delta["calls"],
+            "ModelEscalations": delta["escalations"],
+            "ModelLatency": round(delta["latency_ms"] / delta["calls"], 1),
+            "ModelInputTokens": delta["input_tokens"],
+            "ModelOutputTokens": delta["output_tokens"],
+            "ModelCostUSD": round(delta["cost_usd"], 6),
+        }))
@@ -0,0 +1,146 @@
+import cProfile
+import io
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from resilience import aws_client
+
+# "sample" or "cprofile" profiles every invocation; a "profile" flag in the payload profiles one message
+PROFILE_MODE = os.getenv("PROFILE_MODE", "").lower()
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", 5))
+PROFILE_TOP_N = int(os.getenv("PROFILE_TOP_N", 15))
+PROFILE_OUTPUT_DIR = os.getenv("PROFILE_OUTPUT_DIR", "/tmp")
+# Optional; profiles are uploaded here as well as written to PROFILE_OUTPUT_DIR
+PROFILE_S3_BUCKET = os.getenv("PROFILE_S3_BUCKET")
+PROFILE_S3_PREFIX = os.getenv("PROFILE_S3_PREFIX", "profiles")
+
+MODES = ("sample", "cprofile")
+
+# Leaf frames of idle pool workers (hedging, ToolNode), which would otherwise dominate every profile
+IDLE_LEAVES = {"concurrent.futures.thread:_worker"}
+
+def profile_mode(payload):
+    """Profiler to use for this message: the payload's "profile" flag, else PROFILE_MODE, else None."""
+    flag = (payload or {}).get("profile")
+    if flag is True:
+        return "sample"
+    if isinstance(flag, str) and flag.lower() in MODES:
+        return flag.lower()
+    return PROFILE_MODE if PROFILE_MODE in MODES else None
+
+def frame_label(frame):
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}"
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler. A background thread records the Python stack of every
+    other thread each interval, so time spent in tool and model worker threads and in
+    blocking I/O shows up too. Stacks are kept in collapsed form ("a;b;c" -> samples).
+    """
+
+    def __init__(self, interval_ms=PROFILE_INTERVAL_MS):
+        self.interval = interval_ms / 1000
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            thread_names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or frame_label(frame) in IDLE_LEAVES:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame_label(frame))
+                    frame = frame.f_back
+                stack.append(thread_names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self):
+        """Brendan Gregg's collapsed format, input for flamegraph.pl or speedscope."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self, top_n=PROFILE_TOP_N):
+        self_counts, total_counts = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")[1:]
+            self_counts[frames[-1]] += count
+            for label in set(frames):
+                total_counts[label] += count
+        all_samples = sum(self.stacks.values()) or 1
+        lines = [f"{'self%':>6} {'total%':>6}  function ({self.samples} samples every {self.interval * 1000:.0f}ms)"]
+        for label, count in self_counts.most_common(top_n):
+            lines.append(f"{100 * count / all_samples:6.1f} {100 * total_counts[label] / all_samples:6.1f}  {label}")
+        return "\n".join(lines)
+
+def upload(path):
+    """Copies a profile to PROFILE_S3_BUCKET when configured."""
+    if not PROFILE_S3_BUCKET:
+        return None
+    key = f"{PROFILE_S3_PREFIX}/{os.path.basename(path)}"
+    try:
+        aws_client("s3").upload_file(path, PROFILE_S3_BUCKET, key)
+        return f"s3://{PROFILE_S3_BUCKET}/{key}"
+    except Exception as e:
+        print(f"Failed to upload profile {path}: {e}")
+        return None
+
+def output_path(label, extension):
+    safe_label = re.sub(r"[^A-Za-z0-9_.-]+", "-", label)[:80]
+    return os.path.join(PROFILE_OUTPUT_DIR, f"profile-{safe_label}-{int(time.time())}.{extension}")
+
+@contextmanager
+def profiled(mode, label):
+    """
+    Profiles the enclosed block with the given mode ("sample" or "cprofile"), then writes
+    the profile file and logs a top-N hot function summary. With mode None it does nothing.
+
+    cProfile is deterministic but only sees the calling thread; tools and hedged model
+    calls run in worker threads, so "sample" is the default for whole-message profiles.
+    """
+    if mode not in MODES:
+        yield
+        return
+
+    started_at = time.perf_counter()
+    if mode == "sample":
+        profiler = SamplingProfiler()
+        profiler.start()
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        yield
+    finally:
+        elapsed_ms = (time.perf_counter() - started_at) * 1000
+        if mode == "sample":
+            profiler.stop()
+            path = output_path(label, "collapsed")
+            with open(path, "w", encoding="utf-8") as file:
+                file.write(profiler.collapsed())
+            summary = profiler.summary()
+        else:
+            profiler.disable()
+            path = output_path(label, "prof")
+            profiler.dump_stats(path)
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(PROFILE_TOP_N)
+            summary = stream.getvalue()
+        location = upload(path) or path
+        print(f"Profile mode={mode} label={label} ms={elapsed_ms:.1f} file={location}\n{summary}")
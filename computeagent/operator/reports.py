@@ -0,0 +1,112 @@
+from resilience import aws_client
+import botocore.exceptions
+import html
+import json
+import os
+
+SES_TEMPLATE_NAME = os.getenv("REPORT_SES_TEMPLATE", "LokiReport")
+FROM_EMAIL = os.getenv("EMAIL_FROM", "agent@mockify.com")
+SES_MAX_DESTINATIONS = 50
+
+# One generic SES template; the report body is rendered here and passed as template data.
+# Triple braces insert the values unescaped: the HTML is escaped by the renderers, and the
+# subject and text part are plain text where "&" must not become "&amp;".
+SES_TEMPLATE = {
+    "TemplateName": SES_TEMPLATE_NAME,
+    "SubjectPart": "{{{subject}}}",
+    "HtmlPart": "{{{report_html}}}",
+    "TextPart": "{{{report_text}}}",
+}
+
+TABLE_STYLE = "border-collapse:collapse;font-family:Arial,sans-serif;font-size:13px"
+CELL_STYLE = "border:1px solid #ddd;padding:6px 10px;text-align:left"
+
+_template_ready = False
+
+def html_table(columns, rows):
+    header = "".join(f'<th style="{CELL_STYLE};background:#f3f3f3">{html.escape(str(c))}</th>' for c in columns)
+    body = "".join(
+        "<tr>" + "".join(f'<td style="{CELL_STYLE}">{html.escape(str(row.get(c, "")))}</td>' for c in columns) + "</tr>"
+        for row in rows
+    )
+    return f'<table style="{TABLE_STYLE}"><tr>{header}</tr>{body}</table>'
+
+def text_table(columns, rows):
+    lines = [" | ".join(columns)]
+    lines += [" | ".join(str(row.get(c, "")) for c in columns) for row in rows]
+    return "\n".join(lines)
+
+def render_billing_summary(data):
+    """Renders the output of get_billing_data."""
+    if not data:
+        raise ValueError("No billing data available.")
+    title = f"AWS billing summary {data['start_date']} to {data['end_date']}"
+    total = f"Total: {data['total_cost']} {data['currency']}"
+    rows = [{"Service": s["service"], "Cost": f"{s['cost']:.2f}"} for s in data["service_costs"]]
+    report_html = f"<h2>{html.escape(title)}</h2><p><b>{html.escape(total)}</b></p>" + html_table(["Service", "Cost"], rows)
+    return title, report_html, f"{title}\n{total}\n\n" + text_table(["Service", "Cost"], rows)
+
+def render_inventory_table(data):
+    """Renders a list of resource dicts (e.g. list_ec2_instances_by_name) as one table."""
+    if not data:
+        raise ValueError("No resources to report.")
+    columns = list(dict.fromkeys(key for row in data for key in row))
+    title = f"AWS inventory ({len(data)} resources)"
+    report_html = f"<h2>{html.escape(title)}</h2>" + html_table(columns, data)
+    return title, report_html, f"{title}\n\n" + text_table(columns, data)
+
+REPORT_TEMPLATES = {
+    "billing_summary": render_billing_summary,
+    "inventory_table": render_inventory_table,
+}
+
+def ensure_ses_template(ses_client):
+    """Creates the SES template, or updates an outdated one, on first use in this container."""
+    global _template_ready
+    if _template_ready:
+        return
+    try:
+        existing = ses_client.get_template(TemplateName=SES_TEMPLATE_NAME)["Template"]
+    except botocore.exceptions.ClientError as e:
+        if e.response["Error"]["Code"] != "TemplateDoesNotExist":
+            raise
+        print(f"Creating SES template {SES_TEMPLATE_NAME}...")
+        ses_client.create_template(Template=SES_TEMPLATE)
+    else:
+        if any(existing.get(part) != SES_TEMPLATE[part] for part in ("SubjectPart", "HtmlPart", "TextPart")):
+            print(f"Updating SES template {SES_TEMPLATE_NAME}...")
+            ses_client.update_template(Template=SES_TEMPLATE)
+    _template_ready = True
+
+def send_templated_report(template_name, data, recipients, subject=None):
+    """
+    Renders a report server-side and sends it to all recipients with SES bulk templated sending,
+    one API call per 50 recipients.
+
+    :return: Dict with the subject and a per-recipient status list.
+    """
+    if template_name not in REPORT_TEMPLATES:
+        return {"error": f"Unknown report template '{template_name}', expected one of {list(REPORT_TEMPLATES)}."}
+    if not recipients:
+        return {"error": "At least one recipient is required."}
+
+    title, report_html, report_text = REPORT_TEMPLATES[template_name](data)
+    template_data = json.dumps({"subject": subject or title, "report_html": report_html, "report_text": report_text})
+
+    ses_client = aws_client("ses")
+    ensure_ses_template(ses_client)
+
+    statuses = []
+    for start in range(0, len(recipients), SES_MAX_DESTINATIONS):
+        batch = recipients[start:start + SES_MAX_DESTINATIONS]
+        response = ses_client.send_bulk_templated_email(
+            Source=FROM_EMAIL,
+            Template=SES_TEMPLATE_NAME,
+            DefaultTemplateData=template_data,
+            Destinations=[{"Destination": {"ToAddresses": [recipient]}} for recipient in batch],
+        )
+        for recipient, status in zip(batch, response["Status"]):
+            statuses.append({"to": recipient, "status": status.get("Status"), "message_id": status.get("MessageId"), "error": status.get("Error")})
+
+    print(f"Report '{template_name}' sent to {len(recipients)} recipient(s)")
+    return {"subject": subject or title, "recipients": statuses}
@@ -0,0 +1,198 @@
+import boto3
+import json
+import os
+import random
+import threading
+import time
+import requests
+from botocore.config import Config
+
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", 5))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", 30))
+BACKOFF_BASE_SECONDS = 0.3
+BACKOFF_CAP_SECONDS = 4.0
+METRICS_NAMESPACE = os.getenv("METRICS_NAMESPACE", "ComputeAgent")
+
+# Per-endpoint policies. Both endpoints are non-idempotent POSTs (send a message, create a
+# work item), so a read timeout is not retried: the request may already have been applied.
+# retry_read_timeouts is only honoured for calls made with idempotent=True.
+ENDPOINT_POLICIES = {
+    "default": {"connect_timeout": 3, "read_timeout": 10, "retries": 2, "retry_read_timeouts": False},
+    "whatsapp": {"connect_timeout": 3, "read_timeout": 10, "retries": 2, "retry_read_timeouts": False},
+    "azure_devops": {"connect_timeout": 3, "read_timeout": 20, "retries": 2, "retry_read_timeouts": False},
+}
+ENDPOINT_POLICIES.update(json.loads(os.getenv("RESILIENCE_POLICIES", "{}")))
+
+# Retried for idempotent calls only; a gateway error may come after the request was applied
+RETRYABLE_STATUS_CODES = {429, 502, 503, 504}
+
+# botocore retries with exponential backoff and jitter in "standard" mode
+AWS_CLIENT_CONFIG = Config(
+    connect_timeout=int(os.getenv("AWS_CONNECT_TIMEOUT", 3)),
+    read_timeout=int(os.getenv("AWS_READ_TIMEOUT", 30)),
+    retries={"max_attempts": int(os.getenv("AWS_MAX_ATTEMPTS", 3)), "mode": "standard"},
+)
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an endpoint whose circuit breaker is open."""
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker. After `failure_threshold` failed calls the
+    circuit opens and calls fail fast; after `reset_seconds` one trial call is let
+    through (half-open) and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, endpoint, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_seconds=BREAKER_RESET_SECONDS):
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.counters = {"calls": 0, "failures": 0, "short_circuited": 0, "opened": 0}
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = "half_open"
+                return True
+            if self.state != "closed":
+                self.counters["short_circuited"] += 1
+                return False
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.counters["calls"] += 1
+            self.state = "closed"
+            self.consecutive_failures = 0
+
+    def record_failure(self):
+        with self.lock:
+            self.counters["calls"] += 1
+            self.counters["failures"] += 1
+            self.consecutive_failures += 1
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.counters["opened"] += 1
+                    print(f"Circuit breaker for '{self.endpoint}' opened after {self.consecutive_failures} failure(s)")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def snapshot(self):
+        with self.lock:
+            return {"state": self.state, "consecutive_failures": self.consecutive_failures, **self.counters}
+
+# Shared by all invocations served by this warm container
+breakers = {}
+_breakers_lock = threading.Lock()
+
+def get_breaker(endpoint):
+    with _breakers_lock:
+        if endpoint not in breakers:
+            breakers[endpoint] = CircuitBreaker(endpoint)
+        return breakers[endpoint]
+
+def backoff_delay(attempt):
+    """Full jitter exponential backoff."""
+    return random.uniform(0, min(BACKOFF_CAP_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+def is_retryable(response, idempotent):
+    """
+    429, and 503 with Retry-After, mean the request was not processed and are always safe
+    to retry. Other gateway errors and read timeouts are only retried for idempotent calls.
+    """
+    if response.status_code == 429 or (response.status_code == 503 and "Retry-After" in response.headers):
+        return True
+    return idempotent and response.status_code in RETRYABLE_STATUS_CODES
+
+def resilient_post(endpoint, url, idempotent=False, **kwargs):
+    """
+    requests.post with the endpoint's timeouts, bounded jittered retries and circuit breaker.
+
+    Connection errors (the request never reached the server) and the responses accepted by
+    is_retryable are retried. Read timeouts are retried only for idempotent calls whose
+    endpoint policy allows it. The breaker counts one failure per call, not per attempt,
+    and any error, expected or not, counts as one.
+
+    :param idempotent: The request can safely be applied twice.
+
+    :raises CircuitOpenError: The endpoint's circuit is open.
+    :raises requests.RequestException: The last error once retries are exhausted.
+    """
+    policy = ENDPOINT_POLICIES.get(endpoint, ENDPOINT_POLICIES["default"])
+    breaker = get_breaker(endpoint)
+    if not breaker.allow():
+        raise CircuitOpenError(f"Endpoint '{endpoint}' is unavailable (circuit open), try again later.")
+
+    timeout = (policy["connect_timeout"], policy["read_timeout"])
+    for attempt in range(policy["retries"] + 1):
+        last_attempt = attempt == policy["retries"]
+        try:
+            response = requests.post(url, timeout=timeout, **kwargs)
+        except requests.ConnectionError as e:
+            if last_attempt:
+                breaker.record_failure()
+                raise
+            print(f"Connection to '{endpoint}' failed ({e}), retrying...")
+        except requests.Timeout:
+            if last_attempt or not (idempotent and policy["retry_read_timeouts"]):
+                breaker.record_failure()
+                raise
+            print(f"Request to '{endpoint}' timed out, retrying...")
+        except Exception:
+            # Also ends a half-open trial, which would otherwise keep the circuit half open
+            breaker.record_failure()
+            raise
+        else:
+            if is_retryable(response, idempotent) and not last_attempt:
+                print(f"'{endpoint}' returned {response.status_code}, retrying...")
+            else:
+                if response.status_code >= 500 or response.status_code == 429:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                return response
+        time.sleep(backoff_delay(attempt))
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def aws_client(service):
+    """Cached boto3 client with bounded timeouts and retries, shared per warm container."""
+    # Clients are thread safe once created, but creating them from the default session is not
+    with _clients_lock:
+        if service not in _clients:
+            _clients[service] = boto3.client(service, config=AWS_CLIENT_CONFIG)
+        return _clients[service]
+
+def breaker_metrics():
+    return {endpoint: breaker.snapshot() for endpoint, breaker in breakers.items()}
+
+_last_logged = {}
+
+def log_breaker_metrics():
+    """
+    Prints breaker state in CloudWatch Embedded Metric Format, one record per endpoint.
+    Failure and short-circuit counts are deltas since the previous log line.
+    """
+    for endpoint, snapshot in breaker_metrics().items():
+        previous = _last_logged.get(endpoint, {"failures": 0, "short_circuited": 0})
+        _last_logged[endpoint] = snapshot
+        print(json.dumps({
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": METRICS_NAMESPACE,
+                    "Dimensions": [["Endpoint"]],
+                    "Metrics": [{"Name": "CircuitOpen"}, {"Name": "EndpointFailures"}, {"Name": "ShortCircuited"}],
+                }],
+            },
+            "Endpoint": endpoint,
+            "CircuitOpen": int(snapshot["state"] != "closed"),
+            "EndpointFailures": snapshot["failures"] - previous["failures"],
+            "ShortCircuited": snapshot["short_circuited"] - previous["short_circuited"],
+            "BreakerState": snapshot["state"],
+        }))
@@ -0,0 +1,174 @@
+import boto3
+import json
+import os
+import re
+import threading
+import time
+
+STORY_INDEX_TABLE = os.getenv("STORY_INDEX_TABLE")
+STORY_INDEX_FILE = os.getenv("STORY_INDEX_FILE")
+# Word pairs keep "EC2 snapshots" and "RDS snapshots" apart; reworded duplicates score about 0.4
+DUPLICATE_THRESHOLD = float(os.getenv("STORY_DUPLICATE_THRESHOLD", 0.35))
+SHINGLE_SIZE = int(os.getenv("STORY_SHINGLE_SIZE", 2))
+MAX_LINKED_REQUESTS = 20
+
+# Words that appear in almost every story and would make unrelated stories look alike
+STOPWORDS = {
+    "a", "able", "ability", "account", "add", "all", "allow", "an", "and", "as", "aws", "be", "by", "can", "cannot",
+    "check", "create", "enable", "feature", "for", "from", "i", "in", "is", "it", "list", "loki", "my", "need", "new",
+    "of", "on", "or", "should", "so", "state", "support", "that", "the", "their", "this", "to", "tool", "user", "want",
+    "we", "with",
+}
+
+def stem(word):
+    for suffix in ("ing", "er", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+def normalize(text):
+    """Lowercases, drops punctuation, crudely stems and removes filler words."""
+    words = (stem(w) for w in re.findall(r"[a-z0-9]+", (text or "").lower()))
+    return [w for w in words if w not in STOPWORDS]
+
+def shingles(title, description):
+    """Word shingles over the normalized title and description."""
+    words = normalize(f"{title} {description}")
+    if len(words) <= SHINGLE_SIZE:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+class FileStoryStore:
+    """Keeps the index in a local JSON file, used for tests and local runs."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def _read(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+
+    def _write(self, stories):
+        with open(self.path, "w", encoding="utf-8") as file:
+            json.dump(stories, file, indent=2)
+
+    def load(self, fresh=False):
+        with self.lock:
+            return list(self._read().values())
+
+    def add(self, story):
+        with self.lock:
+            stories = self._read()
+            stories[story["story_id"]] = story
+            self._write(stories)
+
+    def link(self, story_id, request):
+        with self.lock:
+            stories = self._read()
+            story = stories[story_id]
+            story["request_count"] = story.get("request_count", 1) + 1
+            story["linked_requests"] = (story.get("linked_requests", []) + [request])[-MAX_LINKED_REQUESTS:]
+            self._write(stories)
+
+class DynamoDBStoryStore:
+    """
+    Keeps the index in a DynamoDB table keyed by story_id. The scanned stories are cached
+    per container and updated on add and link; load(fresh=True) rescans to pick up the
+    stories filed by other containers.
+    """
+
+    def __init__(self, table_name):
+        self.table = boto3.resource("dynamodb").Table(table_name)
+        self.stories = None
+        self.lock = threading.Lock()
+
+    def _scan(self):
+        stories = {}
+        params = {"ProjectionExpression": "story_id, title, description, request_count"}
+        while True:
+            response = self.table.scan(**params)
+            stories.update((item["story_id"], item) for item in response.get("Items", []))
+            if "LastEvaluatedKey" not in response:
+                return stories
+            params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    def load(self, fresh=False):
+        with self.lock:
+            if fresh or self.stories is None:
+                self.stories = self._scan()
+            return list(self.stories.values())
+
+    def add(self, story):
+        self.table.put_item(Item=story)
+        with self.lock:
+            if self.stories is not None:
+                self.stories[story["story_id"]] = {key: story[key] for key in ("story_id", "title", "description", "request_count")}
+
+    def link(self, story_id, request):
+        # Atomic counter plus append, so concurrent duplicates are all recorded
+        response = self.table.update_item(
+            Key={"story_id": story_id},
+            UpdateExpression="ADD request_count :one SET linked_requests = list_append(if_not_exists(linked_requests, :empty), :request)",
+            ExpressionAttributeValues={":one": 1, ":empty": [], ":request": [request]},
+            ReturnValues="UPDATED_NEW",
+        )
+        with self.lock:
+            if self.stories is not None and story_id in self.stories:
+                self.stories[story_id]["request_count"] = response["Attributes"]["request_count"]
+
+class StoryIndex:
+    """Similarity index of created user stories, checked before a new story is filed."""
+
+    def __init__(self, store, threshold=DUPLICATE_THRESHOLD):
+        self.store = store
+        self.threshold = threshold
+
+    @classmethod
+    def from_env(cls):
+        if STORY_INDEX_FILE:
+            return cls(FileStoryStore(STORY_INDEX_FILE))
+        if STORY_INDEX_TABLE:
+            return cls(DynamoDBStoryStore(STORY_INDEX_TABLE))
+        return None
+
+    def _best_match(self, candidate, stories):
+        best, best_score = None, 0.0
+        for story in stories:
+            score = jaccard(candidate, shingles(story["title"], story.get("description", "")))
+            if score > best_score:
+                best, best_score = story, score
+        if best is not None and best_score >= self.threshold:
+            return best, best_score
+        return None
+
+    def find_duplicate(self, title, description):
+        """
+        Returns (story, similarity) for the most similar story above the threshold, or None.
+        A miss on the cached stories is confirmed against a fresh read, since a new story is
+        filed next and the duplicate may have been created by another container.
+        """
+        candidate = shingles(title, description)
+        return self._best_match(candidate, self.store.load()) or self._best_match(candidate, self.store.load(fresh=True))
+
+    def add_story(self, story_id, title, description):
+        self.store.add({
+            "story_id": str(story_id),
+            "title": title,
+            "description": description,
+            "request_count": 1,
+            "created_at": int(time.time()),
+        })
+
+    def link_request(self, story_id, title, description):
+        self.store.link(str(story_id), {"title": title, "description": description, "requested_at": int(time.time())})
+
+story_index = StoryIndex.from_env()
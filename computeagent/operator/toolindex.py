@@ -0,0 +1,114 @@
+import math
+import os
+import re
+from collections import Counter
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph_utils import create_tools_json
+
+TOOL_INDEX_ENABLED = os.getenv("TOOL_INDEX_ENABLED", "true").lower() == "true"
+TOOL_INDEX_TOP_K = int(os.getenv("TOOL_INDEX_TOP_K", 4))
+PINNED_TOOLS = [name.strip() for name in os.getenv("TOOL_INDEX_PINNED", "create_azure_devops_user_story,send_whatsapp_message").split(",") if name.strip()]
+# Calling this tool means the model believes a capability is missing
+MISSING_CAPABILITY_TOOL = "create_azure_devops_user_story"
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "for", "from", "given", "has", "have", "i",
+    "in", "is", "it", "its", "me", "my", "of", "on", "or", "param", "please", "return", "returns", "the", "this",
+    "to", "via", "what", "which", "with", "you", "your", "all", "any", "did", "does", "how", "list", "str",
+}
+
+# Maps everyday wording onto the vocabulary used in tool names and docstrings
+SYNONYMS = {
+    "spend": "cost", "spent": "cost", "bill": "billing", "expense": "cost", "money": "cost",
+    "server": "ec2", "vm": "ec2", "machine": "ec2", "box": "ec2",
+    "database": "rds", "db": "rds", "postgres": "rds", "mysql": "rds",
+    "mail": "email", "function": "lambda", "serverless": "lambda",
+    "feature": "story", "capability": "story",
+}
+
+def tokenize(text):
+    """Lowercases, splits on non-alphanumerics, drops stopwords and maps synonyms and plurals."""
+    tokens = []
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        if len(word) > 3 and word.endswith("s"):
+            word = word[:-1]
+        word = SYNONYMS.get(word, word)
+        if word not in STOPWORDS and len(word) > 1:
+            tokens.append(word)
+    return tokens
+
+class ToolIndex:
+    """TF-IDF index over tool names and docstrings, built once per container."""
+
+    def __init__(self, tools):
+        self.tools = {t.name: t for t in tools}
+        self.tool_json = {t.name: create_tools_json([t])[0] for t in tools}
+        # Tool names are counted twice so they outweigh incidental docstring words
+        docs = {t.name: tokenize(f"{t.name} {t.name} {t.description or ''}".replace("_", " ")) for t in tools}
+
+        document_frequency = Counter(term for tokens in docs.values() for term in set(tokens))
+        self.idf = {term: math.log((1 + len(docs)) / (1 + df)) + 1 for term, df in document_frequency.items()}
+        self.vectors = {name: self._vector(tokens) for name, tokens in docs.items()}
+
+    def _vector(self, tokens):
+        counts = Counter(t for t in tokens if t in self.idf)
+        vector = {term: (1 + math.log(count)) * self.idf[term] for term, count in counts.items()}
+        norm = math.sqrt(sum(v * v for v in vector.values())) or 1.0
+        return {term: v / norm for term, v in vector.items()}
+
+    def search(self, text, k):
+        """Returns up to k (tool name, score) pairs with a positive cosine score, best first."""
+        query = self._vector(tokenize(text))
+        scores = [(name, sum(w * vector.get(term, 0.0) for term, w in query.items())) for name, vector in self.vectors.items()]
+        return [(name, score) for name, score in sorted(scores, key=lambda x: x[1], reverse=True)[:k] if score > 0]
+
+    def json_for(self, names):
+        return [self.tool_json[name] for name in self.tools if name in names]
+
+def recent_query_text(messages, human_turns=2):
+    """
+    Joins the user text of the last few human messages, the text tools are retrieved for.
+    Only the "- Message:" line of the prompt built by handle_message is used, so the
+    fixed prompt wording does not match tools on every turn.
+    """
+    texts = []
+    for m in messages:
+        if isinstance(m, HumanMessage) and isinstance(m.content, str):
+            user_text = re.search(r"^- Message: (.*)$", m.content, re.MULTILINE)
+            texts.append(user_text.group(1) if user_text else m.content)
+    return "\n".join(texts[-human_turns:])
+
+def used_tool_names(messages):
+    """Tools already called in the retained history stay available for follow-ups."""
+    return {call["name"] for m in messages if isinstance(m, AIMessage) for call in m.tool_calls}
+
+def select_tools(index, messages, k=TOOL_INDEX_TOP_K):
+    """
+    Picks the tool names to offer for this agent step: the pinned core set, tools
+    already used in the conversation, and the top-k retrieved for recent user text.
+
+    :return: Set of tool names, or None to offer the full tool set.
+    """
+    if not TOOL_INDEX_ENABLED:
+        return None
+
+    matches = index.search(recent_query_text(messages), k)
+    if not matches:
+        # Nothing recognisable in the request, let the model see everything
+        return None
+
+    selected = {name for name, _ in matches}
+    selected.update(name for name in PINNED_TOOLS if name in index.tools)
+    selected.update(name for name in used_tool_names(messages) if name in index.tools)
+    print(f"Offering tools {sorted(selected)} (retrieved: {[(n, round(s, 3)) for n, s in matches]})")
+    return selected
+
+def signals_missing_capability(index, messages, response, k=TOOL_INDEX_TOP_K):
+    """
+    True when the model called MISSING_CAPABILITY_TOOL although the recent user text did
+    not retrieve it. The tool is pinned, so a call that the request itself retrieved is a
+    genuine story request and must not trigger a second model call with every tool.
+    """
+    if not any(call["name"] == MISSING_CAPABILITY_TOOL for call in response.tool_calls):
+        return False
+    return MISSING_CAPABILITY_TOOL not in {name for name, _ in index.search(recent_query_text(messages), k)}
@@ -4,11 +4,18 @@ from utils import get_secret
 import requests
 from datetime import datetime, timedelta
 import requests
-import boto3
 import json
 import os
 import base64
 from natgateway import create_nat_gateway_for_vpc_name, delete_all_available_nat_gateways_for_vpc_name
+from bulkpower import bulk_ec2_action, bulk_rds_action
+from reports import send_templated_report
+from utilization import find_idle_resources
+from billing import fetch_daily_costs, summarize_costs
+from storyindex import story_index
+from resilience import aws_client, resilient_post, CircuitOpenError
+from idempotency import idempotent_tool
+from typing import List, Optional
 import threading
 
 @tool
@@ -19,7 +26,7 @@ def start_ec2_instance(instance_id):
     :param instance_id: The ID of the EC2 instance to start.
     :return: None
     """ 
-    ec2 = boto3.client('ec2')
+    ec2 = aws_client('ec2')
     ec2.start_instances(InstanceIds=[instance_id])
     return f"Instance {instance_id} has been started."
 
@@ -31,7 +38,7 @@ def stop_ec2_instance(instance_id):
     :param instance_id: The ID of the EC2 instance to stop.
     :return: None
     """ 
-    ec2 = boto3.client('ec2')
+    ec2 = aws_client('ec2')
     ec2.stop_instances(InstanceIds=[instance_id])
     return f"Instance {instance_id} has been stopped."
 
@@ -44,7 +51,7 @@ def list_ec2_instances_by_name():
 
     :return: A list of dictionaries with instance IDs, names, and current status.
     """
-    ec2 = boto3.client('ec2')
+    ec2 = aws_client('ec2')
 
     response = ec2.describe_instances()
 
@@ -71,7 +78,7 @@ def start_rds_instance(db_instance_identifier):
     :param db_instance_identifier: The identifier of the RDS instance to start.
     :return: A confirmation message indicating the RDS instance has been started.
     """
-    rds = boto3.client('rds')
+    rds = aws_client('rds')
     rds.start_db_instance(DBInstanceIdentifier=db_instance_identifier)
     return f"RDS instance {db_instance_identifier} has been started."
 
@@ -83,7 +90,7 @@ def stop_rds_instance(db_instance_identifier):
     :param db_instance_identifier: The identifier of the RDS instance to stop.
     :return: A message indicating the RDS instance has been stopped.
     """
-    rds = boto3.client('rds')
+    rds = aws_client('rds')
     rds.stop_db_instance(DBInstanceIdentifier=db_instance_identifier)
     return f"RDS instance {db_instance_identifier} has been stopped."
 
@@ -95,7 +102,7 @@ def list_rds_instances():
     Returns:
         list: A list of dictionaries containing 'DBInstanceIdentifier' and 'DBInstanceStatus'.
     """
-    rds = boto3.client('rds')
+    rds = aws_client('rds')
     response = rds.describe_db_instances()
     instances = []
     for db_instance in response['DBInstances']:
@@ -109,6 +116,7 @@ def list_rds_instances():
 
     
 @tool
+@idempotent_tool("recipient")
 def send_whatsapp_message(recipient, message):
     """
     Sends a WhatsApp message using the Meta API.
@@ -135,17 +143,25 @@ def send_whatsapp_message(recipient, message):
         "text": {"body": message}
     }
     
-    response = requests.post(url, headers=headers, json=payload)
+    try:
+        response = resilient_post("whatsapp", url, headers=headers, json=payload)
+    except (CircuitOpenError, requests.RequestException) as e:
+        print("Failed to send WhatsApp message:", str(e))
+        return {"error": f"WhatsApp message not sent: {str(e)}"}
     return response.json()
 
 @tool
 def get_billing_data(days: int = 30):
     """
-    Fetches AWS billing data for the given period and provides a full cost breakdown.
-    :param days: Number of days in the past to analyze.
-    :return: Structured billing data.
+    Fetches AWS billing data for the given period and provides a full cost breakdown
+    with precomputed trends, so answer cost trend questions from the summary fields.
+    :param days: Number of days in the past to analyze (up to 90 or more).
+    :return: Structured billing data: total_cost, currency, service_costs (sorted, highest first),
+             daily (average, last day cost and change, largest day-over-day increase),
+             trend (previous vs last window daily average), top_movers (services whose daily
+             cost changed most between those windows) and anomalies (service cost spikes by date).
     """
-    ce = boto3.client('ce')
+    ce = aws_client('ce')
 
     # Define date range
     ut_end_date = datetime.utcnow()  # Use UTC to match AWS timestamps
@@ -155,54 +171,17 @@ def get_billing_data(days: int = 30):
     print(f"Fetching AWS billing data from {start_date} to {end_date}...")
 
     try:
-        # Query AWS Cost Explorer
-        response = ce.get_cost_and_usage(
-            TimePeriod={"Start": start_date, "End": end_date},
-            Granularity="DAILY",  # Changed to daily for more accuracy
-            Metrics=["UnblendedCost"],
-            GroupBy=[{"Type": "DIMENSION", "Key": "SERVICE"}]  # Group by service
-        )
+        # Query AWS Cost Explorer, daily cost per service as a services x days matrix
+        dates, services, matrix, currency = fetch_daily_costs(ce, start_date, end_date)
     except Exception as e:
         print("Error fetching AWS billing data:", str(e))
         return None
 
-    # Initialize total cost and currency
-    total_cost = 0.0
-    currency = "USD"  # Default currency
-
-    service_costs = {}
-
-    # Process results
-    for period in response.get("ResultsByTime", []):
-        for group in period.get("Groups", []):
-            service = group["Keys"][0]  # Extract service name
-            cost = float(group["Metrics"]["UnblendedCost"]["Amount"])  # Convert cost to float
-            currency = group["Metrics"]["UnblendedCost"].get("Unit", currency)  # Get currency
-            
-            # Aggregate costs for the service
-            if service in service_costs:
-                service_costs[service] += cost
-            else:
-                service_costs[service] = cost
-
-            total_cost += cost  # Accumulate total cost
-
-    # Convert dictionary to sorted list
-    service_cost_list = [
-        {"service": service, "cost": round(cost, 2)}
-        for service, cost in sorted(service_costs.items(), key=lambda x: x[1], reverse=True)
-    ]
-
-    return {
-        "total_cost": round(total_cost, 2),
-        "currency": currency,
-        "service_costs": service_cost_list,
-        "start_date": start_date,
-        "end_date": end_date,
-    }
+    return summarize_costs(dates, services, matrix, currency, start_date, end_date)
 
 # @! create tool to create user story in Azure Devops, also suggest input 
 @tool
+@idempotent_tool()
 def create_azure_devops_user_story(title, description, acceptance_criteria):
     """
     Creates a new Azure DevOps user story and sends the story ID to an AWS SQS queue.
@@ -218,7 +197,29 @@ def create_azure_devops_user_story(title, description, acceptance_criteria):
     if not az_token or not sqs_queue_url:
         print("Failed to retrieve required environment variables.")
         return None
-    
+
+    # Link near-duplicate requests to the existing story instead of kicking off development again
+    if story_index:
+        try:
+            duplicate = story_index.find_duplicate(title, description)
+        except Exception as e:
+            print("Story index lookup failed, creating story anyway:", str(e))
+            duplicate = None
+        if duplicate:
+            story, similarity = duplicate
+            try:
+                story_index.link_request(story["story_id"], title, description)
+            except Exception as e:
+                print(f"Failed to link request to story {story['story_id']}:", str(e))
+            print(f"Request '{title}' linked to existing story {story['story_id']} (similarity {similarity:.2f})")
+            return {
+                "duplicate_of": story["story_id"],
+                "title": story["title"],
+                "similarity": round(similarity, 2),
+                "request_count": int(story.get("request_count", 1)) + 1,
+                "message": "A similar user story already exists, this request has been linked to it.",
+            }
+
     auth_header = base64.b64encode(f"'':{az_token}".encode()).decode()
 
     # Format acceptance criteria as a bullet-point list
@@ -238,7 +239,11 @@ def create_azure_devops_user_story(title, description, acceptance_criteria):
         {"op": "add", "path": "/fields/Microsoft.VSTS.Common.AcceptanceCriteria", "value": formatted_acceptance_criteria}
     ]
 
-    response = requests.post(url, headers=headers, json=payload)
+    try:
+        response = resilient_post("azure_devops", url, headers=headers, json=payload)
+    except (CircuitOpenError, requests.RequestException) as e:
+        print("Failed to create user story:", str(e))
+        return {"error": f"User story not created: {str(e)}"}
 
     if response.status_code in [200, 201]:
         story_data = response.json()
@@ -247,7 +252,7 @@ def create_azure_devops_user_story(title, description, acceptance_criteria):
         
         if story_id:
             # Send story ID to SQS
-            sqs_client = boto3.client("sqs")
+            sqs_client = aws_client("sqs")
             message_body = json.dumps({"story_id": story_id})
             
             sqs_response = sqs_client.send_message(
@@ -256,6 +261,12 @@ def create_azure_devops_user_story(title, description, acceptance_criteria):
             )
             
             print(f"Story ID {story_id} sent to SQS. Message ID: {sqs_response['MessageId']}")
+
+            if story_index:
+                try:
+                    story_index.add_story(story_id, title, description)
+                except Exception as e:
+                    print("Failed to add story to index:", str(e))
         
         return story_data
     else:
@@ -278,7 +289,7 @@ def list_lambda_functions():
     Note:
         The tool now accepts multiple synonymous terms for AWS Lambda functions.
     """
-    lambda_client = boto3.client('lambda')
+    lambda_client = aws_client('lambda')
     response = lambda_client.list_functions()
     functions = []
     for function in response['Functions']:
@@ -293,6 +304,7 @@ def list_lambda_functions():
 tool_list.append(list_lambda_functions)
 
 @tool
+@idempotent_tool()
 def send_email_via_ses(email_json: str):
     """
     Sends an email using AWS SES.
@@ -307,6 +319,7 @@ def send_email_via_ses(email_json: str):
 
     Note:
     For visually appealing, well-formatted reports (e.g., tables, styled text), set "is_html" to true and use HTML in the "body".
+    For billing or inventory reports use send_report_email instead, which renders the report server-side.
 
     :param email_json: JSON string containing email details.
     :return: Response message indicating success or failure.
@@ -325,7 +338,7 @@ def send_email_via_ses(email_json: str):
 
         # Construct email body (HTML or plain text)
         message_body = {"Html": {"Data": body}} if is_html else {"Text": {"Data": body}}
-        ses_client = boto3.client("ses")
+        ses_client = aws_client("ses")
         FROM_EMAIL = os.getenv("EMAIL_FROM", "agent@mockify.com")
         # Send email via AWS SES
         response = ses_client.send_email(
@@ -345,6 +358,7 @@ def send_email_via_ses(email_json: str):
 tool_list.append(send_email_via_ses)
 
 @tool
+@idempotent_tool("vpc_name_tag")
 def create_nat_gateway(vpc_name_tag: str):
     """
     Creates a NAT Gateway in the public subnet of a VPC identified by its 'Name' tag.
@@ -368,6 +382,7 @@ def create_nat_gateway(vpc_name_tag: str):
 tool_list.append(create_nat_gateway)
 
 @tool
+@idempotent_tool("vpc_name_tag")
 def delete_nat_gateway(vpc_name_tag: str):
     """
     Deletes all NAT Gateways and associated Elastic IP for a VPC identified by its 'Name' tag.
@@ -387,3 +402,109 @@ def delete_nat_gateway(vpc_name_tag: str):
     return {"status": "Finished", "operation": "delete_nat_gateway", "vpc_name_tag": vpc_name_tag}
 
 tool_list.append(delete_nat_gateway)
+
+@tool
+def bulk_start_stop_ec2_instances(action: str, instance_ids: Optional[List[str]] = None, name_contains: Optional[str] = None,
+                                  tag_key: Optional[str] = None, tag_value: Optional[str] = None, dry_run: bool = False):
+    """
+    Starts or stops many EC2 instances in one step, selected by ID list and/or by Name tag and tag filters.
+    Use this instead of repeated start_ec2_instance/stop_ec2_instance calls, e.g. "stop all dev instances".
+
+    Args:
+        action (str): 'start' or 'stop'.
+        instance_ids (list[str], optional): Explicit instance IDs.
+        name_contains (str, optional): Substring of the instance 'Name' tag (case-sensitive).
+        tag_key (str, optional): Tag key the instances must have, e.g. 'env'.
+        tag_value (str, optional): Required value for tag_key, e.g. 'dev'.
+        dry_run (bool): When true, only checks permissions and reports what would happen.
+
+    Returns:
+        dict: 'counts' per result and 'results' with ResourceId, Name, PreviousState, Result
+              ('ok', 'skipped', 'dry_run_ok' or 'error') and Detail for every matched instance.
+    """
+    return bulk_ec2_action(action, instance_ids, name_contains, tag_key, tag_value, dry_run)
+
+tool_list.append(bulk_start_stop_ec2_instances)
+
+@tool
+def bulk_start_stop_rds_instances(action: str, instance_ids: Optional[List[str]] = None, name_contains: Optional[str] = None,
+                                  tag_key: Optional[str] = None, tag_value: Optional[str] = None, dry_run: bool = False):
+    """
+    Starts or stops many RDS instances in one step, selected by identifier list and/or by identifier substring and tag filters.
+    Use this instead of repeated start_rds_instance/stop_rds_instance calls.
+
+    Args:
+        action (str): 'start' or 'stop'.
+        instance_ids (list[str], optional): Explicit DB instance identifiers.
+        name_contains (str, optional): Substring of the DB instance identifier.
+        tag_key (str, optional): Tag key the instances must have, e.g. 'env'.
+        tag_value (str, optional): Required value for tag_key, e.g. 'dev'.
+        dry_run (bool): When true, only reports what would happen.
+
+    Returns:
+        dict: 'counts' per result and 'results' with ResourceId, Name, PreviousState, Result
+              ('ok', 'skipped', 'dry_run_ok' or 'error') and Detail for every matched instance.
+    """
+    return bulk_rds_action(action, instance_ids, name_contains, tag_key, tag_value, dry_run)
+
+tool_list.append(bulk_start_stop_rds_instances)
+
+@tool
+def find_idle_ec2_rds_instances(days: int = 14, services: Optional[List[str]] = None, limit: int = 20):
+    """
+    Finds idle (unused, underutilized) running EC2 and available RDS instances from their CloudWatch
+    CPU, network and database connection metrics, ranked most idle first. Use it when the user asks
+    which instances can be stopped to save cost; stop them with the bulk start/stop tools after confirming.
+
+    Args:
+        days (int): Number of past days to analyze, default 14.
+        services (list[str], optional): 'ec2' and/or 'rds', default both.
+        limit (int): Maximum number of idle instances to return.
+
+    Returns:
+        dict: 'idle' list with service, ResourceId, Name, cpu_avg, cpu_p95, idle_hours_pct and
+              network_mb_per_hour (EC2) or max_connections (RDS); instance counts analyzed and
+              'insufficient_data' for instances with too little metric history.
+    """
+    try:
+        return find_idle_resources(days, tuple(services or ("ec2", "rds")), limit)
+    except Exception as e:
+        return {"error": f"Error analyzing instance utilization: {str(e)}"}
+
+tool_list.append(find_idle_ec2_rds_instances)
+
+# data_ref prefix -> function returning the structured data for a report
+REPORT_DATA_SOURCES = {
+    "billing": lambda arg: get_billing_data.func(int(arg) if arg else 30),
+    "ec2_inventory": lambda arg: list_ec2_instances_by_name.func(),
+    "rds_inventory": lambda arg: list_rds_instances.func(),
+    "lambda_inventory": lambda arg: list_lambda_functions.func(),
+}
+
+@tool
+@idempotent_tool("template_name")
+def send_report_email(template_name: str, data_ref: str, recipients: List[str], subject: Optional[str] = None):
+    """
+    Sends a formatted report email to one or more recipients in a single call. The report is
+    fetched and rendered server-side, so do not fetch the data or write the email body yourself.
+
+    Args:
+        template_name (str): 'billing_summary' or 'inventory_table'.
+        data_ref (str): Data to report on: 'billing:<days>' (e.g. 'billing:30') for billing_summary,
+                        or 'ec2_inventory', 'rds_inventory', 'lambda_inventory' for inventory_table.
+        recipients (list[str]): Email addresses to send the report to.
+        subject (str, optional): Subject line, defaults to the report title.
+
+    Returns:
+        dict: The subject and per-recipient send status.
+    """
+    source, _, arg = data_ref.partition(":")
+    if source not in REPORT_DATA_SOURCES:
+        return {"error": f"Unknown data_ref '{data_ref}', expected one of {list(REPORT_DATA_SOURCES)}."}
+    try:
+        data = REPORT_DATA_SOURCES[source](arg)
+        return send_templated_report(template_name, data, recipients, subject)
+    except Exception as e:
+        return {"error": f"Error sending report: {str(e)}"}
+
+tool_list.append(send_report_email)
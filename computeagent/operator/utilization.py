@@ -0,0 +1,169 @@
+import os
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from bulkpower import resolve_ec2_instances, resolve_rds_instances
+from resilience import aws_client
+
+METRIC_PERIOD_SECONDS = 3600
+MAX_QUERIES_PER_CALL = 500  # GetMetricData limit
+
+# An instance is idle when its p95 CPU and its traffic/connections stay under these
+IDLE_CPU_P95 = float(os.getenv("IDLE_CPU_P95", 5.0))
+IDLE_NETWORK_MB_PER_HOUR = float(os.getenv("IDLE_NETWORK_MB_PER_HOUR", 5.0))
+IDLE_MAX_CONNECTIONS = float(os.getenv("IDLE_MAX_CONNECTIONS", 0))
+# Instances with metrics for fewer of the hours (e.g. recently launched) are not judged
+MIN_COVERAGE = 0.5
+
+# service -> [(result name, namespace, metric, stat)]
+METRICS = {
+    "ec2": [
+        ("cpu", "AWS/EC2", "CPUUtilization", "Average"),
+        ("network_in", "AWS/EC2", "NetworkIn", "Sum"),
+        ("network_out", "AWS/EC2", "NetworkOut", "Sum"),
+    ],
+    "rds": [
+        ("cpu", "AWS/RDS", "CPUUtilization", "Average"),
+        ("connections", "AWS/RDS", "DatabaseConnections", "Maximum"),
+    ],
+}
+DIMENSION = {"ec2": "InstanceId", "rds": "DBInstanceIdentifier"}
+
+def build_queries(service, instances):
+    """One query per instance and metric; the Id encodes the row and metric for reassembly."""
+    queries = []
+    for row, instance in enumerate(instances):
+        for metric_index, (_, namespace, metric, stat) in enumerate(METRICS[service]):
+            queries.append({
+                "Id": f"{service}_{metric_index}_{row}",
+                "MetricStat": {
+                    "Metric": {
+                        "Namespace": namespace,
+                        "MetricName": metric,
+                        "Dimensions": [{"Name": DIMENSION[service], "Value": instance["ResourceId"]}],
+                    },
+                    "Period": METRIC_PERIOD_SECONDS,
+                    "Stat": stat,
+                },
+                "ReturnData": True,
+            })
+    return queries
+
+def fetch_metric_data(client, queries, start, end):
+    """
+    Runs the queries in batches of MAX_QUERIES_PER_CALL, following NextToken pages.
+
+    :return: ({query id: (timestamps, values)}, number of API calls)
+    """
+    series = {}
+    calls = 0
+    paginator = client.get_paginator("get_metric_data")
+    for offset in range(0, len(queries), MAX_QUERIES_PER_CALL):
+        pages = paginator.paginate(
+            MetricDataQueries=queries[offset:offset + MAX_QUERIES_PER_CALL],
+            StartTime=start,
+            EndTime=end,
+            ScanBy="TimestampAscending",
+        )
+        for page in pages:
+            calls += 1
+            for result in page["MetricDataResults"]:
+                timestamps, values = series.setdefault(result["Id"], ([], []))
+                timestamps.extend(result["Timestamps"])
+                values.extend(result["Values"])
+    return series, calls
+
+def series_matrices(service, row_count, series, start, hours):
+    """Lays the series out as one (instances x hours) matrix per metric, NaN where no datapoint exists."""
+    matrices = {name: np.full((row_count, hours), np.nan) for name, *_ in METRICS[service]}
+    for query_id, (timestamps, values) in series.items():
+        _, metric_index, row = query_id.split("_")
+        if not timestamps:
+            continue
+        offsets = np.array([(t - start).total_seconds() for t in timestamps]) // METRIC_PERIOD_SECONDS
+        hour_index = offsets.astype(int)
+        in_range = (hour_index >= 0) & (hour_index < hours)
+        name = METRICS[service][int(metric_index)][0]
+        matrices[name][int(row), hour_index[in_range]] = np.asarray(values, dtype=float)[in_range]
+    return matrices
+
+def nan_stat(fn, matrix):
+    """Row-wise statistic that yields NaN instead of warning for rows without data."""
+    result = np.full(matrix.shape[0], np.nan)
+    has_data = ~np.isnan(matrix).all(axis=1)
+    if has_data.any():
+        result[has_data] = fn(matrix[has_data])
+    return result
+
+def analyze_service(service, instances, matrices, hours):
+    """Vectorized per-instance statistics and the idle decision for one service."""
+    cpu = matrices["cpu"]
+    coverage = (~np.isnan(cpu)).sum(axis=1) / hours
+    stats = {
+        "cpu_avg": nan_stat(lambda m: np.nanmean(m, axis=1), cpu),
+        "cpu_p95": nan_stat(lambda m: np.nanpercentile(m, 95, axis=1), cpu),
+        "idle_hours_pct": 100 * (cpu < IDLE_CPU_P95).sum(axis=1) / hours,
+    }
+    idle = stats["cpu_p95"] < IDLE_CPU_P95
+    if service == "ec2":
+        network = np.nansum(np.stack([matrices["network_in"], matrices["network_out"]]), axis=0)
+        network[np.isnan(matrices["network_in"]) & np.isnan(matrices["network_out"])] = np.nan
+        stats["network_mb_per_hour"] = nan_stat(lambda m: np.nanmean(m, axis=1), network) / (1024 * 1024)
+        idle &= ~(stats["network_mb_per_hour"] >= IDLE_NETWORK_MB_PER_HOUR)
+    else:
+        stats["max_connections"] = nan_stat(lambda m: np.nanmax(m, axis=1), matrices["connections"])
+        idle &= ~(stats["max_connections"] > IDLE_MAX_CONNECTIONS)
+
+    enough_data = coverage >= MIN_COVERAGE
+    idle_rows = np.flatnonzero(idle & enough_data)
+    results = []
+    for row in idle_rows:
+        entry = {"service": service, "ResourceId": instances[row]["ResourceId"], "Name": instances[row]["Name"]}
+        entry.update({name: round(float(values[row]), 2) for name, values in stats.items()})
+        if instances[row].get("ClusterMember"):
+            entry["note"] = "Aurora cluster member, stop the cluster instead."
+        results.append(entry)
+    insufficient = [instances[row]["ResourceId"] for row in np.flatnonzero(~enough_data)]
+    return results, insufficient
+
+def find_idle_resources(days=14, services=("ec2", "rds"), limit=20):
+    """
+    Finds running EC2 and available RDS instances that were idle over the last `days`,
+    using batched GetMetricData queries for every instance and NumPy reductions.
+
+    :return: Compact report with the idle instances ranked most idle first.
+    """
+    end = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    start = end - timedelta(days=days)
+    hours = days * 24
+    cloudwatch = aws_client("cloudwatch")
+
+    resolvers = {
+        "ec2": lambda: [i for i in resolve_ec2_instances(aws_client("ec2")) if i["PreviousState"] == "running"],
+        "rds": lambda: [i for i in resolve_rds_instances(aws_client("rds")) if i["PreviousState"] == "available"],
+    }
+
+    idle, insufficient, analyzed, api_calls = [], [], {}, 0
+    for service in services:
+        if service not in resolvers:
+            return {"error": f"Unsupported service '{service}', expected 'ec2' or 'rds'."}
+        instances = resolvers[service]()
+        analyzed[service] = len(instances)
+        if not instances:
+            continue
+        series, calls = fetch_metric_data(cloudwatch, build_queries(service, instances), start, end)
+        api_calls += calls
+        matrices = series_matrices(service, len(instances), series, start, hours)
+        service_idle, service_insufficient = analyze_service(service, instances, matrices, hours)
+        idle += service_idle
+        insufficient += service_insufficient
+
+    idle.sort(key=lambda entry: (entry["cpu_p95"], -entry["idle_hours_pct"]))
+    print(f"Idle analysis: {analyzed} instances, {len(idle)} idle, {api_calls} GetMetricData call(s)")
+    return {
+        "period_days": days,
+        "thresholds": {"cpu_p95": IDLE_CPU_P95, "network_mb_per_hour": IDLE_NETWORK_MB_PER_HOUR, "max_connections": IDLE_MAX_CONNECTIONS},
+        "analyzed": analyzed,
+        "idle_count": len(idle),
+        "idle": idle[:limit],
+        "insufficient_data": insufficient,
+    }
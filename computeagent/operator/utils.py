@@ -1,15 +1,28 @@
-import boto3
+import os
+import time
+from resilience import aws_client
+
+SECRET_CACHE_TTL_SECONDS = int(os.getenv("SECRET_CACHE_TTL_SECONDS", 300))
+
+# secret_name -> (value, fetched_at), shared by all invocations served by this warm container
+_secret_cache = {}
 
 def get_secret(secret_name):
     """
-    Fetches the WhatsApp API token from AWS Secrets Manager.
+    Fetches a secret string (e.g. the WhatsApp API token) from AWS Secrets Manager,
+    cached for SECRET_CACHE_TTL_SECONDS so rotated secrets are picked up.
     """
-    client = boto3.client("secretsmanager")
+    cached = _secret_cache.get(secret_name)
+    if cached and time.monotonic() - cached[1] < SECRET_CACHE_TTL_SECONDS:
+        return cached[0]
+
+    client = aws_client("secretsmanager")
     
     try:
         response = client.get_secret_value(SecretId=secret_name)
-        secret_data = response["SecretString"]
-        return str(secret_data)
+        secret_data = str(response["SecretString"])
+        _secret_cache[secret_name] = (secret_data, time.monotonic())
+        return secret_data
     except Exception as e:
         print(f"Error fetching secret: {e}")
         return None
@@ -0,0 +1,10 @@
+import os
+import sys
+
+# The Lambda code imports its modules as top level names (CodeUri: operator/)
+OPERATOR_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "operator")
+sys.path.insert(0, os.path.abspath(OPERATOR_DIR))
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "ap-south-1")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
@@ -0,0 +1,70 @@
+import numpy as np
+
+import billing
+
+def period(date, *costs):
+    return {
+        "TimePeriod": {"Start": date},
+        "Groups": [{"Keys": [service], "Metrics": {"UnblendedCost": {"Amount": str(amount), "Unit": "USD"}}} for service, amount in costs],
+    }
+
+class FakeCostExplorer:
+    def __init__(self, pages):
+        self.pages = pages
+        self.tokens = []
+
+    def get_cost_and_usage(self, **params):
+        self.tokens.append(params.get("NextPageToken"))
+        page = len(self.tokens) - 1
+        response = {"ResultsByTime": self.pages[page]}
+        if page + 1 < len(self.pages):
+            response["NextPageToken"] = f"page-{page + 1}"
+        return response
+
+def test_fetch_daily_costs_merges_a_day_split_across_pages():
+    ce = FakeCostExplorer([
+        [period("2026-01-01", ("EC2", 2.0), ("S3", 1.0)), period("2026-01-02", ("EC2", 3.0))],
+        [period("2026-01-02", ("S3", 4.0), ("EC2", 0.5)), period("2026-01-03", ("RDS", 5.0))],
+    ])
+    dates, services, matrix, currency = billing.fetch_daily_costs(ce, "2026-01-01", "2026-01-04")
+    assert ce.tokens == [None, "page-1"]
+    assert dates == ["2026-01-01", "2026-01-02", "2026-01-03"]
+    assert services == ["EC2", "RDS", "S3"]
+    np.testing.assert_allclose(matrix, [[2.0, 3.5, 0.0], [0.0, 0.0, 5.0], [1.0, 4.0, 0.0]])
+    assert currency == "USD"
+
+def test_rolling_mean_and_std():
+    matrix = np.array([[1.0, 2.0, 3.0, 4.0], [2.0, 2.0, 2.0, 2.0]])
+    np.testing.assert_allclose(billing.rolling_mean(matrix, 2), [[1.5, 2.5, 3.5], [2.0, 2.0, 2.0]])
+    np.testing.assert_allclose(billing.rolling_std(matrix, 2), [[0.5, 0.5, 0.5], [0.0, 0.0, 0.0]])
+
+def test_top_movers_ranks_by_absolute_change():
+    matrix = np.array([[1.0, 1.0, 3.0, 3.0], [4.0, 4.0, 1.0, 1.0], [2.0, 2.0, 2.0, 2.0]])
+    movers = billing.top_movers(["EC2", "RDS", "S3"], matrix, 2)
+    assert [(m["service"], m["change"], m["change_pct"]) for m in movers] == [("RDS", -3.0, -75.0), ("EC2", 2.0, 200.0)]
+
+def test_anomalies_flag_spikes_over_trailing_window(monkeypatch):
+    monkeypatch.setattr(billing, "ANOMALY_Z_SCORE", 3.0)
+    monkeypatch.setattr(billing, "ANOMALY_MIN_DELTA", 1.0)
+    dates = [f"2026-01-0{d}" for d in range(1, 7)]
+    matrix = np.array([
+        [10.0, 10.0, 10.0, 50.0, 10.0, 10.0],
+        [0.1, 0.1, 0.1, 0.9, 0.1, 0.1],
+    ])
+    flagged = billing.anomalies(dates, ["EC2", "Tiny"], matrix, 3)
+    assert flagged == [{"service": "EC2", "date": "2026-01-04", "cost": 50.0, "baseline": 10.0, "z_score": None}]
+
+def test_summarize_costs():
+    dates = ["2026-01-01", "2026-01-02", "2026-01-03", "2026-01-04"]
+    matrix = np.array([[1.0, 1.0, 3.0, 3.0], [0.0, 0.0, 0.0, 0.0]])
+    summary = billing.summarize_costs(dates, ["EC2", "Free"], matrix, "USD", dates[0], "2026-01-05")
+    assert summary["total_cost"] == 8.0
+    assert summary["service_costs"] == [{"service": "EC2", "cost": 8.0}]
+    assert summary["daily"]["largest_increase"] == {"date": "2026-01-03", "change": 2.0}
+    assert summary["trend"] == {"window_days": 2, "prev_daily_avg": 1.0, "last_daily_avg": 3.0, "rolling_daily_avg": [1.0, 3.0]}
+    assert summary["top_movers"][0]["service"] == "EC2"
+
+def test_summarize_single_day_has_no_trend():
+    summary = billing.summarize_costs(["2026-01-01"], ["EC2"], np.array([[2.0]]), "USD", "2026-01-01", "2026-01-02")
+    assert summary["total_cost"] == 2.0
+    assert "trend" not in summary and "daily" not in summary
@@ -0,0 +1,105 @@
+import boto3
+import botocore.exceptions
+import pytest
+from moto import mock_aws
+
+import budget
+
+LIMITS = {"profile": (2, 100), "global": (3, 1000)}
+
+@pytest.fixture()
+def clock(monkeypatch):
+    now = [1_000_020.0]
+    monkeypatch.setattr(budget.time, "time", lambda: now[0])
+    return now
+
+def test_memory_store_admits_until_request_limit(clock):
+    tokens = budget.TokenBudget(budget.MemoryBudgetStore(), LIMITS)
+    assert [tokens.admit("a"), tokens.admit("a"), tokens.admit("a")] == [None, None, "profile"]
+    assert tokens.admit("b") is None
+    assert tokens.admit("c") == "global"
+
+    usage = tokens.get_usage("a")
+    assert usage["total"] == {"requests": 2, "tokens": 0, "rejected": 1}
+    assert [w["requests"] for w in usage["windows"]] == [2]
+
+def test_memory_store_resets_on_next_window(clock):
+    tokens = budget.TokenBudget(budget.MemoryBudgetStore(), LIMITS)
+    tokens.admit("a")
+    tokens.admit("a")
+    clock[0] += budget.BUDGET_WINDOW_SECONDS
+    assert tokens.admit("a") is None
+    # Only the current window and the all-time total are kept
+    assert [w["window"] for w in tokens.get_usage("a")["windows"]] == [str(budget.current_window())]
+
+def test_charge_marks_scope_exhausted_until_window_ends(clock):
+    tokens = budget.TokenBudget(budget.MemoryBudgetStore(), LIMITS)
+    tokens.admit("a")
+    tokens.charge("a", 60)
+    assert tokens.exhausted("a") is None
+    tokens.charge("a", 60)
+    assert tokens.exhausted("a") == "profile"
+    assert tokens.admit("a") == "profile"
+    assert tokens.get_usage("a")["total"]["tokens"] == 120
+
+    clock[0] = budget.current_window() + budget.BUDGET_WINDOW_SECONDS
+    assert tokens.exhausted("a") is None
+    assert tokens.admit("a") is None
+
+def create_table():
+    boto3.client("dynamodb").create_table(
+        TableName="budget",
+        AttributeDefinitions=[{"AttributeName": "scope", "AttributeType": "S"}, {"AttributeName": "window", "AttributeType": "S"}],
+        KeySchema=[{"AttributeName": "scope", "KeyType": "HASH"}, {"AttributeName": "window", "KeyType": "RANGE"}],
+        BillingMode="PAY_PER_REQUEST",
+    )
+
+@mock_aws
+def test_dynamodb_store_admits_and_charges(clock, monkeypatch):
+    create_table()
+    monkeypatch.setattr(budget, "aws_client", boto3.client)
+    tokens = budget.TokenBudget(budget.DynamoDBBudgetStore("budget"), LIMITS)
+    assert [tokens.admit("a"), tokens.admit("a"), tokens.admit("a")] == [None, None, "profile"]
+    tokens.charge("a", 150)
+    assert tokens.exhausted("a") == "profile"
+    assert tokens.get_usage("a")["total"] == {"requests": 2, "tokens": 150, "rejected": 1}
+
+def cancelled(*codes):
+    return botocore.exceptions.ClientError(
+        {"Error": {"Code": "TransactionCanceledException"}, "CancellationReasons": [{"Code": code} for code in codes]},
+        "TransactWriteItems",
+    )
+
+class ConflictingClient:
+    def __init__(self, failures):
+        self.failures = list(failures)
+        self.attempts = 0
+
+    def transact_write_items(self, TransactItems):
+        self.attempts += 1
+        if self.failures:
+            raise self.failures.pop(0)
+
+    def update_item(self, **kwargs):
+        return {}
+
+@pytest.fixture()
+def conflicting_store(monkeypatch):
+    monkeypatch.setattr(budget, "backoff_delay", lambda attempt: 0)
+    return budget.DynamoDBBudgetStore("budget")
+
+def test_dynamodb_admit_retries_transaction_conflicts(conflicting_store):
+    conflicting_store.client = ConflictingClient([cancelled("None", "TransactionConflict", "None")] * 2)
+    assert conflicting_store.admit(budget.TokenBudget(None, LIMITS).scopes("a"), 0) is None
+    assert conflicting_store.client.attempts == 3
+
+def test_dynamodb_admit_gives_up_after_max_attempts(conflicting_store):
+    conflicting_store.client = ConflictingClient([cancelled("None", "TransactionConflict", "None")] * budget.ADMIT_MAX_ATTEMPTS)
+    with pytest.raises(botocore.exceptions.ClientError):
+        conflicting_store.admit(budget.TokenBudget(None, LIMITS).scopes("a"), 0)
+    assert conflicting_store.client.attempts == budget.ADMIT_MAX_ATTEMPTS
+
+def test_dynamodb_admit_rejection_wins_over_conflict(conflicting_store):
+    conflicting_store.client = ConflictingClient([cancelled("None", "ConditionalCheckFailed", "TransactionConflict")])
+    assert conflicting_store.admit(budget.TokenBudget(None, LIMITS).scopes("a"), 0) == budget.GLOBAL_SCOPE
+    assert conflicting_store.client.attempts == 1
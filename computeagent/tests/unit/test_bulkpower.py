@@ -0,0 +1,88 @@
+import boto3
+import botocore.exceptions
+import pytest
+from moto import mock_aws
+
+import bulkpower
+import resilience
+
+@pytest.fixture()
+def aws(monkeypatch):
+    with mock_aws():
+        # aws_client caches clients per container; these must be created inside the mock
+        monkeypatch.setattr(resilience, "_clients", {})
+        yield
+
+def run_instances(count, name):
+    ec2 = boto3.client("ec2")
+    image_id = ec2.describe_images(Owners=["amazon"])["Images"][0]["ImageId"]
+    response = ec2.run_instances(ImageId=image_id, MinCount=count, MaxCount=count, TagSpecifications=[
+        {"ResourceType": "instance", "Tags": [{"Key": "Name", "Value": name}]},
+    ])
+    return [instance["InstanceId"] for instance in response["Instances"]]
+
+def create_db(identifier):
+    boto3.client("rds").create_db_instance(
+        DBInstanceIdentifier=identifier, DBInstanceClass="db.t3.micro", Engine="postgres",
+        MasterUsername="admin", MasterUserPassword="password123", AllocatedStorage=20,
+    )
+
+def results_by_id(report):
+    return {r["ResourceId"]: r["Result"] for r in report["results"]}
+
+def test_ec2_mixed_batch_reports_unknown_ids(aws):
+    running = run_instances(2, "web")
+    unknown = "i-0123456789abcdef0"
+    report = bulkpower.bulk_ec2_action("stop", instance_ids=running + [unknown])
+    assert results_by_id(report) == {running[0]: "ok", running[1]: "ok", unknown: "not_found"}
+    assert report["matched"] == 2
+    assert report["counts"] == {"ok": 2, "not_found": 1}
+    states = boto3.client("ec2").describe_instances(InstanceIds=running)["Reservations"][0]["Instances"]
+    assert {i["State"]["Name"] for i in states} <= {"stopping", "stopped"}
+
+def test_ec2_skips_instances_in_target_state(aws):
+    running = run_instances(1, "web")
+    report = bulkpower.bulk_ec2_action("start", name_contains="web")
+    assert results_by_id(report) == {running[0]: "skipped"}
+    assert report["results"][0]["Name"] == "web"
+
+def test_ec2_failed_batch_is_retried_per_instance(aws, monkeypatch):
+    good, bad = run_instances(2, "web")
+    client = resilience.aws_client("ec2")
+    stop_instances = client.stop_instances
+    batches = []
+
+    def failing_stop(InstanceIds, DryRun):
+        batches.append(list(InstanceIds))
+        if bad in InstanceIds:
+            raise botocore.exceptions.ClientError({"Error": {"Code": "UnsupportedOperation", "Message": "no"}}, "StopInstances")
+        return stop_instances(InstanceIds=InstanceIds, DryRun=DryRun)
+    monkeypatch.setattr(client, "stop_instances", failing_stop)
+
+    report = bulkpower.bulk_ec2_action("stop", instance_ids=[good, bad])
+    assert batches == [[good, bad], [good], [bad]]
+    assert results_by_id(report) == {good: "ok", bad: "error"}
+
+def test_ec2_dry_run(aws):
+    running = run_instances(1, "web")
+    report = bulkpower.bulk_ec2_action("stop", instance_ids=running, dry_run=True)
+    assert results_by_id(report) == {running[0]: "dry_run_ok"}
+
+def test_rds_mixed_batch_reports_unknown_ids(aws):
+    create_db("orders-db")
+    create_db("billing-db")
+    report = bulkpower.bulk_rds_action("stop", instance_ids=["orders-db", "billing-db", "missing-db"])
+    assert results_by_id(report) == {"orders-db": "ok", "billing-db": "ok", "missing-db": "not_found"}
+    assert report["counts"] == {"ok": 2, "not_found": 1}
+    assert boto3.client("rds").describe_db_instances(DBInstanceIdentifier="orders-db")["DBInstances"][0]["DBInstanceStatus"] == "stopped"
+
+def test_rds_per_instance_results(aws):
+    create_db("orders-db")
+    create_db("billing-db")
+    boto3.client("rds").stop_db_instance(DBInstanceIdentifier="billing-db")
+    report = bulkpower.bulk_rds_action("start", name_contains="db", dry_run=True)
+    assert results_by_id(report) == {"orders-db": "skipped", "billing-db": "dry_run_ok"}
+
+def test_selector_is_required():
+    assert "error" in bulkpower.bulk_ec2_action("stop")
+    assert "error" in bulkpower.bulk_rds_action("reboot", instance_ids=["db"])
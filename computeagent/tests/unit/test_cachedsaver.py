@@ -0,0 +1,142 @@
+import pytest
+from langgraph.checkpoint.base import create_checkpoint, empty_checkpoint
+from langgraph_dynamodb_checkpoint import DynamoDBSaver
+from moto import mock_aws
+
+import cachedsaver
+
+THREAD = "profile-1"
+
+@pytest.fixture()
+def savers():
+    with mock_aws():
+        base = DynamoDBSaver("checkpoints")
+        # Another container writing to the same table
+        other = DynamoDBSaver("checkpoints")
+        yield cachedsaver.CachedCheckpointSaver(base), base, other
+
+def config(checkpoint_id=None):
+    configurable = {"thread_id": THREAD, "checkpoint_ns": ""}
+    if checkpoint_id:
+        configurable["checkpoint_id"] = checkpoint_id
+    return {"configurable": configurable}
+
+def put_checkpoint(saver, parent_config, messages, step):
+    checkpoint = create_checkpoint(empty_checkpoint(), None, step)
+    checkpoint["channel_values"] = {"messages": messages}
+    return saver.put(parent_config, checkpoint, {"source": "loop", "step": step}, {})
+
+def same(cached, stored):
+    assert cached.config == stored.config
+    assert cached.checkpoint == stored.checkpoint
+    assert cached.metadata == stored.metadata
+    assert sorted(cached.pending_writes) == sorted(stored.pending_writes)
+
+def test_own_writes_are_served_from_cache(savers):
+    cached, base, _ = savers
+    first = put_checkpoint(cached, config(), ["hi"], 1)
+    cached.put_writes(first, [("messages", "tool result")], "task-b")
+
+    tup = cached.get_tuple(config())
+    assert cached.stats["hits"] == 1
+    same(tup, base.get_tuple(config()))
+
+def test_miss_is_fetched_and_cached(savers):
+    cached, base, other = savers
+    put_checkpoint(other, config(), ["hi"], 1)
+    same(cached.get_tuple(config()), base.get_tuple(config()))
+    cached.get_tuple(config())
+    assert (cached.stats["misses"], cached.stats["hits"]) == (1, 1)
+
+def test_pending_write_from_another_container_sorting_low_is_seen(savers):
+    cached, base, other = savers
+    first = put_checkpoint(cached, config(), ["hi"], 1)
+    cached.put_writes(first, [("messages", "from this container")], "task-b")
+    # Sorts below task-b, so the newest sort key of the thread does not change
+    other.put_writes(first, [("messages", "from another container")], "task-a")
+
+    tup = cached.get_tuple(config())
+    assert cached.stats["stale"] == 1
+    same(tup, base.get_tuple(config()))
+    assert len(tup.pending_writes) == 2
+
+def test_checkpoint_from_another_container_is_seen(savers):
+    cached, base, other = savers
+    first = put_checkpoint(cached, config(), ["hi"], 1)
+    put_checkpoint(other, first, ["hi", "there"], 2)
+
+    tup = cached.get_tuple(config())
+    assert tup.checkpoint["channel_values"]["messages"] == ["hi", "there"]
+    same(tup, base.get_tuple(config()))
+
+def test_put_replaces_cached_checkpoint(savers):
+    cached, base, _ = savers
+    first = put_checkpoint(cached, config(), ["hi"], 1)
+    cached.put_writes(first, [("messages", "tool result")], "task-a")
+    second = put_checkpoint(cached, first, ["hi", "tool result"], 2)
+
+    tup = cached.get_tuple(config())
+    assert cached.stats["hits"] == 1
+    assert tup.config == second and tup.pending_writes == []
+    assert tup.parent_config == {"configurable": first["configurable"]}
+    same(tup, base.get_tuple(config()))
+
+def test_entries_are_evicted_least_recently_used(savers):
+    cached, base, _ = savers
+    cached.max_bytes = 0
+    put_checkpoint(cached, config(), ["x" * 1000], 1)
+    assert cached.entries == {} and cached.size == 0
+    assert cached.stats["evictions"] == 1
+
+    cached.max_bytes = 10 ** 6
+    for thread_id in ("a", "b", "c"):
+        put_checkpoint(cached, {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}, ["x" * 1000], 1)
+    entry_size = cached.entries["a"]["size"]
+    cached.get_tuple({"configurable": {"thread_id": "a", "checkpoint_ns": ""}})
+    cached.max_bytes = 2 * entry_size
+    put_checkpoint(cached, {"configurable": {"thread_id": "d", "checkpoint_ns": ""}}, ["x" * 1000], 1)
+    assert list(cached.entries) == ["a", "d"]
+    assert cached.size == sum(entry["size"] for entry in cached.entries.values())
+
+def test_older_checkpoints_bypass_the_cache(savers):
+    cached, base, _ = savers
+    first = put_checkpoint(cached, config(), ["hi"], 1)
+    put_checkpoint(cached, first, ["hi", "there"], 2)
+    tup = cached.get_tuple(config(first["configurable"]["checkpoint_id"]))
+    same(tup, base.get_tuple(config(first["configurable"]["checkpoint_id"])))
+    assert cached.stats["hits"] == 0
+
+def test_prefetched_checkpoint_is_used_once(savers):
+    cached, base, other = savers
+    first = put_checkpoint(other, config(), ["hi"], 1)
+    assert cached.prefetch(config()).config == first
+    put_checkpoint(other, first, ["hi", "there"], 2)
+
+    # The run that follows the prefetch gets the prefetched tuple without a read
+    assert cached.get_tuple(config()).config == first
+    assert cached.stats["prefetched"] == 1 and cached.prefetched == {}
+    # Later reads go through the freshness check again
+    same(cached.get_tuple(config()), base.get_tuple(config()))
+    assert cached.stats["prefetched"] == 1
+
+def test_expired_prefetch_falls_back_to_a_fresh_read(savers, monkeypatch):
+    cached, base, other = savers
+    now = [1000.0]
+    monkeypatch.setattr(cachedsaver.time, "monotonic", lambda: now[0])
+    first = put_checkpoint(other, config(), ["hi"], 1)
+    cached.prefetch(config())
+    put_checkpoint(other, first, ["hi", "there"], 2)
+
+    now[0] += cachedsaver.PREFETCH_MAX_AGE_SECONDS
+    tup = cached.get_tuple(config())
+    assert cached.stats["prefetched"] == 0 and cached.prefetched == {}
+    assert tup.checkpoint["channel_values"]["messages"] == ["hi", "there"]
+    same(tup, base.get_tuple(config()))
+
+def test_put_discards_prefetch(savers):
+    cached, _, _ = savers
+    first = put_checkpoint(cached, config(), ["hi"], 1)
+    cached.prefetch(config())
+    second = put_checkpoint(cached, first, ["hi", "there"], 2)
+    assert cached.prefetched == {}
+    assert cached.get_tuple(config()).config == second
@@ -0,0 +1,69 @@
+import boto3
+import pytest
+from moto import mock_aws
+
+import compaction
+
+def checkpoint(ns, checkpoint_id, size=10):
+    return (ns, checkpoint_id, f"cp#{ns}#{checkpoint_id}", size)
+
+def writes(ns, checkpoint_id, task="t", size=5):
+    return (ns, checkpoint_id, f"w#{ns}#{checkpoint_id}#{task}", size)
+
+def test_select_victims_keeps_newest_per_namespace():
+    thread = {
+        "checkpoints": [checkpoint("", "01"), checkpoint("", "03"), checkpoint("", "02"), checkpoint("sub", "01")],
+        "writes": [],
+    }
+    assert compaction.select_victims(thread, keep=2) == [("cp##01", 10, "checkpoint")]
+
+def test_select_victims_drops_writes_older_than_oldest_kept():
+    thread = {
+        "checkpoints": [checkpoint("", "01"), checkpoint("", "02"), checkpoint("", "03")],
+        # "00" belongs to a checkpoint that is already gone, "04" to one still being written
+        "writes": [writes("", "00"), writes("", "01"), writes("", "02"), writes("", "04"), writes("other", "00")],
+    }
+    victims = compaction.select_victims(thread, keep=2)
+    assert sorted(sk for sk, _, _ in victims) == ["cp##01", "w##00#t", "w##01#t"]
+    assert sum(size for _, size, _ in victims) == 20
+
+def test_select_victims_nothing_to_do():
+    thread = {"checkpoints": [checkpoint("", "01")], "writes": [writes("", "01")]}
+    assert compaction.select_victims(thread, keep=1) == []
+
+@mock_aws
+def test_compact_checkpoints_deletes_selected_items():
+    boto3.client("dynamodb").create_table(
+        TableName="checkpoints",
+        AttributeDefinitions=[{"AttributeName": "PK", "AttributeType": "S"}, {"AttributeName": "SK", "AttributeType": "S"}],
+        KeySchema=[{"AttributeName": "PK", "KeyType": "HASH"}, {"AttributeName": "SK", "KeyType": "RANGE"}],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    table = boto3.resource("dynamodb").Table("checkpoints")
+    for thread_id in ("profile-1", "profile-2"):
+        for checkpoint_id in ("01", "02", "03"):
+            table.put_item(Item={"PK": thread_id, "SK": f"cp{checkpoint_id}", "checkpoint_key": f"checkpoint${thread_id}$${checkpoint_id}"})
+            table.put_item(Item={"PK": thread_id, "SK": f"w{checkpoint_id}", "checkpoint_key": f"writes${thread_id}$${checkpoint_id}$task$0"})
+
+    report = compaction.compact_checkpoints("checkpoints", keep=1, segments=2, dry_run=True)
+    assert (report["scanned_items"], report["deleted_checkpoints"], report["deleted_writes"]) == (12, 4, 4)
+    assert table.scan()["Count"] == 12
+
+    compaction.compact_checkpoints("checkpoints", keep=1, segments=2)
+    assert sorted((item["PK"], item["SK"]) for item in table.scan()["Items"]) == [
+        ("profile-1", "cp03"), ("profile-1", "w03"), ("profile-2", "cp03"), ("profile-2", "w03"),
+    ]
+
+def test_keep_must_be_positive():
+    with pytest.raises(ValueError):
+        compaction.compact_checkpoints("checkpoints", keep=0)
+
+@pytest.mark.parametrize("value, expected", [
+    ("false", False), ("0", False), ("no", False), (False, False), (None, False),
+    ("true", True), ("True", True), ("1", True), ("yes", True), (True, True),
+])
+def test_lambda_handler_parses_dry_run(monkeypatch, value, expected):
+    calls = []
+    monkeypatch.setattr(compaction, "compact_checkpoints", lambda **kwargs: calls.append(kwargs))
+    compaction.lambda_handler({"dry_run": value}, None)
+    assert calls[0]["dry_run"] is expected
@@ -0,0 +1,77 @@
+import importlib.util
+import json
+import os
+
+import boto3
+import pytest
+from moto import mock_aws
+
+SCRIPT = os.path.join(os.path.dirname(__file__), "..", "..", "create_profile_table.py")
+
+@pytest.fixture()
+def profiles():
+    with mock_aws():
+        client = boto3.client("dynamodb", region_name="ap-south-1")
+        client.create_table(
+            TableName="UserProfiles",
+            AttributeDefinitions=[{"AttributeName": "profile_id", "AttributeType": "S"},
+                                  {"AttributeName": "userid", "AttributeType": "S"}],
+            KeySchema=[{"AttributeName": "profile_id", "KeyType": "HASH"},
+                       {"AttributeName": "userid", "KeyType": "RANGE"}],
+            BillingMode="PAY_PER_REQUEST",
+            GlobalSecondaryIndexes=[{"IndexName": "UserIdIndex",
+                                     "KeySchema": [{"AttributeName": "userid", "KeyType": "HASH"}],
+                                     "Projection": {"ProjectionType": "ALL"}}],
+        )
+        # Loaded inside the mock: the script creates its boto3 resources at import
+        spec = importlib.util.spec_from_file_location("create_profile_table", SCRIPT)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        yield module
+
+def rows(module):
+    return sorted((item["profile_id"], item["userid"], item["channel"]) for item in module.table.scan()["Items"])
+
+def write_jsonl(path, items):
+    path.write_text("".join(json.dumps(item) + "\n" for item in items))
+    return str(path)
+
+def test_bulk_import_skips_invalid_and_conflicting_rows(profiles, tmp_path):
+    path = write_jsonl(tmp_path / "profiles.jsonl", [
+        {"profile_id": "p1", "userid": "+100", "channel": "whatsapp"},
+        {"profile_id": "p1", "userid": "a@example.com", "channel": "email"},
+        {"profile_id": "p2", "userid": "+200", "channel": "whatsapp"},
+        {"profile_id": "p3", "userid": "+100", "channel": "whatsapp"},
+        {"profile_id": "p4", "userid": "", "channel": "whatsapp"},
+    ])
+    assert profiles.bulk_import(path, workers=2, chunk_size=2) == 3
+    assert rows(profiles) == [("p1", "+100", "whatsapp"), ("p1", "a@example.com", "email"), ("p2", "+200", "whatsapp")]
+
+def test_bulk_import_replaces_existing_mappings(profiles, tmp_path):
+    profiles.add_user("old", "+100", "whatsapp")
+    profiles.add_user("old", "+300", "whatsapp")
+    path = write_jsonl(tmp_path / "profiles.jsonl", [{"profile_id": "new", "userid": "+100", "channel": "whatsapp"}])
+    profiles.bulk_import(path)
+    assert rows(profiles) == [("new", "+100", "whatsapp"), ("old", "+300", "whatsapp")]
+    assert profiles.get_profile_id("+100") == "new"
+
+@pytest.mark.parametrize("extension", ["csv", "jsonl"])
+def test_export_import_round_trip(profiles, tmp_path, extension):
+    for i in range(25):
+        profiles.add_user(f"p{i % 5}", f"+{i}", "whatsapp")
+    exported = rows(profiles)
+    path = str(tmp_path / f"profiles.{extension}")
+    assert profiles.export_profiles(path, segments=3) == 25
+
+    profiles.delete_profiles([{"profile_id": p, "userid": u} for p, u, _ in exported])
+    assert rows(profiles) == []
+    assert profiles.bulk_import(path) == 25
+    assert rows(profiles) == exported
+
+def test_link_userid_moves_mapping(profiles):
+    profiles.add_user("p1", "+100", "whatsapp")
+    profiles.add_user("p1", "a@example.com", "email")
+    result = profiles.link_userid("p2", "+100", "whatsapp")
+    assert result["unlinked_profiles"] == ["p1"]
+    assert rows(profiles) == [("p1", "a@example.com", "email"), ("p2", "+100", "whatsapp")]
+    assert profiles.link_userid("p2", "+100", "whatsapp")["unlinked_profiles"] == []
@@ -0,0 +1,109 @@
+import threading
+import time
+
+import pytest
+
+import failover
+
+PRIMARY = {"model": "big", "provider": "p1"}
+FALLBACK = {"model": "backup", "provider": "p2"}
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(failover, "providers", {})
+    monkeypatch.setattr(failover, "histograms", {})
+    monkeypatch.setattr(failover, "rate_limited_until", {})
+
+def provider(answer=None, error=None, delay=0.0, calls=None):
+    def call(model, messages, tools):
+        if calls is not None:
+            calls.append(model)
+        time.sleep(delay)
+        if error:
+            raise error
+        return answer or f"answer from {model}"
+    return call
+
+def test_build_chain_appends_fallbacks_without_duplicates(monkeypatch):
+    monkeypatch.setattr(failover, "MODEL_FALLBACKS", {"large": [PRIMARY, FALLBACK, {"model": None, "provider": "p3"}]})
+    assert failover.build_chain(PRIMARY, "large") == [PRIMARY, FALLBACK]
+    assert failover.build_chain(PRIMARY, "small") == [PRIMARY]
+
+def test_primary_answers():
+    calls = []
+    failover.register_provider("p1", provider(calls=calls))
+    failover.register_provider("p2", provider(calls=calls))
+    assert failover.call_chain([PRIMARY, FALLBACK], [], []) == ("answer from big", PRIMARY)
+    assert calls == ["big"]
+
+def test_rate_limit_fails_over_and_cools_down(monkeypatch):
+    calls = []
+    failover.register_provider("p1", provider(error=RuntimeError("429 Client Error: Too Many Requests"), calls=calls))
+    failover.register_provider("p2", provider(calls=calls))
+    assert failover.call_chain([PRIMARY, FALLBACK], [], []) == ("answer from backup", FALLBACK)
+    assert failover.order_chain([PRIMARY, FALLBACK]) == [FALLBACK, PRIMARY]
+
+    # Within the cooldown the fallback is tried first
+    calls.clear()
+    failover.call_chain([PRIMARY, FALLBACK], [], [])
+    assert calls == ["backup"]
+
+    monkeypatch.setitem(failover.rate_limited_until, failover.target_key(PRIMARY), time.monotonic() - 1)
+    assert failover.order_chain([PRIMARY, FALLBACK]) == [PRIMARY, FALLBACK]
+
+def test_client_errors_do_not_fail_over():
+    failover.register_provider("p1", provider(error=RuntimeError("400 Client Error: Bad Request")))
+    failover.register_provider("p2", provider())
+    with pytest.raises(RuntimeError, match="400"):
+        failover.call_chain([PRIMARY, FALLBACK], [], [])
+
+def test_last_error_raised_when_every_target_fails():
+    failover.register_provider("p1", provider(error=RuntimeError("503 Server Error")))
+    failover.register_provider("p2", provider(error=RuntimeError("502 Server Error")))
+    with pytest.raises(RuntimeError, match="502"):
+        failover.call_chain([PRIMARY, FALLBACK], [], [])
+
+def test_slow_primary_is_hedged(monkeypatch):
+    monkeypatch.setattr(failover, "HEDGE_DEFAULT_MS", 50)
+    release = threading.Event()
+    failover.register_provider("p1", lambda model, messages, tools: release.wait(2) and "late")
+    failover.register_provider("p2", provider())
+    try:
+        assert failover.call_chain([PRIMARY, FALLBACK], [], []) == ("answer from backup", FALLBACK)
+    finally:
+        release.set()
+
+def test_hedge_client_error_waits_for_primary(monkeypatch):
+    monkeypatch.setattr(failover, "HEDGE_DEFAULT_MS", 50)
+    failover.register_provider("p1", provider(delay=0.3))
+    failover.register_provider("p2", provider(error=RuntimeError("400 Client Error: Bad Request")))
+    assert failover.call_chain([PRIMARY, FALLBACK], [], []) == ("answer from big", PRIMARY)
+
+def test_hedge_client_error_raised_once_primary_fails(monkeypatch):
+    monkeypatch.setattr(failover, "HEDGE_DEFAULT_MS", 50)
+    calls = []
+    failover.register_provider("p1", provider(error=RuntimeError("503 Server Error"), delay=0.3))
+    failover.register_provider("p2", provider(error=RuntimeError("400 Client Error: Bad Request")))
+    failover.register_provider("p3", provider(calls=calls))
+    started_at = time.monotonic()
+    with pytest.raises(RuntimeError, match="400"):
+        failover.call_chain([PRIMARY, FALLBACK, {"model": "third", "provider": "p3"}], [], [])
+    assert time.monotonic() - started_at >= 0.3
+    # The client error stops the chain; no further target is called
+    assert calls == []
+
+def test_hedge_threshold_follows_primary_latency(monkeypatch):
+    monkeypatch.setattr(failover, "HEDGE_MIN_SAMPLES", 10)
+    assert failover.hedge_threshold_ms(PRIMARY) == failover.HEDGE_DEFAULT_MS
+    histogram = failover.histogram_for(PRIMARY)
+    for _ in range(10):
+        histogram.record(2800)
+    assert failover.hedge_threshold_ms(PRIMARY) == 3000
+
+def test_latency_histogram_percentiles():
+    histogram = failover.LatencyHistogram(buckets=[100, 200, 400])
+    for elapsed_ms in (50, 150, 150, 350, 900):
+        histogram.record(elapsed_ms)
+    assert histogram.percentile(50) == 200
+    assert histogram.percentile(100) == 400
+    assert histogram.snapshot()["buckets"] == {"100": 1, "200": 2, "400": 1, "inf": 1}
@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+import fastpath
+
+GRAMMAR_PATH = os.path.join(os.path.dirname(fastpath.__file__), "fastpath_grammar.json")
+
+@pytest.fixture()
+def grammar(monkeypatch):
+    rules = fastpath.load_grammar(GRAMMAR_PATH)
+    monkeypatch.setattr(fastpath, "grammar", rules)
+    return {rule["name"]: rule for rule in rules}
+
+def test_normalize_command():
+    assert fastpath.normalize_command("  Stop   EC2 i-0123456789abcdef0. ") == "stop ec2 i-0123456789abcdef0"
+    assert fastpath.normalize_command(None) is None
+
+def test_match_command_extracts_tool_args(grammar):
+    rule, args = fastpath.match_command("stop instance i-0123456789abcdef0")
+    assert rule["name"] == "stop_ec2"
+    assert args == {"instance_id": "i-0123456789abcdef0"}
+
+def test_match_command_needs_a_full_match(grammar):
+    assert fastpath.match_command("please stop i-0123456789abcdef0 and start another") is None
+    assert fastpath.match_command("how much did we spend last month") is None
+
+def test_render_result_list(grammar):
+    rows = [{"InstanceName": "web", "InstanceId": "i-1", "InstanceState": "running"}]
+    assert fastpath.render_result(grammar["list_ec2"], rows) == "Here are your EC2 instances:\n- web (i-1): running"
+    assert fastpath.render_result(grammar["list_ec2"], []) == "You have no EC2 instances."
+
+def test_render_result_row_with_item_key():
+    rule = {"template": "{items}", "item_template": "- {item} / {name}"}
+    assert fastpath.render_result(rule, [{"item": "x", "name": "y"}]) == "- x / y"
+
+def test_try_fast_path_falls_back_to_result_on_template_error(monkeypatch):
+    rule = {"name": "broken", "tool": "list_rds_instances", "template": "{items}", "item_template": "{missing}", "regex": None}
+
+    class FakeTool:
+        def invoke(self, args):
+            return [{"DBInstanceIdentifier": "db"}]
+
+    monkeypatch.setattr(fastpath, "match_command", lambda message: (rule, {}))
+    monkeypatch.setitem(fastpath.tools_by_name, "list_rds_instances", FakeTool())
+    assert fastpath.try_fast_path("list rds") == {"nextagent": "comms-agent", "message": "[{'DBInstanceIdentifier': 'db'}]"}
+
+def test_try_fast_path_returns_none_when_tool_fails(monkeypatch):
+    class FailingTool:
+        def invoke(self, args):
+            raise RuntimeError("boom")
+
+    rule = {"name": "r", "tool": "t", "template": "{result}"}
+    monkeypatch.setattr(fastpath, "match_command", lambda message: (rule, {}))
+    monkeypatch.setitem(fastpath.tools_by_name, "t", FailingTool())
+    assert fastpath.try_fast_path("anything") is None
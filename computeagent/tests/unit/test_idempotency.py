@@ -0,0 +1,108 @@
+import boto3
+import pytest
+from moto import mock_aws
+
+import idempotency
+
+@pytest.fixture(autouse=True)
+def store(monkeypatch):
+    store = idempotency.MemoryIdempotencyStore()
+    monkeypatch.setattr(idempotency, "idempotency_store", store)
+    return store
+
+class FakeContext:
+    def __init__(self, remaining_ms):
+        self.remaining_ms = remaining_ms
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_ms
+
+def test_process_once_returns_recorded_result():
+    calls = []
+    handle = lambda text: calls.append(text) or {"message": text}
+    assert idempotency.process_once("msg#1", handle, "hi") == {"message": "hi"}
+    assert idempotency.process_once("msg#1", handle, "hi") == {"message": "hi"}
+    assert calls == ["hi"]
+
+def test_process_once_rejects_message_under_live_lease(store):
+    store.acquire("msg#1", 60)
+    with pytest.raises(idempotency.MessageInProgressError):
+        idempotency.process_once("msg#1", lambda: None)
+
+def test_expired_lease_is_taken_over(store):
+    store.acquire("msg#1", -1)
+    assert idempotency.process_once("msg#1", lambda: "done", lease_seconds=60) == "done"
+
+def test_failed_run_releases_lease_and_replays_tool_results():
+    sent = []
+
+    @idempotency.idempotent_tool("to")
+    def send(to, text):
+        sent.append(text)
+        return f"sent to {to}"
+
+    def handle(fail):
+        send("+100", "first wording")
+        if fail:
+            raise RuntimeError("model call failed")
+        return send("+200", "other")
+
+    with pytest.raises(RuntimeError):
+        idempotency.process_once("msg#1", handle, True)
+    # The retry words the message differently but replays the recorded send
+    assert idempotency.process_once("msg#1", handle, False) == "sent to +200"
+    assert sent == ["first wording", "other"]
+
+def test_failed_tool_calls_are_not_recorded():
+    attempts = []
+
+    @idempotency.idempotent_tool("to")
+    def send(to):
+        attempts.append(to)
+        return {"error": "rate limited"} if len(attempts) == 1 else "sent"
+
+    def handle():
+        result = send("+100")
+        if idempotency.is_failure(result):
+            raise RuntimeError(result["error"])
+        return result
+
+    with pytest.raises(RuntimeError):
+        idempotency.process_once("msg#1", handle)
+    assert idempotency.process_once("msg#1", handle) == "sent"
+    assert attempts == ["+100", "+100"]
+
+def test_tools_outside_a_message_run_directly():
+    @idempotency.idempotent_tool()
+    def action():
+        return "ran"
+    assert action() == "ran"
+
+def test_lease_follows_remaining_invocation_time(monkeypatch):
+    assert idempotency.lease_for(None) == idempotency.LEASE_SECONDS
+    monkeypatch.setattr(idempotency, "LEASE_MARGIN_SECONDS", 30)
+    assert idempotency.lease_for(FakeContext(120_000)) == 150
+
+def test_message_keys():
+    assert idempotency.message_key(record={"messageId": "abc"}) == "msg#abc"
+    assert idempotency.message_key(task_token="token").startswith("task#")
+
+@mock_aws
+def test_dynamodb_store_leases_and_records(monkeypatch):
+    boto3.client("dynamodb").create_table(
+        TableName="idempotency",
+        AttributeDefinitions=[{"AttributeName": "idempotency_key", "AttributeType": "S"}],
+        KeySchema=[{"AttributeName": "idempotency_key", "KeyType": "HASH"}],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    monkeypatch.setattr(idempotency, "aws_client", boto3.client)
+    store = idempotency.DynamoDBIdempotencyStore("idempotency")
+
+    assert store.acquire("msg#1", 60) is None
+    assert store.acquire("msg#1", 60)["status"] == idempotency.IN_PROGRESS
+    store.release("msg#1")
+    assert store.acquire("msg#1", -1) is None
+    # The previous holder's lease has expired
+    assert store.acquire("msg#1", 60) is None
+    store.put_result("msg#1", {"message": "done"})
+    assert store.acquire("msg#1", 60) == {"status": idempotency.COMPLETED, "result": '{"message": "done"}'}
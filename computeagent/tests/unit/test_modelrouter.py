@@ -0,0 +1,123 @@
+import json
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+import failover
+import modelrouter
+
+ENVELOPE = json.dumps({"nextagent": "comms-agent", "message": "Done."})
+USAGE = {"input_tokens": 1000, "output_tokens": 100, "total_tokens": 1100}
+
+@pytest.fixture(autouse=True)
+def stub_tiers(monkeypatch):
+    monkeypatch.setattr(failover, "providers", {})
+    monkeypatch.setattr(failover, "histograms", {})
+    monkeypatch.setattr(failover, "MODEL_FALLBACKS", {})
+    monkeypatch.setattr(modelrouter, "TIERS", {
+        "large": {"model": "gpt-4o", "provider": "large-provider"},
+        "small": {"model": "gpt-4o-mini", "provider": "small-provider"},
+    })
+    monkeypatch.setattr(modelrouter, "tier_stats", {
+        tier: {"calls": 0, "escalations": 0, "latency_ms": 0.0, "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0}
+        for tier in ("large", "small")
+    })
+    monkeypatch.setattr(modelrouter, "_last_logged", {})
+
+def provider(*answers, calls=None):
+    """Stub provider returning the answers in turn; an exception instance is raised."""
+    remaining = list(answers)
+
+    def call(model, messages, tools):
+        if calls is not None:
+            calls.append(model)
+        answer = remaining.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+    return call
+
+def tool_call(name="list_rds_instances", call_id="call-1"):
+    return AIMessage(content="", tool_calls=[{"name": name, "args": {}, "id": call_id}])
+
+def tool_turn(tool_calls=1):
+    messages = [SystemMessage(content="prompt"), HumanMessage(content="list my databases")]
+    for i in range(tool_calls):
+        messages.append(tool_call(call_id=f"call-{i}"))
+        messages.append(ToolMessage(content="[]", tool_call_id=f"call-{i}"))
+    return messages
+
+def test_planning_step_goes_to_large_model():
+    assert modelrouter.select_tier([SystemMessage(content="prompt"), HumanMessage(content="hi")]) == "large"
+
+def test_summarising_tool_results_goes_to_small_model():
+    assert modelrouter.select_tier(tool_turn()) == "small"
+
+def test_many_tools_or_long_history_stay_on_large_model(monkeypatch):
+    assert modelrouter.select_tier(tool_turn(tool_calls=modelrouter.MAX_TOOLS_FOR_SMALL + 1)) == "large"
+    monkeypatch.setattr(modelrouter, "MAX_HISTORY_FOR_SMALL", 3)
+    assert modelrouter.select_tier(tool_turn()) == "large"
+
+def test_router_disabled(monkeypatch):
+    monkeypatch.setattr(modelrouter, "ROUTER_ENABLED", False)
+    assert modelrouter.select_tier(tool_turn()) == "large"
+
+@pytest.mark.parametrize("response, escalate", [
+    (AIMessage(content=ENVELOPE), False),
+    (tool_call(), True),
+    (AIMessage(content="Here are your databases."), True),
+    (AIMessage(content=json.dumps({"nextagent": "comms-agent"})), True),
+    (AIMessage(content="[1, 2]"), True),
+])
+def test_needs_escalation(response, escalate):
+    assert modelrouter.needs_escalation(response) is escalate
+
+def test_confident_small_answer_is_kept():
+    calls, usage = [], []
+    failover.register_provider("small-provider", provider(AIMessage(content=ENVELOPE, usage_metadata=USAGE), calls=calls))
+    failover.register_provider("large-provider", provider(calls=calls))
+    response = modelrouter.call_routed_model(tool_turn(), [], on_usage=usage.append)
+    assert response.content == ENVELOPE
+    assert calls == ["gpt-4o-mini"]
+    assert usage == [1100]
+
+def test_low_confidence_small_answer_escalates():
+    calls, usage = [], []
+    failover.register_provider("small-provider", provider(AIMessage(content="plain text", usage_metadata=USAGE), calls=calls))
+    failover.register_provider("large-provider", provider(AIMessage(content=ENVELOPE, usage_metadata=USAGE), calls=calls))
+    assert modelrouter.call_routed_model(tool_turn(), [], on_usage=usage.append).content == ENVELOPE
+    assert calls == ["gpt-4o-mini", "gpt-4o"]
+    assert usage == [1100, 1100]
+    assert modelrouter.tier_stats["large"]["escalations"] == 1
+    assert modelrouter.tier_stats["small"]["escalations"] == 0
+
+def test_failed_small_call_escalates():
+    failover.register_provider("small-provider", provider(RuntimeError("503 Server Error")))
+    failover.register_provider("large-provider", provider(AIMessage(content=ENVELOPE)))
+    assert modelrouter.call_routed_model(tool_turn(), []).content == ENVELOPE
+
+def test_record_call_prices_tokens():
+    target = {"model": "gpt-4o-mini", "provider": "small-provider"}
+    assert modelrouter.record_call("small", target, AIMessage(content="", usage_metadata=USAGE), 120.0, False) == 1100
+    stats = modelrouter.tier_stats["small"]
+    assert (stats["calls"], stats["input_tokens"], stats["output_tokens"]) == (1, 1000, 100)
+    assert stats["cost_usd"] == pytest.approx((1000 * 0.15 + 100 * 0.6) / 1_000_000)
+
+def test_log_tier_metrics_emits_emf_deltas(capsys):
+    failover.register_provider("large-provider", provider(*[AIMessage(content=ENVELOPE, usage_metadata=USAGE)] * 3))
+    modelrouter.call_tier("large", [], [])
+    modelrouter.call_tier("large", [], [])
+    modelrouter.log_tier_metrics()
+    modelrouter.call_tier("large", [], [])
+    modelrouter.log_tier_metrics()
+    modelrouter.log_tier_metrics()
+
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines() if line.startswith("{")]
+    assert [r["ModelCalls"] for r in records] == [2, 1]
+    first = records[0]
+    assert first["Tier"] == "large"
+    assert first["ModelInputTokens"] == 2000 and first["ModelOutputTokens"] == 200
+    assert first["ModelCostUSD"] == round(2 * (1000 * 2.5 + 100 * 10.0) / 1_000_000, 6)
+    directive = first["_aws"]["CloudWatchMetrics"][0]
+    assert directive["Dimensions"] == [["Tier"]]
+    assert {m["Name"] for m in directive["Metrics"]} <= set(first)
@@ -0,0 +1,48 @@
+import pytest
+
+import profiling
+
+@pytest.fixture(autouse=True)
+def output_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(profiling, "PROFILE_OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling, "PROFILE_S3_BUCKET", None)
+    monkeypatch.setattr(profiling, "PROFILE_MODE", "")
+    return tmp_path
+
+def busy_handler():
+    return sum(i * i for i in range(20000))
+
+def test_profile_mode_from_payload_and_env(monkeypatch):
+    assert profiling.profile_mode({}) is None
+    assert profiling.profile_mode(None) is None
+    assert profiling.profile_mode({"profile": True}) == "sample"
+    assert profiling.profile_mode({"profile": "CProfile"}) == "cprofile"
+    assert profiling.profile_mode({"profile": "flamegraph"}) is None
+
+    monkeypatch.setattr(profiling, "PROFILE_MODE", "cprofile")
+    assert profiling.profile_mode({}) == "cprofile"
+    assert profiling.profile_mode({"profile": "sample"}) == "sample"
+
+def test_disabled_profiling_writes_nothing(output_dir, capsys):
+    with profiling.profiled(None, "msg"):
+        result = busy_handler()
+    assert result == busy_handler()
+    assert list(output_dir.iterdir()) == []
+    assert "Profile mode=" not in capsys.readouterr().out
+
+@pytest.mark.parametrize("mode, extension", [("sample", ".collapsed"), ("cprofile", ".prof")])
+def test_profile_written_without_changing_result(output_dir, capsys, mode, extension):
+    with profiling.profiled(mode, "whatsapp/+91 99"):
+        result = busy_handler()
+    assert result == busy_handler()
+    files = list(output_dir.iterdir())
+    assert len(files) == 1 and files[0].suffix == extension
+    assert files[0].name.startswith("profile-whatsapp-91-99-")
+    assert f"Profile mode={mode} label=whatsapp/+91 99" in capsys.readouterr().out
+
+@pytest.mark.parametrize("mode", ["sample", "cprofile"])
+def test_profile_written_when_handler_raises(output_dir, mode):
+    with pytest.raises(KeyError, match="boom"):
+        with profiling.profiled(mode, "msg"):
+            raise KeyError("boom")
+    assert len(list(output_dir.iterdir())) == 1
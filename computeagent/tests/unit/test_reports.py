@@ -0,0 +1,75 @@
+import json
+
+import boto3
+import pytest
+from moto import mock_aws
+
+import reports
+import resilience
+
+BILLING = {
+    "start_date": "2026-01-01",
+    "end_date": "2026-01-31",
+    "total_cost": 12.5,
+    "currency": "USD",
+    "service_costs": [{"service": "Amazon EC2 & <Other>", "cost": 12.5}],
+}
+
+@pytest.fixture()
+def ses(monkeypatch):
+    with mock_aws():
+        monkeypatch.setattr(resilience, "_clients", {})
+        monkeypatch.setattr(reports, "_template_ready", False)
+        client = resilience.aws_client("ses")
+        client.verify_email_identity(EmailAddress=reports.FROM_EMAIL)
+        yield client
+
+def record_bulk_sends(monkeypatch, client):
+    calls = []
+    send = client.send_bulk_templated_email
+
+    def recording_send(**kwargs):
+        calls.append(kwargs)
+        return send(**kwargs)
+    monkeypatch.setattr(client, "send_bulk_templated_email", recording_send)
+    return calls
+
+def test_renderers_escape_html_but_not_text():
+    title, report_html, report_text = reports.render_billing_summary(BILLING)
+    assert title == "AWS billing summary 2026-01-01 to 2026-01-31"
+    assert "Amazon EC2 &amp; &lt;Other&gt;" in report_html
+    assert "Amazon EC2 & <Other> | 12.50" in report_text
+    with pytest.raises(ValueError):
+        reports.render_inventory_table([])
+
+def test_template_inserts_plain_text_unescaped():
+    assert reports.SES_TEMPLATE["TextPart"] == "{{{report_text}}}"
+    assert reports.SES_TEMPLATE["SubjectPart"] == "{{{subject}}}"
+
+def test_template_is_created_once(ses, monkeypatch):
+    reports.ensure_ses_template(ses)
+    assert ses.get_template(TemplateName=reports.SES_TEMPLATE_NAME)["Template"]["TextPart"] == "{{{report_text}}}"
+    monkeypatch.setattr(ses, "get_template", lambda **kwargs: pytest.fail("template checked twice"))
+    reports.ensure_ses_template(ses)
+
+def test_outdated_template_is_updated(ses):
+    ses.create_template(Template=dict(reports.SES_TEMPLATE, TextPart="{{report_text}}"))
+    reports.ensure_ses_template(ses)
+    assert ses.get_template(TemplateName=reports.SES_TEMPLATE_NAME)["Template"]["TextPart"] == "{{{report_text}}}"
+
+def test_recipients_are_sent_in_chunks_of_50(ses, monkeypatch):
+    calls = record_bulk_sends(monkeypatch, ses)
+    recipients = [f"user{i}@example.com" for i in range(120)]
+    result = reports.send_templated_report("billing_summary", BILLING, recipients, subject="Costs & trends")
+
+    assert [len(call["Destinations"]) for call in calls] == [50, 50, 20]
+    assert calls[2]["Destinations"][-1] == {"Destination": {"ToAddresses": ["user119@example.com"]}}
+    assert json.loads(calls[0]["DefaultTemplateData"])["subject"] == "Costs & trends"
+    assert [r["to"] for r in result["recipients"]] == recipients
+    assert all(r["message_id"] for r in result["recipients"])
+
+def test_invalid_requests_are_rejected_before_sending(ses, monkeypatch):
+    calls = record_bulk_sends(monkeypatch, ses)
+    assert "error" in reports.send_templated_report("weekly", BILLING, ["a@example.com"])
+    assert "error" in reports.send_templated_report("billing_summary", BILLING, [])
+    assert calls == []
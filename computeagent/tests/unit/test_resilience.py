@@ -0,0 +1,82 @@
+import pytest
+import requests
+
+import resilience
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+@pytest.fixture(autouse=True)
+def fresh_breakers(monkeypatch):
+    monkeypatch.setattr(resilience, "breakers", {})
+    monkeypatch.setattr(resilience, "backoff_delay", lambda attempt: 0)
+
+def replay(monkeypatch, outcomes):
+    """Makes requests.post return or raise the given outcomes in order; returns the call log."""
+    calls = []
+
+    def post(url, **kwargs):
+        outcome = outcomes[len(calls)]
+        calls.append(url)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+    monkeypatch.setattr(resilience.requests, "post", post)
+    return calls
+
+def test_connection_errors_are_retried(monkeypatch):
+    calls = replay(monkeypatch, [requests.ConnectionError("refused"), FakeResponse(200)])
+    assert resilience.resilient_post("whatsapp", "https://example.test").status_code == 200
+    assert len(calls) == 2
+    assert resilience.get_breaker("whatsapp").snapshot()["failures"] == 0
+
+@pytest.mark.parametrize("response", [FakeResponse(429), FakeResponse(503, {"Retry-After": "1"})])
+def test_not_processed_responses_are_retried(monkeypatch, response):
+    calls = replay(monkeypatch, [response, FakeResponse(201)])
+    assert resilience.resilient_post("whatsapp", "https://example.test").status_code == 201
+    assert len(calls) == 2
+
+@pytest.mark.parametrize("status", [502, 503, 504])
+def test_gateway_errors_are_not_retried_for_non_idempotent_posts(monkeypatch, status):
+    calls = replay(monkeypatch, [FakeResponse(status), FakeResponse(200)])
+    assert resilience.resilient_post("whatsapp", "https://example.test").status_code == status
+    assert len(calls) == 1
+    assert resilience.get_breaker("whatsapp").snapshot()["failures"] == 1
+
+def test_gateway_errors_are_retried_for_idempotent_posts(monkeypatch):
+    calls = replay(monkeypatch, [FakeResponse(502), FakeResponse(504), FakeResponse(200)])
+    assert resilience.resilient_post("whatsapp", "https://example.test", idempotent=True).status_code == 200
+    assert len(calls) == 3
+
+def test_read_timeouts_are_not_retried_by_default(monkeypatch):
+    monkeypatch.setitem(resilience.ENDPOINT_POLICIES, "whatsapp", dict(resilience.ENDPOINT_POLICIES["whatsapp"], retry_read_timeouts=True))
+    calls = replay(monkeypatch, [requests.ReadTimeout(), FakeResponse(200)])
+    with pytest.raises(requests.ReadTimeout):
+        resilience.resilient_post("whatsapp", "https://example.test")
+    assert len(calls) == 1
+
+def test_breaker_opens_and_fails_fast(monkeypatch):
+    breaker = resilience.get_breaker("whatsapp")
+    replay(monkeypatch, [FakeResponse(500)] * breaker.failure_threshold)
+    for _ in range(breaker.failure_threshold):
+        resilience.resilient_post("whatsapp", "https://example.test")
+    with pytest.raises(resilience.CircuitOpenError):
+        resilience.resilient_post("whatsapp", "https://example.test")
+    assert breaker.snapshot()["short_circuited"] == 1
+
+def test_unexpected_error_in_half_open_trial_reopens_breaker(monkeypatch):
+    breaker = resilience.get_breaker("whatsapp")
+    breaker.reset_seconds = 0
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+    replay(monkeypatch, [requests.exceptions.InvalidHeader("bad header")])
+    with pytest.raises(requests.exceptions.InvalidHeader):
+        resilience.resilient_post("whatsapp", "https://example.test")
+    assert breaker.state == "open"
+
+    replay(monkeypatch, [FakeResponse(200)])
+    assert resilience.resilient_post("whatsapp", "https://example.test").status_code == 200
+    assert breaker.state == "closed"
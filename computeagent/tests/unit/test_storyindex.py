@@ -0,0 +1,74 @@
+import boto3
+import pytest
+from moto import mock_aws
+
+import storyindex
+
+@pytest.fixture()
+def index(tmp_path):
+    index = storyindex.StoryIndex(storyindex.FileStoryStore(str(tmp_path / "stories.json")))
+    index.add_story(101, "Resize EC2 instances", "Allow changing the instance type of an EC2 instance")
+    return index
+
+def test_normalize_drops_filler_words_and_stems():
+    assert storyindex.normalize("As a user I want to list running EC2 instances") == ["runn", "ec2", "instance"]
+
+def test_shingles_are_word_pairs():
+    assert storyindex.shingles("Stop ECS services", "") == {"stop ecs", "ecs service"}
+    assert storyindex.shingles("ECS", "") == {"ecs"}
+
+def test_reworded_request_is_a_duplicate(index):
+    story, similarity = index.find_duplicate("Change EC2 instance type", "Feature to resize an EC2 instance by changing its instance type")
+    assert story["story_id"] == "101"
+    assert similarity >= index.threshold
+
+def test_other_service_is_not_a_duplicate(index):
+    assert index.find_duplicate("Resize RDS instances", "Allow changing the instance class of an RDS instance") is None
+    assert index.find_duplicate("List lambda functions", "List all lambda functions") is None
+
+def test_link_request_counts_and_keeps_history(index):
+    for i in range(storyindex.MAX_LINKED_REQUESTS + 2):
+        index.link_request(101, f"Resize EC2 {i}", "")
+    story = index.store.load()[0]
+    assert story["request_count"] == storyindex.MAX_LINKED_REQUESTS + 3
+    assert len(story["linked_requests"]) == storyindex.MAX_LINKED_REQUESTS
+    assert story["linked_requests"][-1]["title"] == f"Resize EC2 {storyindex.MAX_LINKED_REQUESTS + 1}"
+
+@mock_aws
+def test_dynamodb_store_scans_once_and_updates_its_cache():
+    boto3.client("dynamodb").create_table(
+        TableName="LokiStoryIndex",
+        AttributeDefinitions=[{"AttributeName": "story_id", "AttributeType": "S"}],
+        KeySchema=[{"AttributeName": "story_id", "KeyType": "HASH"}],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    store = storyindex.DynamoDBStoryStore("LokiStoryIndex")
+    index = storyindex.StoryIndex(store)
+    index.add_story(1, "Resize EC2 instances", "")
+    assert [s["story_id"] for s in store.load()] == ["1"]
+
+    # Written behind the store's back, so only visible to a fresh container
+    store.table.put_item(Item={"story_id": "2", "title": "Stop ECS services", "description": "", "request_count": 1})
+    index.add_story(3, "List lambda functions", "")
+    index.link_request(1, "Resize EC2", "")
+    cached = {s["story_id"]: s for s in store.load()}
+    assert set(cached) == {"1", "3"}
+    assert cached["1"]["request_count"] == 2
+    assert {s["story_id"] for s in storyindex.DynamoDBStoryStore("LokiStoryIndex").load()} == {"1", "2", "3"}
+
+@mock_aws
+def test_dynamodb_index_rescans_on_miss():
+    boto3.client("dynamodb").create_table(
+        TableName="LokiStoryIndex",
+        AttributeDefinitions=[{"AttributeName": "story_id", "AttributeType": "S"}],
+        KeySchema=[{"AttributeName": "story_id", "KeyType": "HASH"}],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    index = storyindex.StoryIndex(storyindex.DynamoDBStoryStore("LokiStoryIndex"))
+    other_container = storyindex.StoryIndex(storyindex.DynamoDBStoryStore("LokiStoryIndex"))
+    index.add_story(1, "List lambda functions", "List all lambda functions")
+    assert index.find_duplicate("Resize EC2 instances", "Allow changing the instance type of an EC2 instance") is None
+
+    other_container.add_story(2, "Resize EC2 instances", "Allow changing the instance type of an EC2 instance")
+    story, _ = index.find_duplicate("Change EC2 instance type", "Feature to resize an EC2 instance by changing its instance type")
+    assert story["story_id"] == "2"
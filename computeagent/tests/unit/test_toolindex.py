@@ -0,0 +1,44 @@
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+import toolindex
+from tools import tool_list
+
+@pytest.fixture(scope="module")
+def index():
+    return toolindex.ToolIndex(tool_list)
+
+def user_turn(text):
+    return HumanMessage(content=f"Request details:\n- Message: {text}\n- From: +100")
+
+def story_call():
+    return AIMessage(content="", tool_calls=[{"name": toolindex.MISSING_CAPABILITY_TOOL, "args": {}, "id": "call-1"}])
+
+def test_tokenize_maps_synonyms_and_plurals():
+    assert toolindex.tokenize("Stop my servers and databases") == ["stop", "ec2", "rds"]
+
+def test_select_tools_retrieves_and_pins(index):
+    selected = toolindex.select_tools(index, [user_turn("stop the ec2 instance i-123")])
+    assert "stop_ec2_instance" in selected
+    assert set(toolindex.PINNED_TOOLS) <= selected
+    assert len(selected) < len(tool_list)
+
+def test_select_tools_keeps_used_tools(index):
+    used = AIMessage(content="", tool_calls=[{"name": "get_billing_data", "args": {}, "id": "call-1"}])
+    selected = toolindex.select_tools(index, [user_turn("stop the ec2 instance i-123"), used])
+    assert "get_billing_data" in selected
+
+def test_select_tools_offers_everything_without_matches(index):
+    assert toolindex.select_tools(index, [user_turn("xyzzy plugh")]) is None
+
+def test_missing_capability_when_request_did_not_retrieve_story_tool(index):
+    messages = [user_turn("rotate the kms keys of ec2 volumes")]
+    assert toolindex.signals_missing_capability(index, messages, story_call())
+
+def test_story_request_is_not_a_missing_capability(index):
+    messages = [user_turn("create a user story for a feature to resize ec2 instances")]
+    assert not toolindex.signals_missing_capability(index, messages, story_call())
+
+def test_other_tool_calls_are_not_a_missing_capability(index):
+    response = AIMessage(content="", tool_calls=[{"name": "stop_ec2_instance", "args": {}, "id": "call-1"}])
+    assert not toolindex.signals_missing_capability(index, [user_turn("stop ec2")], response)
@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+import utilization
+
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+HOURS = 10
+MB = 1024 * 1024
+
+def instance(resource_id, **extra):
+    return {"ResourceId": resource_id, "Name": resource_id, **extra}
+
+def hourly(value, hours=HOURS):
+    return [START + timedelta(hours=h) for h in range(hours)], [value] * hours
+
+def test_build_queries_encode_row_and_metric():
+    queries = utilization.build_queries("rds", [instance("db-1"), instance("db-2")])
+    assert [q["Id"] for q in queries] == ["rds_0_0", "rds_1_0", "rds_0_1", "rds_1_1"]
+    assert queries[3]["MetricStat"]["Metric"]["Dimensions"] == [{"Name": "DBInstanceIdentifier", "Value": "db-2"}]
+
+def test_series_matrices_place_datapoints_by_hour():
+    timestamps = [START + timedelta(hours=1), START + timedelta(hours=3), START + timedelta(hours=HOURS)]
+    matrices = utilization.series_matrices("rds", 2, {"rds_1_1": (timestamps, [1.0, 3.0, 99.0]), "rds_0_0": ([], [])}, START, HOURS)
+    cpu = matrices["cpu"]
+    assert np.isnan(cpu).all()
+    connections = matrices["connections"]
+    assert connections[1, 1] == 1.0 and connections[1, 3] == 3.0
+    assert np.isnan(connections[1]).sum() == HOURS - 2
+    assert np.isnan(connections[0]).all()
+
+def test_nan_stat_skips_rows_without_data():
+    matrix = np.array([[1.0, 3.0], [np.nan, np.nan]])
+    result = utilization.nan_stat(lambda m: np.nanmean(m, axis=1), matrix)
+    assert result[0] == 2.0 and np.isnan(result[1])
+
+def test_analyze_ec2_flags_idle_quiet_instances():
+    instances = [instance("i-idle"), instance("i-busy"), instance("i-chatty"), instance("i-new")]
+    series = {
+        "ec2_0_0": hourly(1.0), "ec2_1_0": hourly(0.5 * MB), "ec2_2_0": hourly(0.5 * MB),
+        "ec2_0_1": hourly(60.0),
+        "ec2_0_2": hourly(1.0), "ec2_1_2": hourly(50 * MB),
+        "ec2_0_3": hourly(1.0, hours=2),
+    }
+    matrices = utilization.series_matrices("ec2", len(instances), series, START, HOURS)
+    idle, insufficient = utilization.analyze_service("ec2", instances, matrices, HOURS)
+    assert [entry["ResourceId"] for entry in idle] == ["i-idle"]
+    assert idle[0]["cpu_p95"] == 1.0
+    assert idle[0]["network_mb_per_hour"] == 1.0
+    assert idle[0]["idle_hours_pct"] == 100.0
+    assert insufficient == ["i-new"]
+
+def test_analyze_rds_requires_no_connections():
+    instances = [instance("db-idle", ClusterMember=True), instance("db-used")]
+    series = {"rds_0_0": hourly(2.0), "rds_1_0": hourly(0.0), "rds_0_1": hourly(2.0), "rds_1_1": hourly(3.0)}
+    matrices = utilization.series_matrices("rds", len(instances), series, START, HOURS)
+    idle, _ = utilization.analyze_service("rds", instances, matrices, HOURS)
+    assert [entry["ResourceId"] for entry in idle] == ["db-idle"]
+    assert idle[0]["max_connections"] == 0.0
+    assert "note" in idle[0]
+
+def test_fetch_metric_data_batches_queries(monkeypatch):
+    monkeypatch.setattr(utilization, "MAX_QUERIES_PER_CALL", 2)
+    batches = []
+
+    class Paginator:
+        def paginate(self, MetricDataQueries, **kwargs):
+            batches.append([q["Id"] for q in MetricDataQueries])
+            return [{"MetricDataResults": [{"Id": q["Id"], "Timestamps": [START], "Values": [1.0]} for q in MetricDataQueries]}]
+
+    class Client:
+        def get_paginator(self, name):
+            return Paginator()
+
+    queries = utilization.build_queries("ec2", [instance("i-1")])
+    series, calls = utilization.fetch_metric_data(Client(), queries, START, START + timedelta(hours=HOURS))
+    assert batches == [["ec2_0_0", "ec2_1_0"], ["ec2_2_0"]]
+    assert calls == 2
+    assert set(series) == {"ec2_0_0", "ec2_1_0", "ec2_2_0"}
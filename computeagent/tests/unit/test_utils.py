@@ -0,0 +1,43 @@
+import boto3
+import pytest
+from moto import mock_aws
+
+import resilience
+import utils
+
+@pytest.fixture()
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(utils.time, "monotonic", lambda: now[0])
+    return now
+
+@pytest.fixture()
+def secrets(monkeypatch):
+    with mock_aws():
+        monkeypatch.setattr(resilience, "_clients", {})
+        monkeypatch.setattr(utils, "_secret_cache", {})
+        client = boto3.client("secretsmanager")
+        client.create_secret(Name="whatsapp-token", SecretString="v1")
+        yield client
+
+def test_secret_is_cached_within_ttl(secrets, clock):
+    assert utils.get_secret("whatsapp-token") == "v1"
+    secrets.put_secret_value(SecretId="whatsapp-token", SecretString="v2")
+    clock[0] += utils.SECRET_CACHE_TTL_SECONDS - 1
+    assert utils.get_secret("whatsapp-token") == "v1"
+
+def test_rotated_secret_is_picked_up_after_ttl(secrets, clock):
+    assert utils.get_secret("whatsapp-token") == "v1"
+    secrets.put_secret_value(SecretId="whatsapp-token", SecretString="v2")
+    clock[0] += utils.SECRET_CACHE_TTL_SECONDS
+    assert utils.get_secret("whatsapp-token") == "v2"
+
+    # The refreshed value starts a new TTL window
+    secrets.put_secret_value(SecretId="whatsapp-token", SecretString="v3")
+    clock[0] += 1
+    assert utils.get_secret("whatsapp-token") == "v2"
+
+def test_failed_fetch_is_not_cached(secrets, clock):
+    assert utils.get_secret("missing") is None
+    secrets.create_secret(Name="missing", SecretString="now here")
+    assert utils.get_secret("missing") == "now here"